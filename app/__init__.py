@@ -50,6 +50,18 @@ def create_app():
     csrf.init_app(flask_app)
     mail.init_app(flask_app)
     
+    # Per-request query counts, Server-Timing and N+1 warnings
+    from app.utils.query_stats import init_query_stats
+    init_query_stats(flask_app)
+    
+    # Per-endpoint latency histograms (served at /admin/metrics)
+    from app.utils.metrics import init_metrics
+    init_metrics(flask_app)
+    
+    # Slow-query log (listed at /admin/slow-queries)
+    from app.utils.slow_queries import init_slow_query_log
+    init_slow_query_log(flask_app)
+    
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -78,6 +90,8 @@ def create_app():
     from app.routes.delivery_routes import delivery_bp
     from app.routes.review_routes import review_bp
     from app.routes.otp_routes import otp_bp
+    from app.routes.media_routes import media_bp
+    from app.routes.events_routes import events_bp
 
     # Register blueprints
     flask_app.register_blueprint(auth_bp)
@@ -88,6 +102,8 @@ def create_app():
     flask_app.register_blueprint(delivery_bp, url_prefix='/delivery')
     flask_app.register_blueprint(review_bp, url_prefix='/reviews')
     flask_app.register_blueprint(otp_bp, url_prefix='/otp')
+    flask_app.register_blueprint(media_bp)
+    flask_app.register_blueprint(events_bp)
     
     # Register template filters
     from app.utils.template_filters import format_currency, format_datetime, time_ago, nl2br
@@ -96,6 +112,13 @@ def create_app():
     flask_app.jinja_env.filters['time_ago'] = time_ago
     flask_app.jinja_env.filters['nl2br'] = nl2br
     
+    # Register template globals
+    from app.utils.image_utils import food_image_url, slider_image_url
+    from app.utils.image_pipeline import image_srcset
+    flask_app.jinja_env.globals['food_image_url'] = food_image_url
+    flask_app.jinja_env.globals['slider_image_url'] = slider_image_url
+    flask_app.jinja_env.globals['image_srcset'] = image_srcset
+    
     # Error handlers
     @flask_app.errorhandler(404)
     def not_found_error(error):
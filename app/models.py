@@ -32,6 +32,11 @@ class User(UserMixin, db.Model):
     account_holder_name = db.Column(db.String(100), nullable=True)
     upi_id = db.Column(db.String(50), nullable=True)
 
+    # Bumped on every cart change; keys memoized cart pricing
+    cart_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped when the user's notifications or order statuses change (see utils/poll_state.py)
+    state_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     orders = db.relationship('Order', foreign_keys='Order.user_id', backref='customer', lazy=True)
     cart_items = db.relationship('CartItem', foreign_keys='CartItem.user_id', backref='user', lazy=True)
@@ -145,7 +150,10 @@ class FoodItem(db.Model):
     price = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(50), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
-    image_data = db.Column(db.LargeBinary, nullable=True)  # For storing image data
+    image_data = db.deferred(db.Column(db.LargeBinary, nullable=True))  # Legacy image blob, only loaded on access
+    has_image_data = db.column_property(image_data.columns[0].isnot(None))  # Blob presence without loading it
+    image_hash = db.Column(db.String(16), nullable=True)  # Content hash of image_data, used in image URLs and ETags
+    image_variants = db.Column(db.JSON, nullable=True)  # Resized derivatives: [{width, format, path, url}]
     image_url = db.Column(db.String(255), nullable=True)  # For external URLs or generated paths
     is_available = db.Column(db.Boolean, default=True)
     preparation_time = db.Column(db.Integer, default=15)  # in minutes
@@ -176,7 +184,7 @@ class Order(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, confirmed, preparing, out_for_delivery, delivered, cancelled
     payment_status = db.Column(db.String(20), default='pending')  # pending, completed, failed, refunded
     special_instructions = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     estimated_delivery = db.Column(db.DateTime, nullable=True)
     delivery_started_at = db.Column(db.DateTime, nullable=True)
     delivered_at = db.Column(db.DateTime, nullable=True)
@@ -204,11 +212,17 @@ class OrderItem(db.Model):
     food_item_id = db.Column(db.Integer, db.ForeignKey('food_item.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)  # Price at time of order
+    category = db.Column(db.String(50), nullable=True)  # FoodItem.category at time of order (sales_daily cells)
 
     def __repr__(self):
         return f'<OrderItem {self.id}>'
 
 class CartItem(db.Model):
+    # One line per item, so adding to the cart can be a single upsert
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'food_item_id', name='uq_cart_item_user_food'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     food_item_id = db.Column(db.Integer, db.ForeignKey('food_item.id'), nullable=False)
@@ -405,16 +419,15 @@ class Review(db.Model):
     
     @property
     def average_rating(self):
-        """Calculate average rating for this review's food item"""
-        reviews = Review.query.filter_by(food_item_id=self.food_item_id, is_approved=True).all()
-        if not reviews:
-            return 0
-        return sum(r.rating for r in reviews) / len(reviews)
+        """Average approved rating for this review's food item"""
+        from app.utils.rating_summary import get_rating_summary
+        return get_rating_summary(self.food_item_id)['average_rating']
     
     @property
     def total_reviews_count(self):
-        """Get total number of approved reviews for this food item"""
-        return Review.query.filter_by(food_item_id=self.food_item_id, is_approved=True).count()
+        """Total number of approved reviews for this food item"""
+        from app.utils.rating_summary import get_rating_summary
+        return get_rating_summary(self.food_item_id)['total_reviews']
     
     def is_helpful_by_user(self, user_id):
         """Check if current user marked this review as helpful"""
@@ -438,12 +451,14 @@ class ReviewImage(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=True)
     file_size = db.Column(db.Integer, nullable=True)
+    image_variants = db.Column(db.JSON, nullable=True)  # Resized derivatives: [{width, format, path, url}]
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     @property
     def image_url(self):
-        """Generate the URL for the review image"""
-        return f"/static/uploads/reviews/{self.filename}"
+        """Generate the URL for the review image from its storage path"""
+        from app.utils.image_utils import review_image_url
+        return review_image_url(self)
 
     def __repr__(self):
         return f'<ReviewImage {self.id} for Review {self.review_id}>'
@@ -466,6 +481,145 @@ class ReviewHelpful(db.Model):
     def __repr__(self):
         return f'<ReviewHelpful: User {self.user_id} found Review {self.review_id} helpful>'
 
+class FoodRatingSummary(db.Model):
+    __tablename__ = 'food_rating_summary'
+
+    food_item_id = db.Column(db.Integer, db.ForeignKey('food_item.id'), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)  # Approved reviews only
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0)
+    rating_2 = db.Column(db.Integer, nullable=False, default=0)
+    rating_3 = db.Column(db.Integer, nullable=False, default=0)
+    rating_4 = db.Column(db.Integer, nullable=False, default=0)
+    rating_5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationship
+    food_item = db.relationship('FoodItem', backref=db.backref('rating_summary', uselist=False, cascade='all, delete-orphan'))
+
+    @property
+    def average_rating(self):
+        """Average of approved ratings, 0 when there are none"""
+        if not self.review_count:
+            return 0
+        return self.rating_sum / self.review_count
+
+    @property
+    def distribution(self):
+        """Histogram of approved ratings keyed by star value"""
+        return {i: getattr(self, f'rating_{i}') or 0 for i in range(1, 6)}
+
+    def __repr__(self):
+        return f'<FoodRatingSummary FoodItem {self.food_item_id}: {self.review_count} reviews>'
+
+class ItemRecommendation(db.Model):
+    __tablename__ = 'item_recommendation'
+
+    id = db.Column(db.Integer, primary_key=True)
+    food_item_id = db.Column(db.Integer, db.ForeignKey('food_item.id'), nullable=False, index=True)
+    recommended_item_id = db.Column(db.Integer, db.ForeignKey('food_item.id'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)  # 1 = strongest neighbour
+    score = db.Column(db.Float, nullable=False)  # Cosine similarity of co-purchase vectors
+    co_orders = db.Column(db.Integer, nullable=False, default=0)  # Orders containing both items
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('food_item_id', 'recommended_item_id', name='unique_item_recommendation'),)
+
+    # Relationships
+    food_item = db.relationship('FoodItem', foreign_keys=[food_item_id], backref=db.backref('recommendations', lazy=True, cascade='all, delete-orphan'))
+    recommended_item = db.relationship('FoodItem', foreign_keys=[recommended_item_id], backref=db.backref('recommended_by', lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<ItemRecommendation {self.food_item_id} -> {self.recommended_item_id} #{self.rank}>'
+
+class ItemSalesRollup(db.Model):
+    __tablename__ = 'item_sales_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    food_item_id = db.Column(db.Integer, db.ForeignKey('food_item.id'), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)  # Start of the hour/day the order was placed (UTC)
+    quantity_sold = db.Column(db.Integer, nullable=False, default=0)  # Delivered orders only
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    quantity_cancelled = db.Column(db.Integer, nullable=False, default=0)
+    revenue_cancelled = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('food_item_id', 'period', 'bucket_start', name='unique_item_sales_bucket'),
+        db.Index('idx_item_sales_rollup_period_bucket', 'period', 'bucket_start'),
+    )
+
+    # Relationship
+    food_item = db.relationship('FoodItem', backref=db.backref('sales_rollups', lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<ItemSalesRollup FoodItem {self.food_item_id} {self.period} {self.bucket_start}: {self.quantity_sold}>'
+
+# Daily sales fact table, kept in step with order state changes (see utils/sales_daily.py)
+class SalesDaily(db.Model):
+    __tablename__ = 'sales_daily'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # Day the order was placed (UTC)
+    category = db.Column(db.String(50), nullable=False)  # FoodItem.category
+    food_item_id = db.Column(db.Integer, nullable=False)  # No FK: facts outlive deleted items
+    payment_method = db.Column(db.String(20), nullable=False)
+    status_bucket = db.Column(db.String(20), nullable=False)  # open, delivered, returned, cancelled
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    gross_amount = db.Column(db.Float, nullable=False, default=0.0)  # price * quantity
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0)  # Order discounts allocated by line share
+    gst_amount = db.Column(db.Float, nullable=False, default=0.0)  # Order GST allocated by line share
+    net_amount = db.Column(db.Float, nullable=False, default=0.0)  # Order total allocated by line share
+    order_share = db.Column(db.Float, nullable=False, default=0.0)  # Fraction of orders; sums to the order count
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'category', 'food_item_id', 'payment_method', 'status_bucket', name='unique_sales_daily_cell'),
+        db.Index('idx_sales_daily_food_item', 'food_item_id'),
+    )
+
+    def __repr__(self):
+        return f'<SalesDaily {self.day} {self.food_item_id} {self.status_bucket}: {self.quantity}>'
+
+class CommissionLedger(db.Model):
+    __tablename__ = 'commission_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+    agent_id = db.Column(db.Integer, nullable=False)  # No FK: entries outlive the order and agent
+    order_id = db.Column(db.Integer, nullable=False, index=True)
+    entry_type = db.Column(db.String(10), nullable=False)  # earned, reversal, payment, unpaid
+    status = db.Column(db.String(20), nullable=False)  # Order status the commission was earned under
+    channel = db.Column(db.String(10), nullable=False)  # cash (cash on delivery) or online
+    amount = db.Column(db.Float, nullable=False, default=0.0)  # Commission, negative for reversals
+    delivery_charge = db.Column(db.Float, nullable=False, default=0.0)  # Delivery charge, same sign as amount
+    order_count = db.Column(db.Integer, nullable=False, default=0)  # +1 earned, -1 reversal, 0 payments
+    day = db.Column(db.Date, nullable=False)  # Delivery (or payment) date
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_commission_ledger_agent_day', 'agent_id', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<CommissionLedger {self.entry_type} order={self.order_id} agent={self.agent_id}: {self.amount}>'
+
+class CommissionBalance(db.Model):
+    __tablename__ = 'commission_balance'
+
+    agent_id = db.Column(db.Integer, primary_key=True)
+    earned = db.Column(db.Float, nullable=False, default=0.0)
+    paid = db.Column(db.Float, nullable=False, default=0.0)
+    cash_earned = db.Column(db.Float, nullable=False, default=0.0)  # Earned on cash on delivery orders
+    online_earned = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)  # Orders currently earning commission
+
+    @property
+    def pending(self):
+        return self.earned - self.paid
+
+    def __repr__(self):
+        return f'<CommissionBalance agent={self.agent_id} earned={self.earned} paid={self.paid}>'
+
 class SliderImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -1,55 +1,60 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from app import db, csrf
-from app.models import User, FoodItem, Order, OrderItem, Category, Coupon, ContactMessage, NutritionalInfo, Notification, CancellationRequest
+from app.models import User, FoodItem, Order, OrderItem, Category, Coupon, ContactMessage, NutritionalInfo, Notification, CancellationRequest, SalesDaily, Review
 from app.forms import FoodItemForm, OrderStatusForm, CategoryForm
 from app.utils.decorators import admin_required
 from app.utils.helpers import format_currency, flash_errors, paginate_query
-from app.utils.image_utils import save_image, get_image_url_from_data
+from app.utils.image_utils import (
+    save_image, get_image_url_from_data, slider_image_url, slider_storage_path,
+    delete_stored_file, SLIDER_UPLOAD_FOLDER
+)
+from app.utils.storage import get_storage
+from app.utils.pricing import cart_changed
+from app.utils.image_pipeline import schedule_food_derivatives, discard_food_derivatives
 from app.utils.notification_utils import create_order_status_notification, create_admin_message_notification, create_delivery_assignment_notification
+from app.utils.suggestion_index import menu_changed
+from app.utils.cache import invalidate, TAG_COUPONS, TAG_SLIDERS
+from app.utils.sales_rollup import record_order_status_change, get_category_sales
+from app.utils.admin_stats import get_admin_stats, day_range
+from app.utils.agent_stats import get_agent_stats
+from app.utils.commission_ledger import get_commission_balance, commission_by_day, sum_days
+from app.utils.reports import get_daily_figures, revenue_by_day, sales_by_category
+from app.utils.sales_daily import sales_totals
+from app.utils.exports import export_chunks, DATASETS as EXPORT_DATASETS, FORMATS as EXPORT_FORMATS, MIMETYPES as EXPORT_MIMETYPES
+from app.utils.metrics import collect_worker_metrics, prometheus_text, metrics, metrics_dir
+from app.utils.slow_queries import read_slow_queries, top_statements, slow_query_log_file, DEFAULT_LOG_BACKUPS
+from sqlalchemy import func
 from datetime import datetime, timedelta
 from flask_mail import Message
 from flask import current_app
 import io
 import os
+import hmac
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Orders listed under the report totals (the totals cover the whole range)
+REPORT_ORDER_ROWS = 100
+
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
 def dashboard():
-    # Get statistics
-    total_users = User.query.filter_by(is_admin=False).count()
-    total_orders = Order.query.count()
-    total_food_items = FoodItem.query.count()
-    total_delivery_agents = User.query.filter_by(is_delivery_boy=True).count()
-
-    # Revenue calculation
-    today = datetime.now().date()
-    today_orders = Order.query.filter(
-        db.func.date(Order.created_at) == today,
-        Order.status != 'cancelled'
-    ).all()
-    today_revenue = sum(order.total_amount for order in today_orders)
+    # Get statistics (one aggregate query, cached for a few seconds)
+    counters = get_admin_stats()
     
     # Recent orders
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
-    
-    # Pending orders
-    pending_orders = Order.query.filter_by(status='pending').count()
-    
-    # Unread contact messages for admin notification
-    unread_messages = ContactMessage.query.filter_by(is_read=False).count()
 
     stats = {
-        'total_users': total_users,
-        'total_orders': total_orders,
-        'total_food_items': total_food_items,
-        'total_delivery_agents': total_delivery_agents,
-        'today_revenue': format_currency(today_revenue),
-        'pending_orders': pending_orders,
-        'unread_messages': unread_messages
+        'total_users': counters['total_users'],
+        'total_orders': counters['total_orders'],
+        'total_food_items': counters['total_food_items'],
+        'total_delivery_agents': counters['total_delivery_agents'],
+        'today_revenue': format_currency(counters['today_revenue']),
+        'pending_orders': counters['status_counts']['pending'],
+        'unread_messages': counters['unread_messages']
     }
     
     return render_template('admin/dashboard.html', stats=stats, recent_orders=recent_orders)
@@ -77,15 +82,11 @@ def pending_orders():
             order.user = User.query.get(order.user_id)
     return render_template('admin/pending_orders.html', orders=orders)
 
-@admin_bp.route('/reports')
-@login_required
-@admin_required
-def reports():
-    # Date range filter
+def _report_date_range():
+    """Start and end dates from the query string (default: last 30 days)"""
     start_date_str = request.args.get('start_date', '')
     end_date_str = request.args.get('end_date', '')
     
-    # Set default date range if not provided (last 30 days)
     if not end_date_str:
         end_date = datetime.now().date()
     else:
@@ -96,34 +97,28 @@ def reports():
     else:
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
     
-    # Query orders in date range
-    orders = Order.query.filter(
-        db.func.date(Order.created_at) >= start_date,
-        db.func.date(Order.created_at) <= end_date,
-        Order.status != 'cancelled'
-    ).order_by(Order.created_at.desc()).all()
+    return start_date, end_date
+
+@admin_bp.route('/reports')
+@login_required
+@admin_required
+def reports():
+    start_date, end_date = _report_date_range()
     
-    # Calculate statistics
-    total_revenue = sum(order.total_amount for order in orders)
-    order_count = len(orders)
+    # Totals and category distribution from the per-day report figures
+    days = get_daily_figures(start_date, end_date)
+    total_revenue = sum(figures['revenue'] for figures in days.values())
+    order_count = sum(figures['orders'] for figures in days.values())
     avg_order_value = total_revenue / order_count if order_count > 0 else 0
     
-    # Category distribution
-    category_sales = {}
-    for order in orders:
-        order_items = OrderItem.query.filter_by(order_id=order.id).all()
-        for item in order_items:
-            food_item = FoodItem.query.get(item.food_item_id)
-            category_name = food_item.category_rel.name if food_item and food_item.category_rel else 'General'
-            if category_name in category_sales:
-                category_sales[category_name]['count'] += item.quantity
-                category_sales[category_name]['revenue'] += item.price * item.quantity
-            else:
-                category_sales[category_name] = {
-                    'count': item.quantity,
-                    'revenue': item.price * item.quantity,
-                    'name': category_name
-                }
+    # Most recent orders in the range for the details table
+    range_start, _ = day_range(start_date)
+    _, range_end = day_range(end_date)
+    orders = Order.query.filter(
+        Order.created_at >= range_start,
+        Order.created_at < range_end,
+        Order.status != 'cancelled'
+    ).order_by(Order.created_at.desc()).limit(REPORT_ORDER_ROWS).all()
     
     # Format dates for form
     start_date_formatted = start_date.strftime('%Y-%m-%d')
@@ -137,7 +132,68 @@ def reports():
         total_revenue=format_currency(total_revenue),
         order_count=order_count,
         avg_order_value=format_currency(avg_order_value),
-        category_sales=list(category_sales.values())
+        category_sales=sales_by_category(days)
+    )
+
+@admin_bp.route('/metrics')
+def request_metrics():
+    # Prometheus scrapers send METRICS_TOKEN as a bearer token; people log in as admin
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            abort(403)
+    
+    # Include this worker's latest requests, then sum all workers
+    directory = metrics_dir(current_app)
+    metrics.flush(directory)
+    return Response(
+        prometheus_text(collect_worker_metrics(directory)),
+        mimetype='text/plain; version=0.0.4',
+        headers={'Cache-Control': 'no-store'}
+    )
+
+@admin_bp.route('/slow-queries')
+@login_required
+@admin_required
+def slow_queries():
+    # Statement shapes from the slow-query log, most total time first
+    entries = read_slow_queries(
+        slow_query_log_file(current_app),
+        current_app.config.get('SLOW_QUERY_LOG_BACKUPS', DEFAULT_LOG_BACKUPS)
+    )
+    return render_template(
+        'admin/slow_queries.html',
+        statements=top_statements(entries),
+        recent=entries[-20:][::-1],
+        entry_count=len(entries),
+        threshold=current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    )
+
+@admin_bp.route('/export/<dataset>.<export_format>')
+@login_required
+@admin_required
+def export(dataset, export_format):
+    if dataset not in EXPORT_DATASETS or export_format not in EXPORT_FORMATS:
+        abort(404)
+    try:
+        start_date, end_date = _report_date_range()
+    except ValueError:
+        abort(400)
+    
+    range_start, _ = day_range(start_date)
+    _, range_end = day_range(end_date)
+    filename = f"{dataset}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.{export_format}"
+    
+    # Rows are read from a server-side cursor and sent as they are encoded
+    return Response(
+        stream_with_context(export_chunks(dataset, export_format, range_start, range_end)),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
     )
 
 @admin_bp.route('/categories', methods=['GET', 'POST'])
@@ -158,6 +214,7 @@ def categories():
             )
             db.session.add(category)
             db.session.commit()
+            menu_changed()
             flash(f'Category "{form.display_name.data}" added successfully!', 'success')
             return redirect(url_for('admin.categories'))
     
@@ -179,6 +236,7 @@ def categories():
             db.session.add(category)
         
         db.session.commit()
+        menu_changed()
         categories = Category.query.all()
     
     return render_template('admin/categories.html', form=form, categories=categories)
@@ -214,6 +272,7 @@ def delete_category(category_id):
         # Delete the category
         db.session.delete(category_to_delete)
         db.session.commit()
+        menu_changed()
         
         flash(f'Category "{category_to_delete.display_name}" deleted successfully. {len(food_items_to_reassign)} food items moved to General category.', 'success')
         
@@ -267,8 +326,7 @@ def add_food():
     
     if form.validate_on_submit():
         try:
-            # Handle image upload
-            image_data = None
+            # Handle image upload (stored in Supabase, not in the database)
             image_url = None
 
             if form.image.data:
@@ -286,7 +344,6 @@ def add_food():
                 price=form.price.data,
                 category=form.category.data,  # This is the string name of the category
                 category_id=category_obj.id if category_obj else None,  # Set the foreign key
-                image_data=image_data,
                 image_url=image_url,
                 is_available=form.is_available.data,
                 preparation_time=form.preparation_time.data or 15
@@ -295,6 +352,10 @@ def add_food():
             db.session.add(food_item)
             db.session.flush()  # Flush to get the food_item ID
             
+            # Thumbnails and WebP versions are built in the background
+            if image_url:
+                schedule_food_derivatives(food_item, image_data)
+            
             # Add nutritional information if provided
             if form.add_nutrition.data and any([
                 form.calories_per_serving.data,
@@ -330,6 +391,7 @@ def add_food():
                 db.session.add(nutrition_info)
             
             db.session.commit()
+            menu_changed()
             
             flash(f'Food item "{food_item.name}" added successfully!', 'success')
             return redirect(url_for('admin.food_items'))
@@ -344,15 +406,8 @@ def add_food():
 @admin_bp.route('/food_image/<int:food_id>')
 @login_required
 def food_image(food_id):
-    food_item = FoodItem.query.get_or_404(food_id)
-    
-    if food_item.image_data:
-        return send_file(
-            io.BytesIO(food_item.image_data),
-            mimetype='image/jpeg'
-        )
-    else:
-        return redirect(url_for('static', filename='images/no-image.png'))
+    # Kept for old links; images are served by the cached media endpoint
+    return redirect(url_for('media.food_image', food_id=food_id), code=301)
 
 @admin_bp.route('/edit_food/<int:food_id>', methods=['GET', 'POST'])
 @login_required
@@ -409,11 +464,15 @@ def edit_food(food_id):
             if form.image.data:
                 image_data, file_url = save_image(form.image.data, folder='uploads/food')
                 if file_url:
-                    food_item.image_data = image_data
+                    # The new image lives in storage; drop any legacy blob
+                    food_item.image_data = None
+                    food_item.image_hash = None
                     food_item.image_url = file_url
+                    schedule_food_derivatives(food_item, image_data)
             # If only URL is provided and no file
             elif form.image_url.data and form.image_url.data != food_item.image_url:
                 food_item.image_url = form.image_url.data
+                discard_food_derivatives(food_item)
             
             # Handle nutritional information
             if form.add_nutrition.data and any([
@@ -459,6 +518,7 @@ def edit_food(food_id):
                     db.session.delete(nutrition_info)
             
             db.session.commit()
+            menu_changed()
             
             flash(f'Food item "{food_item.name}" updated successfully!', 'success')
             return redirect(url_for('admin.food_items'))
@@ -490,6 +550,7 @@ def delete_food(food_id):
         cart_items = CartItem.query.filter_by(food_item_id=food_id).all()
         for cart_item in cart_items:
             db.session.delete(cart_item)
+        cart_changed(*[cart_item.user_id for cart_item in cart_items])
         
         # 3. Handle order items - these cannot be deleted as they're part of order history
         order_items = OrderItem.query.filter_by(food_item_id=food_id).all()
@@ -500,12 +561,14 @@ def delete_food(food_id):
             food_item.description = "This item has been removed from the menu."
             food_item.price = 0.0  # Set price to 0
             db.session.commit()
+            menu_changed()
             flash(f'Food item "{food_name}" has been permanently removed from menu but preserved in order history.', 'success')
             return redirect(url_for('admin.food_items', deleted='success'))
         
         # 7. If no orders contain this item, safe to completely delete the food item
         db.session.delete(food_item)
         db.session.commit()
+        menu_changed()
         
         flash(f'Food item "{food_name}" and all related data deleted permanently!', 'success')
         return redirect(url_for('admin.food_items', deleted='success'))
@@ -522,6 +585,7 @@ def delete_food(food_id):
             try:
                 food_item.is_available = False
                 db.session.commit()
+                menu_changed()
             except:
                 pass
         elif 'IntegrityError' in error_msg:
@@ -529,6 +593,7 @@ def delete_food(food_id):
             try:
                 food_item.is_available = False
                 db.session.commit()
+                menu_changed()
             except:
                 pass
         else:
@@ -553,29 +618,14 @@ def orders():
     if status != 'all':
         query = query.filter(Order.status == status)
 
-    # Get total counts for different status tabs
-    pending_count = Order.query.filter_by(status='pending').count()
-    confirmed_count = Order.query.filter_by(status='confirmed').count()
-    preparing_count = Order.query.filter_by(status='preparing').count()
-    out_for_delivery_count = Order.query.filter_by(status='out_for_delivery').count()
-    delivered_count = Order.query.filter_by(status='delivered').count()
-    cancelled_count = Order.query.filter_by(status='cancelled').count()
-
     # Get paginated orders
     orders = query.order_by(Order.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
     # Status counts for tabs
-    status_counts = {
-        'all': Order.query.count(),
-        'pending': pending_count,
-        'confirmed': confirmed_count,
-        'preparing': preparing_count,
-        'out_for_delivery': out_for_delivery_count,
-        'delivered': delivered_count,
-        'cancelled': cancelled_count
-    }
+    counters = get_admin_stats()
+    status_counts = {'all': counters['total_orders'], **counters['status_counts']}
 
     return render_template(
         'admin/orders.html',
@@ -629,6 +679,7 @@ def update_order_status(order_id):
         try:
             old_status = order.status
             order.status = new_status
+            record_order_status_change(order, old_status, new_status)
             db.session.commit()
 
             # Create order status notification
@@ -685,32 +736,10 @@ def reports_dashboard():
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=6)
     
-    daily_revenue = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        day_orders = Order.query.filter(
-            db.func.date(Order.created_at) == current_date,
-            Order.status != 'cancelled'
-        ).all()
-        
-        day_revenue = sum(order.total_amount for order in day_orders)
-        daily_revenue.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'revenue': day_revenue,
-            'orders': len(day_orders)
-        })
+    daily_revenue = revenue_by_day(get_daily_figures(start_date, end_date))
 
-        current_date += timedelta(days=1)
-
-    # Category-wise sales
-    category_sales = db.session.query(
-        FoodItem.category,
-        db.func.sum(OrderItem.quantity).label('total_quantity'),
-        db.func.sum(OrderItem.quantity * OrderItem.price).label('total_revenue')
-    ).join(OrderItem).join(Order).filter(
-        Order.status != 'cancelled'
-    ).group_by(FoodItem.category).all()
+    # Category-wise sales (delivered orders) from the sales rollup
+    category_sales = get_category_sales()
 
     return render_template('admin/reports.html', daily_revenue=daily_revenue, category_sales=category_sales)
 
@@ -723,6 +752,7 @@ def toggle_food_availability(food_id):
     try:
         food_item.is_available = not food_item.is_available
         db.session.commit()
+        menu_changed()
 
         status = "available" if food_item.is_available else "unavailable"
         flash(f'{food_item.name} is now {status}.', 'success')
@@ -789,6 +819,7 @@ def add_coupon():
 
             db.session.add(coupon)
             db.session.commit()
+            invalidate(TAG_COUPONS)
             
             flash(f'Coupon "{code}" created successfully!', 'success')
             return redirect(url_for('admin.coupons'))
@@ -846,6 +877,7 @@ def edit_coupon(coupon_id):
                 pass  # Ignore if column doesn't exist
 
             db.session.commit()
+            invalidate(TAG_COUPONS)
             flash(f'Coupon "{code}" updated successfully!', 'success')
             return redirect(url_for('admin.coupons'))
 
@@ -867,6 +899,7 @@ def delete_coupon(coupon_id):
     try:
         db.session.delete(coupon)
         db.session.commit()
+        invalidate(TAG_COUPONS)
         flash(f'Coupon "{coupon.code}" deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -883,6 +916,7 @@ def toggle_coupon(coupon_id):
     try:
         coupon.is_active = not coupon.is_active
         db.session.commit()
+        invalidate(TAG_COUPONS)
         
         status = "activated" if coupon.is_active else "deactivated"
         flash(f'Coupon "{coupon.code}" has been {status}.', 'success')
@@ -999,31 +1033,16 @@ def delivery_agents():
         page=page, per_page=20, error_out=False
     )
 
-    # Get comprehensive statistics for each agent and enhance agent objects with additional attributes
+    # Delivery statistics for the whole page in one grouped query
+    stats = get_agent_stats(agent.id for agent in agents.items)
     for agent in agents.items:
         # Add name attribute using username
         agent.name = agent.username
         
-        # Get delivery statistics
-        total_deliveries = Order.query.filter_by(
-            delivery_boy_id=agent.id,
-            status='delivered'
-        ).count()
-
-        pending_orders = Order.query.filter(
-            Order.delivery_boy_id == agent.id,
-            Order.status.in_(['confirmed', 'preparing', 'out_for_delivery'])
-        ).count()
-
-        total_earnings = db.session.query(db.func.sum(Order.delivery_charge)).filter(
-            Order.delivery_boy_id == agent.id,
-            Order.status == 'delivered'
-        ).scalar() or 0
-
         # Add statistics directly to agent object for easier template access
-        agent.total_deliveries = total_deliveries
-        agent.pending_orders = pending_orders
-        agent.total_earnings = total_earnings
+        agent.total_deliveries = stats[agent.id]['total_deliveries']
+        agent.pending_orders = stats[agent.id]['pending_orders']
+        agent.total_earnings = stats[agent.id]['total_earnings']
 
     return render_template('admin/delivery_agents.html',
                          delivery_agents=agents)
@@ -1385,53 +1404,22 @@ def delivery_agent_profile(agent_id):
     """View detailed profile of a delivery agent"""
     agent = User.query.filter_by(id=agent_id, is_delivery_boy=True).first_or_404()
 
-    # Get agent statistics
-    total_deliveries = Order.query.filter_by(
-        delivery_boy_id=agent.id,
-        status='delivered'
-    ).count()
-
-    pending_orders = Order.query.filter_by(
-        delivery_boy_id=agent.id
-    ).filter(Order.status.in_(['confirmed', 'preparing', 'out_for_delivery'])).count()
-
-    # Calculate commission details using proper formula
-    def calculate_order_commission(order):
-        """Calculate commission as percentage of order amount"""
-        if order.status == 'delivered':
-            commission = order.total_amount * 0.12  # 12% of order amount
-        elif order.status in ['returned', 'cancelled']:
-            commission = order.total_amount * 0.06  # 6% of order amount
-        else:
-            commission = 0
-        return commission
-
-    # Get all commission eligible orders (delivered, returned, cancelled)
-    commission_eligible_orders = Order.query.filter(
-        Order.delivery_boy_id == agent.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled'])
-    ).all()
-
-    total_commission_earned = sum(calculate_order_commission(order) for order in commission_eligible_orders)
+    # Order counters in one grouped query, commission totals from the ledger balance
+    agent_stats = get_agent_stats([agent.id])[agent.id]
+    total_deliveries = agent_stats['total_deliveries']
+    balance = get_commission_balance(agent.id)
 
-    # All unpaid commission orders for display (including cancelled/returned for reference)
-    pending_commission_orders = Order.query.filter(
+    # Unpaid delivered orders, listed for payment
+    payable_commission_orders = Order.query.filter(
         Order.delivery_boy_id == agent.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled']),
+        Order.status == 'delivered',
         Order.commission_paid == False
     ).all()
-    
-    # Only delivered orders eligible for commission payment
-    payable_commission_orders = [order for order in pending_commission_orders if order.status == 'delivered']
-    
-    pending_commission = sum(calculate_order_commission(order) for order in pending_commission_orders)
 
-    paid_commission = total_commission_earned - pending_commission
-
-    # Recent orders
+    # Recent orders (with their items, which the template lists)
     recent_orders = Order.query.filter_by(
         delivery_boy_id=agent.id
-    ).order_by(Order.created_at.desc()).limit(10).all()
+    ).options(db.selectinload(Order.order_items)).order_by(Order.created_at.desc()).limit(10).all()
 
     # Paid commission orders for history
     paid_commission_orders = Order.query.filter(
@@ -1439,62 +1427,30 @@ def delivery_agent_profile(agent_id):
         Order.commission_paid == True
     ).order_by(Order.commission_paid_at.desc()).limit(20).all()
 
-    # Get delivered orders for earnings calculation
-    delivered_orders = [order for order in commission_eligible_orders if order.status == 'delivered']
-    
-    # Calculate daily statistics for the current month
-    from datetime import datetime, timedelta
-    from sqlalchemy import func, and_, extract
-    
-    current_date = datetime.now()
-    start_of_month = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Monthly earnings by payment method
-    monthly_cash_orders = Order.query.filter(
-        Order.delivery_boy_id == agent.id,
-        Order.status == 'delivered',
-        Order.payment_method == 'cash_on_delivery',
-        Order.delivered_at >= start_of_month
-    ).all()
-    
-    monthly_online_orders = Order.query.filter(
-        Order.delivery_boy_id == agent.id,
-        Order.status == 'delivered',
-        Order.payment_method == 'online',
-        Order.delivered_at >= start_of_month
-    ).all()
-    
-    monthly_cash_commission = sum(calculate_order_commission(order) for order in monthly_cash_orders)
-    monthly_online_commission = sum(calculate_order_commission(order) for order in monthly_online_orders)
-    
-    # Daily statistics for the current month
-    daily_stats = []
-    for i in range((current_date - start_of_month).days + 1):
-        day = start_of_month + timedelta(days=i)
-        day_orders = Order.query.filter(
-            Order.delivery_boy_id == agent.id,
-            Order.status == 'delivered',
-            func.date(Order.delivered_at) == day.date()
-        ).all()
-        
-        if day_orders:
-            daily_stats.append({
-                'date': day.strftime('%d %b %Y'),
-                'orders': len(day_orders),
-                'commission': sum(calculate_order_commission(order) for order in day_orders),
-                'cash_orders': sum(calculate_order_commission(order) for order in day_orders if order.payment_method == 'cash_on_delivery'),
-                'online_orders': sum(calculate_order_commission(order) for order in day_orders if order.payment_method == 'online')
-            })
+    # Daily statistics for the current month (one grouped query on the ledger)
+    start_of_month = datetime.now().date().replace(day=1)
+    month_days = commission_by_day(agent.id, start_of_month, status='delivered')
+    month_totals = sum_days(month_days)
+    daily_stats = [
+        {
+            'date': day.strftime('%d %b %Y'),
+            'orders': figures['count'],
+            'commission': figures['commission'],
+            'cash_orders': figures['cash'],
+            'online_orders': figures['online']
+        }
+        for day, figures in month_days.items()
+    ]
     
     stats = {
         'total_deliveries': total_deliveries,
-        'pending_orders': pending_orders,
-        'total_commission_earned': total_commission_earned,
-        'pending_commission': pending_commission,
-        'paid_commission': paid_commission,
-        'total_earnings': sum(order.delivery_charge or 0 for order in delivered_orders),
-        'monthly_cash_commission': monthly_cash_commission,
-        'monthly_online_commission': monthly_online_commission,
+        'pending_orders': agent_stats['pending_orders'],
+        'total_commission_earned': balance['earned'],
+        'pending_commission': balance['pending'],
+        'paid_commission': balance['paid'],
+        'total_earnings': agent_stats['total_earnings'],
+        'monthly_cash_commission': month_totals['cash'],
+        'monthly_online_commission': month_totals['online'],
         'daily_stats': daily_stats
     }
 
@@ -1511,7 +1467,6 @@ def delivery_agent_profile(agent_id):
                          success_rate=success_rate,
                          total_earnings=stats['total_earnings'],  # Pass total_earnings explicitly
                          recent_orders=recent_orders,
-                         pending_commission_orders=pending_commission_orders,
                          unpaid_commissions=payable_commission_orders,
                          paid_commission_orders=paid_commission_orders)
 
@@ -1618,12 +1573,10 @@ def assign_delivery_agent(order_id):
     ).all()
     
     # Add name attribute and pending orders count for each agent
+    stats = get_agent_stats(agent.id for agent in available_agents)
     for agent in available_agents:
         agent.name = agent.username
-        agent.pending_orders = Order.query.filter(
-            Order.delivery_boy_id == agent.id,
-            Order.status.in_(['confirmed', 'preparing', 'out_for_delivery'])
-        ).count()
+        agent.pending_orders = stats[agent.id]['pending_orders']
 
     return render_template('admin/assign_agent.html',
                          order=order,
@@ -2013,7 +1966,7 @@ def slider_management():
             'title': slider.title,
             'subtitle': slider.subtitle,
             'path': f'uploads/sliders/{slider.image_filename}',
-            'url': url_for('static', filename=f'uploads/sliders/{slider.image_filename}'),
+            'url': slider_image_url(slider),
             'exists': True,  # Since it's in DB, we assume it exists
             'size': 0,  # Can be calculated if needed
             'display_order': slider.display_order,
@@ -2060,18 +2013,18 @@ def upload_slider_image():
             timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S_')
             filename = f"{timestamp}{filename}"
             
-            # Create sliders directory if it doesn't exist
-            sliders_path = os.path.join(current_app.static_folder, 'uploads', 'sliders')
-            os.makedirs(sliders_path, exist_ok=True)
-            
-            file_path = os.path.join(sliders_path, filename)
-            file.save(file_path)
+            # Store the original file; sliders are shown full width
+            image_url = get_storage().upload(
+                f"{SLIDER_UPLOAD_FOLDER}/{filename}", file.read(),
+                file.mimetype or 'application/octet-stream'
+            )
             
             # Save to database
             new_slider = SliderImage(
                 title=title,
                 subtitle=subtitle if subtitle else None,
                 image_filename=filename,
+                image_url=image_url,
                 button_text=button_text,
                 button_link=button_link,
                 button_color=button_color,
@@ -2081,6 +2034,7 @@ def upload_slider_image():
             )
             db.session.add(new_slider)
             db.session.commit()
+            invalidate(TAG_SLIDERS)
             
             flash(f'Slider image "{title}" uploaded successfully!', 'success')
             
@@ -2103,14 +2057,13 @@ def delete_slider_image(slider_id):
     try:
         slider = SliderImage.query.get_or_404(slider_id)
         
-        # Delete file from filesystem
-        file_path = os.path.join(current_app.static_folder, 'uploads', 'sliders', slider.image_filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Delete file from storage
+        delete_stored_file(slider_storage_path(slider))
         
         # Mark as inactive in database instead of deleting
         slider.is_active = False
         db.session.commit()
+        invalidate(TAG_SLIDERS)
         
         flash(f'Slider image "{slider.title}" deleted successfully!', 'success')
         
@@ -2135,6 +2088,7 @@ def toggle_slider(slider_id):
         
         slider.is_active = new_status
         db.session.commit()
+        invalidate(TAG_SLIDERS)
         
         status_text = 'activated' if new_status else 'deactivated'
         return jsonify({
@@ -2175,25 +2129,25 @@ def edit_slider(slider_id):
             if 'slider_image' in request.files:
                 file = request.files['slider_image']
                 if file and file.filename and allowed_file(file.filename):
-                    # Delete old image file
-                    if slider.image_filename:
-                        old_image_path = os.path.join(current_app.root_path, 'static', 'uploads', 'sliders', slider.image_filename)
-                        if os.path.exists(old_image_path):
-                            os.remove(old_image_path)
+                    from werkzeug.utils import secure_filename
                     
                     # Save new image
                     filename = secure_filename(file.filename)
                     unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
                     
-                    upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'sliders')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    
-                    file_path = os.path.join(upload_dir, unique_filename)
-                    file.save(file_path)
-                    
+                    old_path = slider_storage_path(slider) if slider.image_filename else None
+                    slider.image_url = get_storage().upload(
+                        f"{SLIDER_UPLOAD_FOLDER}/{unique_filename}", file.read(),
+                        file.mimetype or 'application/octet-stream'
+                    )
                     slider.image_filename = unique_filename
+                    
+                    # Delete old image file
+                    if old_path and old_path != slider_storage_path(slider):
+                        delete_stored_file(old_path)
             
             db.session.commit()
+            invalidate(TAG_SLIDERS)
             flash(f'Slider "{slider.title}" updated successfully!', 'success')
             return redirect(url_for('admin.slider_management'))
             
@@ -2215,7 +2169,8 @@ def edit_slider(slider_id):
                 'offer_text': slider.offer_text or '',
                 'display_order': slider.display_order,
                 'is_active': slider.is_active,
-                'image_filename': slider.image_filename
+                'image_filename': slider.image_filename,
+                'image_url': slider_image_url(slider)
             }
         })
     
@@ -2240,8 +2195,9 @@ def user_details(user_id):
     reviews = Review.query.filter_by(user_id=user_id).order_by(Review.created_at.desc()).limit(10).all()
     
     # Calculate user statistics
-    total_orders = Order.query.filter_by(user_id=user_id).count()
-    total_spent = db.session.query(func.sum(Order.total_amount)).filter_by(user_id=user_id).scalar() or 0
+    total_orders, total_spent = db.session.query(
+        func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0)
+    ).filter(Order.user_id == user_id).one()
     total_reviews = Review.query.filter_by(user_id=user_id).count()
     avg_rating_given = db.session.query(func.avg(Review.rating)).filter_by(user_id=user_id).scalar() or 0
     
@@ -2278,21 +2234,14 @@ def food_item_details(food_id):
     total_reviews = Review.query.filter_by(food_item_id=food_id).count()
     avg_rating = db.session.query(func.avg(Review.rating)).filter_by(food_item_id=food_id).scalar() or 0
     
-    # Count sales
-    total_sold = db.session.query(func.sum(OrderItem.quantity)).filter(
-        OrderItem.food_item_id == food_id
-    ).scalar() or 0
-    
-    # Revenue generated
-    total_revenue = db.session.query(func.sum(OrderItem.quantity * OrderItem.unit_price)).filter(
-        OrderItem.food_item_id == food_id
-    ).scalar() or 0
+    # Sales and revenue from the daily sales fact table
+    sales = sales_totals(SalesDaily.food_item_id == food_id)
     
     food_stats = {
         'total_reviews': total_reviews,
         'avg_rating': round(float(avg_rating), 1) if avg_rating else 0,
-        'total_sold': int(total_sold),
-        'total_revenue': float(total_revenue),
+        'total_sold': sales['quantity'],
+        'total_revenue': sales['gross'],
         'created_date': food_item.created_at.strftime('%B %d, %Y') if food_item.created_at else 'Unknown'
     }
     
@@ -2363,6 +2312,7 @@ def review_cancellation(request_id):
         # Update order status if approved
         if action == 'approve':
             order = cancellation.order
+            record_order_status_change(order, order.status, 'cancelled')
             order.status = 'cancelled'
             order.payment_status = 'refunded' if order.payment_method != 'cash' else order.payment_status
         
@@ -1,5 +1,11 @@
-from flask import Blueprint, request, jsonify
-from app.models import FoodItem
+from flask import Blueprint, request, jsonify, make_response, abort
+from flask_login import login_required, current_user
+from app import db
+from app.models import FoodItem, Order
+from app.utils.http_cache import not_modified
+from app.utils.poll_state import poll_etag, poll_state
+from app.utils.search import search_food_items
+from app.utils.suggestion_index import get_suggestions
 
 api_bp = Blueprint('api', __name__)
 
@@ -14,33 +20,61 @@ def search_suggestions():
     if not query or len(query) < 2:
         return jsonify({'suggestions': []})
     
-    # Base query
-    search_query = FoodItem.query.filter(FoodItem.is_available == True)
-    
-    # Apply filters
-    search_query = search_query.filter(
-        FoodItem.name.ilike(f'%{query}%') |
-        FoodItem.description.ilike(f'%{query}%')
-    )
-    
-    if category and category != 'all':
-        search_query = search_query.filter(FoodItem.category == category)
-        
-    if price_min:
-        search_query = search_query.filter(FoodItem.price >= float(price_min))
-        
-    if price_max:
-        search_query = search_query.filter(FoodItem.price <= float(price_max))
-    
-    # Get limited results for suggestions
-    results = search_query.limit(8).all()
-    
-    suggestions = [{
-        'id': item.id,
-        'name': item.name,
-        'price': float(item.price),
-        'category': item.category,
-        'image': item.image_path if hasattr(item, 'image_path') and item.image_path else None
-    } for item in results]
+    # Answered from the in-memory prefix index, falling back to the
+    # database search when no menu term starts with what was typed
+    matches = get_suggestions(query, category, price_min, price_max, limit=8)
+    if matches:
+        suggestions = [{
+            'id': match['id'],
+            'name': match['name'],
+            'price': float(match['price']),
+            'category': match['category'],
+            'image': match['image_url']
+        } for match in matches]
+    else:
+        suggestions = [{
+            'id': item.id,
+            'name': item.name,
+            'price': float(item.price),
+            'category': item.category,
+            'image': item.image_url
+        } for item in search_food_items(query, category, price_min, price_max, limit=8)]
     
     return jsonify({'suggestions': suggestions})
+
+
+@api_bp.route('/api/poll', methods=['GET'])
+@login_required
+def poll():
+    """Cart count, unread notifications and order statuses for the navbar poller"""
+    # The ETag only needs the user row Flask-Login has already loaded, so an
+    # unchanged state is answered without querying anything else
+    etag = poll_etag(current_user)
+    if not_modified(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(poll_state(current_user))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = 0
+    return response
+
+
+@api_bp.route('/api/order/<int:order_id>/status', methods=['GET'])
+@login_required
+def order_status(order_id):
+    """Current status of an order, for clients catching up after a reconnect"""
+    row = db.session.query(
+        Order.user_id, Order.delivery_boy_id, Order.status, Order.estimated_delivery
+    ).filter(Order.id == order_id).first()
+    if row is None:
+        abort(404)
+    if not current_user.is_admin and current_user.id not in (row.user_id, row.delivery_boy_id):
+        abort(404)
+
+    return jsonify({
+        'order_id': order_id,
+        'status': row.status,
+        'estimatedDelivery': row.estimated_delivery.strftime('%I:%M %p') if row.estimated_delivery else None
+    })
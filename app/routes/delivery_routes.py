@@ -6,6 +6,10 @@ from app.models import User, Order, OrderItem, FoodItem, Notification
 from app.forms import OrderStatusForm
 from app.utils.notification_utils import create_order_status_notification
 from app.utils.notification_service import NotificationService
+from app.utils.poll_state import user_state_changed
+from app.utils.sales_rollup import record_order_status_change
+from app.utils.agent_stats import get_agent_stats
+from app.utils.commission_ledger import get_commission_balance, commission_by_day, sum_days
 from functools import wraps
 import io
 
@@ -103,69 +107,23 @@ def dashboard():
         )
     ).order_by(Order.created_at.asc()).limit(10).all()
 
-    # Statistics for today
+    # Commission figures from the ledger: running balance plus today's entries
     today = datetime.utcnow().date()
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-
-    today_delivered_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.delivered_at >= today_start,
-        Order.delivered_at <= today_end,
-        Order.status == 'delivered'
-    ).all()
-
-    def calculate_order_commission(order):
-        """Calculate commission for a single order"""
-        if order.status == 'delivered':
-            commission = order.total_amount * 0.12  # 12% of order amount
-        elif order.status in ['returned', 'cancelled']:
-            commission = order.total_amount * 0.06  # 6% of order amount
-        else:
-            commission = 0
-        return commission
-
-    today_commission = sum(calculate_order_commission(order) for order in today_delivered_orders)
-
-    # Get all commission eligible orders for dashboard stats
-    all_commission_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled'])
-    ).all()
-
-    total_commission_earned = sum(calculate_order_commission(order) for order in all_commission_orders)
-
-    # Calculate pending commission (orders not yet paid)
-    pending_commission_orders = [order for order in all_commission_orders if not getattr(order, 'commission_paid', False)]
-    pending_commission = sum(calculate_order_commission(order) for order in pending_commission_orders)
-
-    # Calculate paid commission
-    paid_commission = total_commission_earned - pending_commission
-
-    # Calculate commission by payment method
-    cash_orders = [order for order in all_commission_orders if order.payment_method == 'cash_on_delivery']
-    cash_commission = sum(calculate_order_commission(order) for order in cash_orders)
-
-    online_orders = [order for order in all_commission_orders if order.payment_method != 'cash_on_delivery']
-    online_commission = sum(calculate_order_commission(order) for order in online_orders)
+    balance = get_commission_balance(current_user.id)
+    today_delivered = sum_days(commission_by_day(current_user.id, today, today, status='delivered'))
+    agent_stats = get_agent_stats([current_user.id])[current_user.id]
 
     stats = {
         'total_assigned': len(assigned_orders),
-        'today_deliveries': len(today_delivered_orders),
-        'pending_deliveries': Order.query.filter(
-            Order.delivery_boy_id == current_user.id,
-            Order.status.in_(['out_for_delivery', 'confirmed', 'preparing'])
-        ).count(),
-        'total_earnings': db.session.query(db.func.sum(Order.delivery_charge)).filter(
-            Order.delivery_boy_id == current_user.id,
-            Order.status == 'delivered'
-        ).scalar() or 0,
-        'today_commission': today_commission,
-        'total_commission_earned': total_commission_earned,
-        'pending_commission': pending_commission,
-        'paid_commission': paid_commission,
-        'cash_commission': cash_commission,
-        'online_commission': online_commission
+        'today_deliveries': today_delivered['count'],
+        'pending_deliveries': agent_stats['pending_orders'],
+        'total_earnings': agent_stats['total_earnings'],
+        'today_commission': today_delivered['commission'],
+        'total_commission_earned': balance['earned'],
+        'pending_commission': balance['pending'],
+        'paid_commission': balance['paid'],
+        'cash_commission': balance['cash'],
+        'online_commission': balance['online']
     }
 
     return render_template('delivery/dashboard.html',
@@ -278,6 +236,7 @@ def update_order_status(order_id):
             return redirect(url_for('delivery.order_details', order_id=order.id))
 
         print(f"Updating order {order_id} status from {old_status} to {new_status}")
+        record_order_status_change(order, old_status, order.status)
         db.session.commit()
         print(f"Order status updated successfully in database")
         
@@ -360,65 +319,22 @@ def earnings():
     start_datetime = datetime.combine(start_date, datetime.min.time())
     end_datetime = datetime.combine(end_date, datetime.max.time())
 
-    # Get delivered orders in date range
-    delivered_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status == 'delivered',
-        Order.delivered_at >= start_datetime,
-        Order.delivered_at <= end_datetime
-    ).all()
-
-    def calculate_order_commission(order):
-        """Calculate commission for a single order"""
-        # Calculate commission as percentage of order amount
-        if order.status == 'delivered':
-            commission = order.total_amount * 0.12  # 12% of order amount
-        elif order.status in ['returned', 'cancelled']:
-            commission = order.total_amount * 0.06  # 6% of order amount
-        else:
-            commission = 0
-        return commission
-
-    # Get all orders assigned to this agent (delivered, returned, cancelled)
-    commission_eligible_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled']),
-        Order.delivered_at >= start_datetime,
-        Order.delivered_at <= end_datetime
-    ).all()
+    # Commission per day in the range and the running balance, from the ledger
+    daily_stats = commission_by_day(current_user.id, start_date, end_date)
+    range_totals = sum_days(daily_stats)
+    delivered = sum_days(commission_by_day(current_user.id, start_date, end_date, status='delivered'))
+    balance = get_commission_balance(current_user.id)
 
     # Calculate earnings
-    total_deliveries = len(delivered_orders)
-    total_earnings = sum(order.delivery_charge or 0 for order in delivered_orders)
+    total_deliveries = delivered['count']
+    total_earnings = delivered['earnings']
 
-    # Calculate total commission earned
-    total_commission_earned = sum(calculate_order_commission(order) for order in commission_eligible_orders)
-
-    # Calculate pending commission (commission not yet paid)
-    pending_commission_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled']),
-        Order.commission_paid == False
-    ).all()
-
-    pending_commission = sum(calculate_order_commission(order) for order in pending_commission_orders)
-
-    # Calculate paid commission (orders where commission is already paid)
-    paid_commission_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled']),
-        Order.commission_paid == True
-    ).all()
-
-    paid_commission = sum(calculate_order_commission(order) for order in paid_commission_orders)
-
-    # Calculate cash commission (commission from cash on delivery orders)
-    cash_orders = [order for order in commission_eligible_orders if order.payment_method == 'cash_on_delivery']
-    cash_commission = sum(calculate_order_commission(order) for order in cash_orders)
-
-    # Calculate online commission (commission from online payments)
-    online_orders = [order for order in commission_eligible_orders if order.payment_method != 'cash_on_delivery']
-    online_commission = sum(calculate_order_commission(order) for order in online_orders)
+    # Commission earned in the range; pending and paid are all-time balances
+    total_commission_earned = range_totals['commission']
+    pending_commission = balance['pending']
+    paid_commission = balance['paid']
+    cash_commission = range_totals['cash']
+    online_commission = range_totals['online']
 
     # Calculate COD received (total amount collected from cash on delivery orders)
     cod_orders = Order.query.filter(
@@ -432,25 +348,7 @@ def earnings():
     total_cod_amount = sum(order.total_amount for order in cod_orders)
     total_cod_orders = len(cod_orders)
 
-    # Daily breakdown
-    daily_stats = {}
-    for order in commission_eligible_orders:
-        day = order.delivered_at.date() if order.delivered_at else order.created_at.date()
-        if day not in daily_stats:
-            daily_stats[day] = {'count': 0, 'earnings': 0, 'commission': 0, 'cash': 0, 'online': 0}
-        daily_stats[day]['count'] += 1
-        daily_stats[day]['earnings'] += order.delivery_charge or 0
-        commission_amount = calculate_order_commission(order)
-        daily_stats[day]['commission'] += commission_amount
-        
-        # Separate cash and online commission
-        if order.payment_method == 'cash_on_delivery':
-            daily_stats[day]['cash'] += commission_amount
-        else:
-            daily_stats[day]['online'] += commission_amount
-
     return render_template('delivery/earnings.html',
-                         delivered_orders=delivered_orders,
                          total_deliveries=total_deliveries,
                          total_earnings=total_earnings,
                          total_commission_earned=total_commission_earned,
@@ -458,7 +356,6 @@ def earnings():
                          paid_commission=paid_commission,
                          cash_commission=cash_commission,
                          online_commission=online_commission,
-                         pending_commission_orders=pending_commission_orders,
                          daily_stats=daily_stats,
                          start_date=start_date,
                          end_date=end_date,
@@ -497,67 +394,13 @@ def profile():
             print(f"Error updating profile: {str(e)}")
             flash(f'Error updating profile: {str(e)}', 'error')
 
-    # Get delivered orders for commission calculation
-    delivered_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status == 'delivered'
-    ).all()
-
-    def calculate_order_commission_profile(order):
-        """Calculate commission for a single order - same logic as earnings page"""
-        base_commission = 100  # ₹100 per order base commission
-        
-        # Calculate percentage commission based on order status
-        if order.status == 'delivered':
-            percentage_commission = order.total_amount * 0.12  # 12% for delivered orders
-        elif order.status in ['returned', 'cancelled']:
-            percentage_commission = order.total_amount * 0.06  # 6% for returned/cancelled orders
-        else:
-            percentage_commission = 0
-            
-        total_commission = base_commission + percentage_commission
-        return total_commission
-
-    # Get all commission eligible orders
-    commission_eligible_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled'])
-    ).all()
-
-    # Calculate commission details
-    total_commission_earned = sum(calculate_order_commission_profile(order) for order in commission_eligible_orders)
-
-    # Get pending commission (commission eligible orders where commission not paid)
-    pending_commission_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['delivered', 'returned', 'cancelled']),
-        Order.commission_paid == False
-    ).all()
-    pending_commission = sum(calculate_order_commission_profile(order) for order in pending_commission_orders)
-
-    # Calculate paid commission (total earned - pending)
-    paid_commission = total_commission_earned - pending_commission
-
-    # Get overall statistics
-    total_deliveries = len(delivered_orders)
-    total_earnings = sum(order.delivery_charge or 0 for order in delivered_orders)
+    # Commission balance from the ledger and order counters in one grouped query
+    balance = get_commission_balance(current_user.id)
+    agent_stats = get_agent_stats([current_user.id])[current_user.id]
 
     # Today's statistics
     today = datetime.utcnow().date()
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-
-    today_deliveries = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status == 'delivered',
-        Order.delivered_at >= today_start,
-        Order.delivered_at <= today_end
-    ).count()
-
-    pending_orders = Order.query.filter(
-        Order.delivery_boy_id == current_user.id,
-        Order.status.in_(['confirmed', 'preparing', 'out_for_delivery'])
-    ).count()
+    today_deliveries = sum_days(commission_by_day(current_user.id, today, today, status='delivered'))['count']
 
     # Recent orders
     recent_orders = Order.query.filter_by(
@@ -565,13 +408,13 @@ def profile():
     ).order_by(Order.created_at.desc()).limit(5).all()
 
     stats = {
-        'total_deliveries': total_deliveries,
+        'total_deliveries': agent_stats['total_deliveries'],
         'today_deliveries': today_deliveries,
-        'pending_orders': pending_orders,
-        'total_earnings': total_earnings,
-        'total_commission_earned': total_commission_earned,
-        'pending_commission': pending_commission,
-        'paid_commission': paid_commission,
+        'pending_orders': agent_stats['pending_orders'],
+        'total_earnings': agent_stats['total_earnings'],
+        'total_commission_earned': balance['earned'],
+        'pending_commission': balance['pending'],
+        'paid_commission': balance['paid'],
         'member_since': current_user.created_at
     }
 
@@ -916,6 +759,7 @@ def mark_all_notifications_as_read():
             user_id=current_user.id, 
             is_read=False
         ).update({'is_read': True})
+        user_state_changed(current_user.id)
         
         db.session.commit()
         return jsonify({'success': True, 'message': 'All notifications marked as read'})
@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from flask import Blueprint, Response, current_app, stream_with_context
+from flask_login import login_required, current_user
+from app import db
+from app.utils.events import subscribe, broker
+
+events_bp = Blueprint('events', __name__, url_prefix='/events')
+
+# Comment lines keep proxies from closing an idle stream
+HEARTBEAT_SECONDS = 15
+# Clients reconnect after this delay (milliseconds) when a stream ends
+RETRY_MILLISECONDS = 5000
+
+# Each open stream holds a worker thread; see EVENTS_MAX_STREAMS
+_open_streams = {'count': 0}
+_open_streams_lock = threading.Lock()
+
+
+def _claim_stream_slot(limit):
+    with _open_streams_lock:
+        if _open_streams['count'] >= limit:
+            return False
+        _open_streams['count'] += 1
+        return True
+
+
+def _release_stream_slot():
+    with _open_streams_lock:
+        _open_streams['count'] -= 1
+
+
+@events_bp.route('/stream')
+@login_required
+def stream():
+    """Server-Sent Events stream of order updates for the current user"""
+    # A full worker answers 204, which tells EventSource not to reconnect;
+    # the page keeps working on the navbar poller (js/poll.js)
+    if not _claim_stream_slot(current_app.config.get('EVENTS_MAX_STREAMS', 24)):
+        return Response(status=204)
+
+    try:
+        subscription = subscribe(current_user)
+    except Exception:
+        _release_stream_slot()
+        raise
+    lifetime = current_app.config.get('EVENTS_STREAM_LIFETIME', 300)
+
+    # The stream never touches the database; give the connection back now
+    db.session.remove()
+
+    def generate():
+        deadline = time.monotonic() + lifetime
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            event_name, data = message
+            yield f'event: {event_name}\ndata: {json.dumps(data)}\n\n'
+
+    def close():
+        # Runs when the server closes the response, even if it never started
+        broker.unsubscribe(subscription)
+        _release_stream_slot()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(close)
+    return response
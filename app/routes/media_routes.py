@@ -0,0 +1,72 @@
+from flask import Blueprint, redirect, url_for, current_app, abort
+from app import db
+from app.models import FoodItem
+from app.utils.image_utils import detect_image_type
+from app.utils.http_cache import content_hash, file_content_hash, cacheable_response
+from app.utils.storage import local_storage
+
+media_bp = Blueprint('media', __name__, url_prefix='/media')
+
+def _cached_redirect(location):
+    response = redirect(location)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('IMAGE_CACHE_MAX_AGE', 86400)
+    return response
+
+@media_bp.route('/food/<int:food_id>')
+@media_bp.route('/food/<int:food_id>/<version>')
+def food_image(food_id, version=None):
+    """Serve a food item's image, loading only the image columns"""
+    row = db.session.query(
+        FoodItem.image_url, FoodItem.has_image_data, FoodItem.image_hash
+    ).filter(FoodItem.id == food_id).first()
+    if row is None:
+        abort(404)
+
+    image_url, has_image_data, image_hash = row
+
+    # Prefer storage, where the image is served without touching the database
+    if image_url:
+        return _cached_redirect(image_url)
+    if not has_image_data:
+        return _cached_redirect(url_for('static', filename='images/no-image.png'))
+
+    def load():
+        image_data = db.session.query(FoodItem.image_data).filter(FoodItem.id == food_id).scalar()
+        return image_data, detect_image_type(image_data)
+
+    if image_hash is None:
+        # Hash legacy blobs once; afterwards 304s need no blob at all
+        image_data, mimetype = load()
+        image_hash = content_hash(image_data)
+        try:
+            FoodItem.query.filter_by(id=food_id).update({FoodItem.image_hash: image_hash})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error storing image hash for food item {food_id}: {str(e)}")
+        load = lambda: (image_data, mimetype)
+
+    if version is not None and version != image_hash:
+        # Outdated link: point at the current version (not cached)
+        return redirect(url_for('media.food_image', food_id=food_id, version=image_hash))
+
+    return cacheable_response(image_hash, load, immutable=version is not None)
+
+@media_bp.route('/files/<version>/<path:path>')
+def stored_file(version, path):
+    """Serve an image from local storage under its content hash"""
+    file_path = local_storage().local_path(path) if path.startswith('uploads/') else None
+    image_hash = file_content_hash(file_path) if file_path else None
+    if image_hash is None:
+        abort(404)
+
+    if version != image_hash:
+        return redirect(url_for('media.stored_file', version=image_hash, path=path))
+
+    def load():
+        with open(file_path, 'rb') as f:
+            image_data = f.read()
+        return image_data, detect_image_type(image_data)
+
+    return cacheable_response(image_hash, load, immutable=True)
@@ -10,6 +10,10 @@ from datetime import datetime, timedelta
 from app import db
 from app.models import Review, ReviewImage, ReviewHelpful, FoodItem, User, Order, OrderItem
 from app.forms import ReviewForm, EditReviewForm, AdminReplyForm, ReviewModerationForm, ReviewFilterForm
+from app.utils.rating_summary import get_rating_summary, record_review_change, approved_rating
+from app.utils.image_utils import prepare_image, review_storage_path, delete_stored_file, LEGACY_STATIC_PREFIX
+from app.utils.storage import get_storage
+from app.utils.image_pipeline import schedule_review_derivatives
 
 review_bp = Blueprint('reviews', __name__, url_prefix='/reviews')
 
@@ -23,26 +27,15 @@ def save_review_image(image_file, review_id):
     """Save and process review image - Fixed to match database schema"""
     if image_file and allowed_file(image_file.filename):
         filename = secure_filename(image_file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        
-        upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'reviews')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        filepath = os.path.join(upload_dir, unique_filename)
-        image_file.save(filepath)
+        unique_filename = f"{uuid.uuid4()}_{os.path.splitext(filename)[0]}.jpg"
+        storage_path = review_storage_path(unique_filename)
         
         try:
-            with Image.open(filepath) as img:
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                
-                max_size = (800, 600)
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                img.save(filepath, 'JPEG', quality=85, optimize=True)
+            # Normalise to a JPEG of at most 800x600
+            image_data, content_type, _ = prepare_image(image_file, 800, 600, extension='.jpg')
+            get_storage().upload(storage_path, image_data, content_type)
         except Exception as e:
             current_app.logger.error(f"Error processing image: {e}")
-            if os.path.exists(filepath):
-                os.remove(filepath)
             return None
         
         # Create ReviewImage with correct field names to match database
@@ -51,16 +44,24 @@ def save_review_image(image_file, review_id):
             # New fields
             filename=unique_filename,           # Matches filename field in model
             original_filename=filename,         # Matches original_filename field in model
-            file_size=os.path.getsize(filepath),  # Matches file_size field in model
+            file_size=len(image_data),          # Matches file_size field in model
             # Legacy fields (for backward compatibility)
-            image_path=f"/static/uploads/reviews/{unique_filename}",  # For legacy image_path column
+            image_path=storage_path,            # Storage path of the image
             image_name=filename,                # For legacy image_name column
-            image_size=os.path.getsize(filepath)  # For legacy image_size column
+            image_size=len(image_data)          # For legacy image_size column
         )
         db.session.add(review_image)
+        schedule_review_derivatives(review_image, image_data)
         return review_image
     return None
 
+def delete_review_image_files(image):
+    """Remove a review image and its derivatives from storage"""
+    paths = [image.image_path or LEGACY_STATIC_PREFIX + review_storage_path(image.filename)]
+    paths += [variant['path'] for variant in image.image_variants or []]
+    for path in paths:
+        delete_stored_file(path)
+
 @review_bp.route('/food/<int:food_item_id>')
 def view_reviews(food_item_id):
     """View all reviews for a food item"""
@@ -101,25 +102,11 @@ def view_reviews(food_item_id):
     
     reviews = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    rating_stats = db.session.query(
-        Review.rating,
-        func.count(Review.id).label('count')
-    ).filter_by(
-        food_item_id=food_item_id,
-        is_approved=True
-    ).group_by(Review.rating).all()
-    
-    rating_counts = {i: 0 for i in range(1, 6)}
-    for rating, count in rating_stats:
-        rating_counts[rating] = count
-    
-    # Calculate average rating and total reviews
-    total_reviews = sum(rating_counts.values())
-    if total_reviews > 0:
-        weighted_sum = sum(rating * count for rating, count in rating_counts.items())
-        average_rating = weighted_sum / total_reviews
-    else:
-        average_rating = 0.0
+    # Rating distribution, average and total from the precomputed summary
+    rating_summary = get_rating_summary(food_item_id)
+    rating_counts = rating_summary['distribution']
+    total_reviews = rating_summary['total_reviews']
+    average_rating = float(rating_summary['average_rating'])
 
     can_add_review = False
     existing_review = None
@@ -184,6 +171,7 @@ def add_review(food_item_id):
         
         db.session.add(review)
         db.session.flush()
+        record_review_change(food_item_id, new_rating=approved_rating(review))
         
         images_saved = 0
         for image_file in form.images.data:
@@ -231,9 +219,11 @@ def edit_review(review_id):
                 }), 400
 
             # Update the existing review (don't create new one)
+            old_rating = approved_rating(review)
             review.rating = int(rating)
             review.comment = comment
             review.updated_at = datetime.utcnow()
+            record_review_change(review.food_item_id, old_rating, approved_rating(review))
             
             # Handle image uploads if present
             images_saved = 0
@@ -384,15 +374,15 @@ def delete_review(review_id):
 
         # Delete associated images
         for image in review.images:
-            image_path = os.path.join(current_app.root_path, 'static', 'uploads', 'reviews', image.filename)
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                except Exception as e:
-                    current_app.logger.error(f'Error deleting image file: {e}')
+            try:
+                delete_review_image_files(image)
+            except Exception as e:
+                current_app.logger.error(f'Error deleting image file: {e}')
 
         # Delete the review (cascade will handle related records)
+        old_rating = approved_rating(review)
         db.session.delete(review)
+        record_review_change(food_item_id, old_rating=old_rating)
         db.session.commit()
         
         return jsonify({
@@ -448,9 +438,11 @@ def submit_review():
                 }), 403
             
             # Update existing review
+            old_rating = approved_rating(review)
             review.rating = int(rating)
             review.comment = comment
             review.updated_at = datetime.utcnow()
+            record_review_change(review.food_item_id, old_rating, approved_rating(review))
             
             operation = 'updated'
         else:
@@ -488,6 +480,8 @@ def submit_review():
             )
 
             db.session.add(review)
+            db.session.flush()
+            record_review_change(review.food_item_id, new_rating=approved_rating(review))
             operation = 'submitted'
 
         db.session.flush()  # Get the review ID for image uploads
@@ -592,6 +586,7 @@ def moderate_review(review_id):
     try:
         data = request.get_json()
         action = data.get('action')
+        old_rating = approved_rating(review)
 
         if action == 'approve':
             review.is_approved = True
@@ -606,19 +601,15 @@ def moderate_review(review_id):
         elif action == 'delete':
             # Delete associated image files
             for image in review.images:
-                filepath = os.path.join(
-                    current_app.root_path,
-                    'static', 'uploads', 'reviews',
-                    image.filename
-                )
-                if os.path.exists(filepath):
-                    os.remove(filepath)
+                delete_review_image_files(image)
 
             db.session.delete(review)
             message = 'Review deleted successfully.'
         else:
             return jsonify({'success': False, 'message': 'Invalid action'}), 400
 
+        new_rating = None if action == 'delete' else approved_rating(review)
+        record_review_change(review.food_item_id, old_rating, new_rating)
         db.session.commit()
         return jsonify({'success': True, 'message': message})
 
@@ -766,14 +757,14 @@ def admin_delete_review(review_id):
         # Delete associated review images
         for image in review.images:
             try:
-                image_path = os.path.join(current_app.root_path, 'static', 'uploads', 'reviews', image.image_filename)
-                if os.path.exists(image_path):
-                    os.remove(image_path)
+                delete_review_image_files(image)
             except Exception as e:
                 current_app.logger.warning(f"Failed to delete image file: {str(e)}")
 
         # Delete the review and all associated data
+        old_rating = approved_rating(review)
         db.session.delete(review)
+        record_review_change(review.food_item_id, old_rating=old_rating)
         db.session.commit()
 
         return jsonify({
@@ -11,6 +11,15 @@ from app.forms import SearchForm, CartForm, OrderForm
 from app.utils.helpers import search_food_items, get_cart_total, calculate_delivery_time, format_currency, validate_phone_number, flash_errors
 from app.utils.paypal_utils import PayPalClient
 from app.utils.payment_config import PAYPAL_CLIENT_ID
+from app.utils.rating_summary import get_rating_summaries, get_rating_summary
+from app.utils.suggestion_index import get_suggestions
+from app.utils.recommendations import get_similar_items
+from app.utils.sales_rollup import get_popular_items, record_order_status_change
+from app.utils.sales_daily import record_order_payment_method_change, record_order_removed
+from app.utils.cache import cached, snapshot, TAG_MENU, TAG_SLIDERS, TAG_COUPONS, TAG_POPULARITY
+from app.utils.pricing import PricingEngine, cart_changed, coupon_discount_for
+from app.utils.coupons import get_coupon, coupon_error
+from app.utils.order_service import OrderService
 from datetime import datetime, timedelta
 from flask_mail import Message
 from flask import current_app
@@ -126,6 +135,7 @@ def cancel_order(order_id):
         
         try:
             # Update status to cancelled
+            record_order_status_change(order, order.status, 'cancelled')
             order.status = 'cancelled'
             order.cancel_reason = 'Cancelled by customer'
             order.cancelled_at = datetime.utcnow()
@@ -161,9 +171,10 @@ def cancel_order(order_id):
 @login_required
 def place_order():
     """Place an order from cart"""
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    # Price from the database, never from what the checkout page showed
+    quote = PricingEngine(current_user).quote(_applied_coupon(), fresh=True)
 
-    if not cart_items:
+    if quote.is_empty:
         flash('Your cart is empty', 'warning')
         return redirect(url_for('user.cart'))
 
@@ -175,41 +186,21 @@ def place_order():
         payment_method = request.form.get('payment_method')
         special_instructions = request.form.get('special_instructions', '')
 
-        # Calculate totals from session (checkout summary)
-        checkout_summary = session.get('checkout_summary', {})
-
-        # Create order
-        order = Order(
-            user_id=current_user.id,
+        # Create the order and its lines, empty the cart, redeem the coupon
+        order = OrderService.place_order(
+            current_user,
+            quote,
             customer_name=full_name,
             phone_number=phone_number,
             delivery_address=delivery_address,
             payment_method=payment_method,
-            special_instructions=special_instructions,
-            subtotal=checkout_summary.get('subtotal', 0),
-            discount_amount=checkout_summary.get('discount_amount', 0),
-            coupon_discount=checkout_summary.get('coupon_discount', 0),
-            gst_amount=checkout_summary.get('gst_amount', 0),
-            delivery_charge=checkout_summary.get('delivery_charge', 0),
-            total_amount=checkout_summary.get('total_amount', 0),
-            status='pending'
+            special_instructions=special_instructions
         )
-
-        db.session.add(order)
-        db.session.flush()  # Get order ID
-
-        # Create order items
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                food_item_id=cart_item.food_item_id,
-                quantity=cart_item.quantity,
-                price=cart_item.food_item.price
-            )
-            db.session.add(order_item)
-
-        # Clear cart
-        CartItem.query.filter_by(user_id=current_user.id).delete()
+        if order is None:
+            db.session.rollback()
+            session.pop('applied_coupon', None)
+            flash('Sorry, that coupon is no longer available. Please review your order.', 'warning')
+            return redirect(url_for('user.checkout'))
 
         # Clear session data
         session.pop('applied_coupon', None)
@@ -235,22 +226,17 @@ def place_order():
 
 @user_bp.route('/')
 def home():
-    # Get active slider images for home page carousel
-    slider_images = SliderImage.query.filter_by(is_active=True).order_by(SliderImage.display_order.asc()).all()
-    
-    # Get featured food items (latest 6 items)
-    # Featured Menu Items - Show all available items (max 18 for 3 rows)
-    featured_items = FoodItem.query.filter_by(is_available=True).filter(~FoodItem.name.like('[DELETED]%')).order_by(FoodItem.created_at.desc()).limit(18).all()
-
-    # Get all categories for dynamic display
-    categories = Category.query.all()
-
-    # Get ALL active coupons (remove limit)
-    active_coupons = Coupon.query.filter(
-        Coupon.is_active == True,
-        Coupon.display_on_home == True,  # Admin permission to display
-        Coupon.valid_until > datetime.now()
-    ).order_by(Coupon.created_at.desc()).all()  # Get ALL, not limited
+    # Every block is cached as plain snapshots and invalidated by tag from
+    # the admin routes, so a warm home page needs no database queries
+    slider_images = cached('home:sliders', _load_home_sliders, tags=(TAG_SLIDERS,))
+    featured_items = cached('home:featured', _load_home_featured_items, tags=(TAG_MENU,))
+    categories = cached('home:categories', _load_home_categories, tags=(TAG_MENU,))
+    popular_food_items = cached('home:popular', _load_home_popular_items, tags=(TAG_MENU, TAG_POPULARITY))
+
+    # Expiry is checked per request so a cached coupon never outlives its validity
+    now = datetime.now()
+    active_coupons = [coupon for coupon in cached('home:coupons', _load_home_coupons, tags=(TAG_COUPONS,))
+                      if coupon.valid_until > now]
 
     # Get special offers
     # special_offers = SpecialOffer.query.filter(
@@ -258,16 +244,6 @@ def home():
     #     SpecialOffer.valid_until > datetime.now()
     # ).all()
 
-    # Get most popular food items (based on order count) - Limited to 10 items
-    popular_items = db.session.query(
-        FoodItem, func.sum(OrderItem.quantity).label('total_ordered')
-    ).join(OrderItem).group_by(FoodItem).filter(
-        FoodItem.is_available == True
-    ).order_by(func.sum(OrderItem.quantity).desc()).limit(10).all()
-
-    # Extract just the food items from the query result
-    popular_food_items = [item[0] for item in popular_items]
-
     return render_template('home.html',
                          slider_images=slider_images,
                          featured_items=featured_items,
@@ -276,6 +252,36 @@ def home():
                          popular_items=popular_food_items,
                          categories=categories)
 
+def _load_home_sliders():
+    # Get active slider images for home page carousel
+    slider_images = SliderImage.query.filter_by(is_active=True).order_by(SliderImage.display_order.asc()).all()
+    return [snapshot(slider) for slider in slider_images]
+
+def _load_home_featured_items():
+    # Featured Menu Items - Show all available items (max 18 for 3 rows)
+    featured_items = FoodItem.query.filter_by(is_available=True).filter(~FoodItem.name.like('[DELETED]%')).order_by(FoodItem.created_at.desc()).limit(18).all()
+    return [snapshot(item) for item in featured_items]
+
+def _load_home_categories():
+    # Get all categories for dynamic display
+    return [snapshot(category) for category in Category.query.all()]
+
+def _load_home_coupons():
+    # Get ALL active coupons shown on home (validity is filtered per request)
+    active_coupons = Coupon.query.filter(
+        Coupon.is_active == True,
+        Coupon.display_on_home == True,  # Admin permission to display
+        Coupon.valid_until > datetime.now()
+    ).order_by(Coupon.created_at.desc()).all()
+    return [snapshot(coupon) for coupon in active_coupons]
+
+def _load_home_popular_items():
+    # Get most popular food items over the recent window - Limited to 10 items
+    popular_items = get_popular_items(limit=10)
+
+    # Extract just the food items from the query result
+    return [snapshot(item[0]) for item in popular_items]
+
 @user_bp.route('/menu')
 def menu():
     page = request.args.get('page', 1, type=int)
@@ -298,15 +304,13 @@ def menu():
     # Get actual categories from database
     db_categories = Category.query.all()
     
-    # Get review statistics for all food items
+    # Get review statistics for all food items on the page in one lookup
+    rating_summaries = get_rating_summaries(item.id for item in food_items.items)
     review_stats = {}
-    for item in food_items.items:
-        reviews = Review.query.filter_by(food_item_id=item.id, is_approved=True).all()
-        total_reviews = len(reviews)
-        average_rating = sum(r.rating for r in reviews) / total_reviews if total_reviews > 0 else 0
-        review_stats[item.id] = {
-            'total_reviews': total_reviews,
-            'average_rating': round(average_rating, 1)
+    for food_item_id, summary in rating_summaries.items():
+        review_stats[food_item_id] = {
+            'total_reviews': summary['total_reviews'],
+            'average_rating': round(summary['average_rating'], 1)
         }
 
     return render_template('components/menu.html', 
@@ -315,6 +319,31 @@ def menu():
                          current_category=category,
                          review_stats=review_stats)
 
+def _suggestion_from_item(item):
+    """Build an autocomplete suggestion dict from a FoodItem"""
+    # Determine image URL properly
+    image_url = None
+    if hasattr(item, 'image_url') and item.image_url:
+        image_url = item.image_url
+    elif hasattr(item, 'image_path') and item.image_path:
+        image_url = url_for('static', filename=item.image_path)
+    else:
+        image_url = url_for('static', filename='images/food-placeholder.png')
+        
+    # Get category display name
+    category_name = item.category.replace('_', ' ').title() if item.category else 'General'
+    if hasattr(item, 'category_rel') and item.category_rel and hasattr(item.category_rel, 'display_name'):
+        category_name = item.category_rel.display_name
+        
+    return {
+        'id': item.id,
+        'name': item.name,
+        'price': item.price,
+        'category': category_name,
+        'image_url': image_url,
+        'description': item.description[:50] + '...' if item.description and len(item.description) > 50 else item.description or ''
+    }
+
 @user_bp.route('/search_suggestions')
 def search_suggestions():
     """Returns search suggestions for autocomplete"""
@@ -326,50 +355,21 @@ def search_suggestions():
     if not query or len(query) < 2:
         return jsonify([])
     
-    # Base query
-    search_query = FoodItem.query.filter(FoodItem.is_available == True).filter(~FoodItem.name.like('[DELETED]%'))
-    
-    # Apply filters
-    search_query = search_query.filter(
-        FoodItem.name.ilike(f'%{query}%') |
-        FoodItem.description.ilike(f'%{query}%')
-    )
-    
-    if category and category != 'all':
-        search_query = search_query.filter(FoodItem.category == category)
-        
-    if price_min:
-        search_query = search_query.filter(FoodItem.price >= float(price_min))
-        
-    if price_max:
-        search_query = search_query.filter(FoodItem.price <= float(price_max))
-    
-    # Get limited results for suggestions
-    results = search_query.limit(8).all()
+    # Answered from the in-memory prefix index; the database is only
+    # consulted when no menu term starts with what was typed
+    matches = get_suggestions(query, category, price_min, price_max, limit=8)
+    if not matches:
+        return jsonify([_suggestion_from_item(item) for item in search_food_items(query, category, price_min, price_max, limit=8)])
     
     suggestions = []
-    for item in results:
-        # Determine image URL properly
-        image_url = None
-        if hasattr(item, 'image_url') and item.image_url:
-            image_url = item.image_url
-        elif hasattr(item, 'image_path') and item.image_path:
-            image_url = url_for('static', filename=item.image_path)
-        else:
-            image_url = url_for('static', filename='images/food-placeholder.png')
-            
-        # Get category display name
-        category_name = item.category.replace('_', ' ').title() if item.category else 'General'
-        if hasattr(item, 'category_rel') and item.category_rel and hasattr(item.category_rel, 'display_name'):
-            category_name = item.category_rel.display_name
-            
+    for match in matches:
         suggestions.append({
-            'id': item.id,
-            'name': item.name,
-            'price': item.price,
-            'category': category_name,
-            'image_url': image_url,
-            'description': item.description[:50] + '...' if item.description and len(item.description) > 50 else item.description or ''
+            'id': match['id'],
+            'name': match['name'],
+            'price': match['price'],
+            'category': match['category_display'],
+            'image_url': match['image_url'] or url_for('static', filename='images/food-placeholder.png'),
+            'description': match['description']
         })
     
     return jsonify(suggestions)
@@ -386,16 +386,7 @@ def search():
         price_max = form.price_max.data
         
         # Use the search function with filters
-        results = search_food_items(query, category)
-        
-        # Additional filtering by price if needed
-        if price_min or price_max:
-            filtered_results = []
-            for item in results:
-                if (not price_min or item.price >= price_min) and \
-                   (not price_max or item.price <= price_max):
-                    filtered_results.append(item)
-            results = filtered_results
+        results = search_food_items(query, category, price_min, price_max)
         
         if not results:
             flash(f'No results found for "{query}".', 'info')
@@ -413,16 +404,7 @@ def search():
         if price_max: form.price_max.data = float(price_max)
         
         # Get search results with filters
-        results = search_food_items(query, category)
-        
-        # Additional filtering by price
-        if price_min or price_max:
-            filtered_results = []
-            for item in results:
-                if (not price_min or item.price >= float(price_min)) and \
-                   (not price_max or item.price <= float(price_max)):
-                    filtered_results.append(item)
-            results = filtered_results
+        results = search_food_items(query, category, price_min, price_max)
     
     return render_template('components/search_results.html', form=form, results=results)
 
@@ -436,6 +418,7 @@ def process_payment():
     order = Order.query.filter_by(id=order_id, user_id=current_user.id).first_or_404()
 
     # Update the order's payment method
+    record_order_payment_method_change(order, order.payment_method, payment_method)
     order.payment_method = payment_method
 
     if payment_method == 'cash_on_delivery':
@@ -557,6 +540,7 @@ def create_paypal_order(order_id):
         if result['success']:
             # Store PayPal order ID in our order
             order.payment_reference = result['order_id']
+            record_order_payment_method_change(order, order.payment_method, 'paypal')
             order.payment_method = 'paypal'
 
             # Add payment status field if it exists
@@ -680,14 +664,9 @@ def paypal_cancel():
         order = Order.query.filter_by(payment_reference=token, payment_method='paypal').first()
         if order and order.user_id == current_user.id:
             # Restore cart items
-            order_items = OrderItem.query.filter_by(order_id=order.id).all()
-            for oi in order_items:
-                existing = CartItem.query.filter_by(user_id=current_user.id, food_item_id=oi.food_item_id).first()
-                if existing:
-                    existing.quantity += oi.quantity
-                else:
-                    db.session.add(CartItem(user_id=current_user.id, food_item_id=oi.food_item_id, quantity=oi.quantity))
-            # Delete order and its items
+            OrderService.restore_to_cart(order, current_user.id)
+            # Take the order back out of the sales facts, then delete it and its items
+            record_order_removed(order)
             OrderItem.query.filter_by(order_id=order.id).delete()
             db.session.delete(order)
             db.session.commit()
@@ -708,16 +687,9 @@ def add_to_cart(food_id):
     if not food_item.is_available:
         availability_message = " (Note: This item is currently marked as unavailable)"
 
-    # Check if item already in cart
-    cart_item = CartItem.query.filter_by(user_id=current_user.id, food_item_id=food_id).first()
-    
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(user_id=current_user.id, food_item_id=food_id, quantity=quantity)
-        db.session.add(cart_item)
-
     try:
+        # Merges with the line already in the cart, if any
+        OrderService.add_to_cart(current_user.id, {food_id: quantity})
         db.session.commit()
         # Get updated cart count
         cart_count = CartItem.query.filter_by(user_id=current_user.id).with_entities(db.func.sum(CartItem.quantity)).scalar() or 0
@@ -746,48 +718,12 @@ def cart_count():
 @user_bp.route('/cart')
 @login_required
 def cart():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    quote = PricingEngine(current_user).quote()
     
-    if not cart_items:
+    if quote.is_empty:
         return render_template('components/cart.html', cart_items=[], cart_summary={})
-
-    # Calculate cart totals
-    subtotal = sum(item.food_item.price * item.quantity for item in cart_items)
-
-    # Delivery charges: Free above ₹200, ₹30 below ₹200
-    delivery_charge = 0 if subtotal >= 200 else 30
-
-    # Special discounts based on subtotal
-    discount_rate = 0
-    if subtotal < 200:
-        discount_rate = 0.02  # 2%
-    elif subtotal < 1000:
-        discount_rate = 0.04  # 4%
-    else:
-        discount_rate = 0.06  # 6%
-
-    discount_amount = subtotal * discount_rate
-    
-    # GST calculation (5% on food items)
-    gst_rate = 0.05
-    amount_after_discount = subtotal - discount_amount
-    gst_amount = amount_after_discount * gst_rate
-
-    # Total calculation
-    total_amount = amount_after_discount + gst_amount + delivery_charge
     
-    cart_summary = {
-        'subtotal': subtotal,
-        'discount_rate': discount_rate * 100,
-        'discount_amount': discount_amount,
-        'gst_rate': gst_rate * 100,
-        'gst_amount': gst_amount,
-        'delivery_charge': delivery_charge,
-        'total_amount': total_amount,
-        'item_count': sum(item.quantity for item in cart_items)
-    }
-    
-    return render_template('components/cart.html', cart_items=cart_items, cart_summary=cart_summary)
+    return render_template('components/cart.html', cart_items=quote.lines, cart_summary=quote.summary())
 
 @user_bp.route('/update_cart/<int:cart_id>', methods=['POST'])
 @login_required
@@ -806,6 +742,7 @@ def update_cart(cart_id):
     else:
         cart_item.quantity = quantity
         flash('Cart updated.', 'success')
+    cart_changed(current_user.id)
 
     try:
         db.session.commit()
@@ -823,32 +760,22 @@ def apply_coupon():
     if not coupon_code:
         return jsonify({'success': False, 'message': 'Please enter a coupon code'})
     
-    coupon = Coupon.query.filter_by(code=coupon_code).first()
+    coupon = get_coupon(coupon_code)
     
     if not coupon:
         return jsonify({'success': False, 'message': 'Invalid coupon code'})
 
-    if not coupon.is_active:
-        return jsonify({'success': False, 'message': 'This coupon is no longer active'})
-
-    # Check expiration
-    if coupon.valid_until < datetime.utcnow():
-        return jsonify({'success': False, 'message': 'This coupon has expired'})
-
-    # Check usage limit if the attribute exists
-    try:
-        if hasattr(coupon, 'usage_limit') and coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
-            return jsonify({'success': False, 'message': 'This coupon has reached its usage limit'})
-    except AttributeError:
-        # Skip usage limit check if column doesn't exist
-        pass
+    # Active, inside its validity window and under its usage limit
+    error = coupon_error(coupon)
+    if error:
+        return jsonify({'success': False, 'message': error})
 
     # Get cart total
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    if not cart_items:
+    quote = PricingEngine(current_user).quote()
+    if quote.is_empty:
         return jsonify({'success': False, 'message': 'Your cart is empty'})
 
-    subtotal = sum(item.food_item.price * item.quantity for item in cart_items)
+    subtotal = quote.subtotal
     
     if subtotal < coupon.min_order_amount:
         return jsonify({
@@ -857,15 +784,7 @@ def apply_coupon():
         })
     
     # Calculate coupon discount
-    if coupon.discount_type == 'percentage':
-        coupon_discount = subtotal * (coupon.discount_value / 100)
-        if hasattr(coupon, 'max_discount_amount') and coupon.max_discount_amount and coupon_discount > coupon.max_discount_amount:
-            coupon_discount = coupon.max_discount_amount
-    else:  # fixed
-        coupon_discount = coupon.discount_value
-    
-    # Round to 2 decimal places
-    coupon_discount = round(coupon_discount, 2)
+    coupon_discount = coupon_discount_for(coupon, subtotal)
 
     # Store coupon in session
     session['applied_coupon'] = {
@@ -884,6 +803,28 @@ def apply_coupon():
         'code': coupon.code
     })
 
+@user_bp.route('/best_coupon')
+@login_required
+def best_coupon():
+    """Suggest the coupon that saves the most on the current cart"""
+    best = PricingEngine(current_user).best_offer()
+    if best is None:
+        return jsonify({'success': False, 'message': 'No coupon applies to your cart right now'})
+    
+    message = f"Use {best['code']} to save ₹{best['saving']:.2f}"
+    return jsonify(dict(best, success=True, message=message))
+
+def _applied_coupon():
+    """The coupon applied in this session, if it is still valid"""
+    applied_coupon = session.get('applied_coupon')
+    if not applied_coupon:
+        return None
+    coupon = get_coupon(applied_coupon['code'])
+    if coupon is None or coupon_error(coupon):
+        session.pop('applied_coupon', None)
+        return None
+    return coupon
+
 @user_bp.route('/remove_coupon', methods=['POST'])
 @login_required
 def remove_coupon():
@@ -893,50 +834,15 @@ def remove_coupon():
 @user_bp.route('/checkout')
 @login_required
 def checkout():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    applied_coupon = session.get('applied_coupon')
+    quote = PricingEngine(current_user).quote(_applied_coupon())
     
-    if not cart_items:
+    if quote.is_empty:
         flash('Your cart is empty', 'warning')
         return redirect(url_for('user.menu'))
     
-    # Calculate totals with coupon
-    subtotal = sum(item.food_item.price * item.quantity for item in cart_items)
-    delivery_charge = 0 if subtotal >= 200 else 30
-    
-    # Special discounts
-    discount_rate = 0
-    if subtotal < 200:
-        discount_rate = 0.02
-    elif subtotal < 1000:
-        discount_rate = 0.04
-    else:
-        discount_rate = 0.06
-
-    discount_amount = subtotal * discount_rate
-    
-    # Apply coupon if available
-    applied_coupon = session.get('applied_coupon')
-    coupon_discount = applied_coupon['discount'] if applied_coupon else 0
-
-    # GST calculation
-    amount_after_discount = subtotal - discount_amount - coupon_discount
-    gst_amount = amount_after_discount * 0.05
-    total_amount = amount_after_discount + gst_amount + delivery_charge
-
-    checkout_summary = {
-        'subtotal': subtotal,
-        'discount_rate': discount_rate * 100,
-        'discount_amount': discount_amount,
-        'coupon_discount': coupon_discount,
-        'applied_coupon': applied_coupon,
-        'gst_amount': gst_amount,
-        'delivery_charge': delivery_charge,
-        'total_amount': total_amount,
-        'item_count': sum(item.quantity for item in cart_items)
-    }
-    
-    # Store checkout summary in session for place_order
-    session['checkout_summary'] = checkout_summary
+    checkout_summary = quote.summary()
+    checkout_summary['applied_coupon'] = applied_coupon if quote.coupon_code else None
 
     # Get user profile for shipping address
     user_profile = UserProfile.query.filter_by(user_id=current_user.id).first()
@@ -949,7 +855,7 @@ def checkout():
     ]
 
     return render_template('components/checkout.html',
-                         cart_items=cart_items,
+                         cart_items=quote.lines,
                          checkout_summary=checkout_summary,
                          user_profile=user_profile,
                          payment_methods=payment_methods)
@@ -1153,29 +1059,19 @@ def food_detail(food_id):
     """Display food item details"""
     food_item = FoodItem.query.get_or_404(food_id)
 
-    # Get similar food items from the same category
-    similar_items = FoodItem.query.filter(
-        FoodItem.category_id == food_item.category_id,
-        FoodItem.id != food_item.id,
-        FoodItem.is_available == True
-    ).order_by(db.func.random()).limit(4).all()
+    # Frequently bought together, falling back to the same category
+    similar_items = get_similar_items(food_item, limit=4)
     
-    # Calculate average rating
-    from app.models import Review
-    avg_rating_result = db.session.query(func.avg(Review.rating)).filter_by(
-        food_item_id=food_item.id, 
-        is_approved=True
-    ).scalar()
-    avg_rating = avg_rating_result if avg_rating_result else 0.0
+    # Average rating and review count from the precomputed summary
+    rating_summary = get_rating_summary(food_item.id)
+    avg_rating = float(rating_summary['average_rating'])
+    total_reviews = rating_summary['total_reviews']
     
     # Get all approved reviews for this food item
     ratings = Review.query.filter_by(
         food_item_id=food_item.id, 
         is_approved=True
     ).order_by(Review.created_at.desc()).all()
-    
-    # Get total reviews count
-    total_reviews = len(ratings)
 
     return render_template('components/food_detail.html',
                           food=food_item,
@@ -1192,35 +1088,9 @@ def reorder(order_id):
         # Get the original order
         order = Order.query.filter_by(id=order_id, user_id=current_user.id).first_or_404()
 
-        # Check if order has items
-        items = order.order_items
-        if not items or len(items) == 0:
-            return jsonify({
-                'success': False,
-                'message': 'No items found in the original order'
-            })
-
-        # Add each item from the original order to the cart
-        added_count = 0
-        for order_item in items:
-            # Skip if food item doesn't exist anymore
-            if not order_item.food_item:
-                continue
-
-            # Check if item already in cart
-            cart_item = CartItem.query.filter_by(user_id=current_user.id, food_item_id=order_item.food_item_id).first()
-
-            if cart_item:
-                cart_item.quantity += order_item.quantity
-            else:
-                cart_item = CartItem(
-                    user_id=current_user.id,
-                    food_item_id=order_item.food_item_id,
-                    quantity=order_item.quantity
-                )
-                db.session.add(cart_item)
-
-            added_count += 1
+        # Add each item from the original order to the cart, skipping
+        # food items that no longer exist
+        added_count = OrderService.restore_to_cart(order, current_user.id, existing_items_only=True)
 
         # If we successfully added items, commit changes
         if added_count > 0:
@@ -192,7 +192,11 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Check for notifications periodically
+    // New orders and status changes are pushed (js/events.js)
+    document.addEventListener('bhojan:order_placed', fetchAdminNotifications);
+    document.addEventListener('bhojan:order_status', fetchAdminNotifications);
+
+    // Contact messages are not pushed; check for them less often when orders are
     fetchAdminNotifications();
-    setInterval(fetchAdminNotifications, 60000); // Check every minute
+    setInterval(fetchAdminNotifications, window.EventSource ? 300000 : 60000);
 });
\ No newline at end of file
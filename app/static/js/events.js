@@ -0,0 +1,55 @@
+/**
+ * Server push for BhojanXpress
+ *
+ * Opens one Server-Sent Events stream (/events/stream) per page and
+ * re-dispatches its events on the document as 'bhojan:order_status' and
+ * 'bhojan:order_placed' (detail: the event data). After a reconnect,
+ * 'bhojan:events_reconnected' tells listeners to catch up on anything
+ * missed while the stream was down.
+ */
+
+(function() {
+    const STREAM_URL = '/events/stream';
+    const EVENT_NAMES = ['order_status', 'order_placed'];
+
+    window.BhojanEvents = { connected: false };
+    if (!window.EventSource) return;
+
+    let opened = false;
+    const source = new EventSource(STREAM_URL);
+
+    source.addEventListener('open', function() {
+        window.BhojanEvents.connected = true;
+        if (opened) {
+            document.dispatchEvent(new CustomEvent('bhojan:events_reconnected'));
+        }
+        opened = true;
+    });
+
+    source.addEventListener('error', function() {
+        // EventSource reconnects on its own
+        window.BhojanEvents.connected = false;
+    });
+
+    EVENT_NAMES.forEach(function(name) {
+        source.addEventListener(name, function(event) {
+            let data;
+            try {
+                data = JSON.parse(event.data);
+            } catch (e) {
+                console.error('Malformed server event:', e);
+                return;
+            }
+            document.dispatchEvent(new CustomEvent('bhojan:' + name, { detail: data }));
+
+            // Badges and order lists shown by the navbar poller changed too
+            if (window.BhojanPoll) {
+                window.BhojanPoll.refresh();
+            }
+        });
+    });
+
+    window.addEventListener('beforeunload', function() {
+        source.close();
+    });
+})();
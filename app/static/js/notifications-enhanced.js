@@ -345,8 +345,8 @@ function getCSRFToken() {
     return token ? token.getAttribute('content') : '';
 }
 
-// Auto-refresh notifications every 30 seconds
-setInterval(updateNotificationBadge, 30000);
+// Refresh the badge whenever the navbar poller (js/poll.js) reports a change
+document.addEventListener('bhojan:poll', updateNotificationBadge);
 
 // Real-time notification updates (if WebSocket is available)
 if (typeof io !== 'undefined') {
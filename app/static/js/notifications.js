@@ -237,8 +237,17 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Enable auto-refresh of notifications every 30 seconds
-    setInterval(loadNotifications, 30000);
+    // Reload the list when the navbar poller (js/poll.js) reports new notifications
+    document.addEventListener('bhojan:poll', function(event) {
+        const currentCount = parseInt(notificationBadge.textContent) || 0;
+        if (event.detail.unread_count > currentCount) {
+            notificationsLoaded = false;
+            loadNotifications();
+        } else if (event.detail.unread_count !== currentCount) {
+            notificationBadge.textContent = event.detail.unread_count;
+            notificationBadge.style.display = event.detail.unread_count > 0 ? 'inline-block' : 'none';
+        }
+    });
     
     // Check for notifications on page load (optional - uncomment if desired)
     // setTimeout(function() {
@@ -0,0 +1,57 @@
+/**
+ * Navbar poller for BhojanXpress
+ *
+ * One request to /api/poll every 30 seconds keeps the cart badge, the
+ * notification badge and order statuses current. The server answers with
+ * an ETag; the browser revalidates it and gets a 304 while nothing has
+ * changed. Other scripts listen for the 'bhojan:poll' event (detail: the
+ * poll state) instead of running their own timers.
+ */
+
+(function() {
+    const POLL_URL = '/api/poll';
+    const POLL_INTERVAL = 30000;
+
+    let lastVersion = null;
+    let inFlight = false;
+
+    // Update the cart badge in the navbar
+    function renderCartCount(count) {
+        const cartCountElement = document.querySelector('.cart-count-badge');
+        if (cartCountElement) {
+            cartCountElement.textContent = count;
+            cartCountElement.style.display = count > 0 ? 'block' : 'none';
+        }
+    }
+
+    function poll() {
+        if (inFlight || document.hidden) return;
+        inFlight = true;
+
+        // Default cache mode: the browser sends If-None-Match and turns a
+        // 304 into the cached body
+        fetch(POLL_URL, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data || data.version === lastVersion) return;
+                lastVersion = data.version;
+
+                renderCartCount(data.cart_count);
+                document.dispatchEvent(new CustomEvent('bhojan:poll', { detail: data }));
+            })
+            .catch(error => console.error('Error polling for updates:', error))
+            .finally(() => { inFlight = false; });
+    }
+
+    window.BhojanPoll = { refresh: poll };
+
+    document.addEventListener('DOMContentLoaded', function() {
+        poll();
+        setInterval(poll, POLL_INTERVAL);
+    });
+
+    // Catch up as soon as a background tab becomes visible again
+    document.addEventListener('visibilitychange', function() {
+        if (!document.hidden) poll();
+    });
+})();
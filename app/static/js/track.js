@@ -73,26 +73,26 @@ function getStatusIndex(status) {
 }
 
 function startRealTimeTracking(orderId) {
-    const intervalId = setInterval(() => {
+    // Status changes are pushed over the event stream (js/events.js)
+    document.addEventListener('bhojan:order_status', function(event) {
+        if (String(event.detail.order_id) === String(orderId)) {
+            updateOrderStatus(event.detail.status);
+        }
+    });
+
+    // Catch up on changes made while the stream was reconnecting
+    document.addEventListener('bhojan:events_reconnected', function() {
         fetch(`/api/order/${orderId}/status`)
             .then(response => response.json())
             .then(data => {
                 if (data.status) {
                     updateOrderStatus(data.status, data.estimatedDelivery);
-                    
-                    // Stop polling if order is delivered or cancelled
-                    if (['delivered', 'cancelled'].includes(data.status)) {
-                        clearInterval(intervalId);
-                    }
                 }
             })
             .catch(error => {
                 console.log('Error fetching order status:', error);
             });
-    }, 30000); // Check every 30 seconds
-    
-    // Store interval ID to clear it later
-    window.orderTrackingInterval = intervalId;
+    });
 }
 
 function updateOrderStatus(newStatus, estimatedDelivery) {
@@ -135,35 +135,24 @@ function showStatusNotification(status) {
 }
 
 function startStatusPolling() {
-    // Only poll for active orders
+    // Only track active orders
     const activeOrders = document.querySelectorAll('.order-card[data-status="pending"], .order-card[data-status="confirmed"], .order-card[data-status="preparing"]');
     
     if (activeOrders.length === 0) return;
     
-    const intervalId = setInterval(() => {
-        activeOrders.forEach(orderCard => {
-            const orderId = orderCard.getAttribute('data-order-id');
-            
-            fetch(`/api/order/${orderId}/status`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.status) {
-                        const statusBadge = orderCard.querySelector('.order-status');
-                        if (statusBadge) {
-                            statusBadge.textContent = data.status.charAt(0).toUpperCase() + data.status.slice(1);
-                            statusBadge.className = `badge badge-${data.status} order-status`;
-                        }
-                        
-                        orderCard.setAttribute('data-status', data.status);
-                    }
-                })
-                .catch(error => {
-                    console.log('Error polling order status:', error);
-                });
-        });
-    }, 60000); // Check every minute
-    
-    window.statusPollingInterval = intervalId;
+    document.addEventListener('bhojan:order_status', function(event) {
+        const orderCard = document.querySelector(`.order-card[data-order-id="${event.detail.order_id}"]`);
+        if (!orderCard) return;
+
+        const status = event.detail.status;
+        const statusBadge = orderCard.querySelector('.order-status');
+        if (statusBadge) {
+            statusBadge.textContent = status.charAt(0).toUpperCase() + status.slice(1);
+            statusBadge.className = `badge badge-${status} order-status`;
+        }
+        
+        orderCard.setAttribute('data-status', status);
+    });
 }
 
 function animateOrderTimeline() {
@@ -217,13 +206,3 @@ function showToast(message, type = 'info') {
         toast.remove();
     });
 }
-
-// Clean up intervals when leaving page
-window.addEventListener('beforeunload', function() {
-    if (window.orderTrackingInterval) {
-        clearInterval(window.orderTrackingInterval);
-    }
-    if (window.statusPollingInterval) {
-        clearInterval(window.statusPollingInterval);
-    }
-});
@@ -0,0 +1,79 @@
+"""
+Admin dashboard counters
+
+The dashboard cards and the order status tabs are all answered by one
+SELECT: each table is reduced to a single row of conditional aggregates
+(SUM(CASE ...)) and the rows are cross-joined. Today's revenue filters
+created_at on a half-open timestamp range, so an index on the column can
+be used. The result is cached for ADMIN_STATS_TTL seconds and shared by
+every admin in the worker.
+"""
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select, true
+from app import db
+from app.models import User, FoodItem, Order, ContactMessage
+from app.utils.cache import cached
+
+# Statuses shown as tabs on the orders page
+ORDER_STATUSES = ('pending', 'confirmed', 'preparing', 'out_for_delivery', 'delivered', 'cancelled')
+DEFAULT_STATS_TTL = 5
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def day_range(day):
+    """Half-open [start, end) datetime range covering a date"""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def _load_admin_stats():
+    today_start, today_end = day_range(datetime.now().date())
+
+    users = select(
+        _count_if(User.is_admin == False).label('total_users'),
+        _count_if(User.is_delivery_boy == True).label('total_delivery_agents')
+    ).subquery()
+    orders = select(
+        func.count(Order.id).label('total_orders'),
+        func.coalesce(func.sum(case(
+            (db.and_(Order.created_at >= today_start, Order.created_at < today_end,
+                     Order.status != 'cancelled'), Order.total_amount),
+            else_=0
+        )), 0).label('today_revenue'),
+        *[_count_if(Order.status == status).label(status) for status in ORDER_STATUSES]
+    ).subquery()
+    food_items = select(func.count(FoodItem.id).label('total_food_items')).subquery()
+    messages = select(_count_if(ContactMessage.is_read == False).label('unread_messages')).subquery()
+
+    row = db.session.execute(
+        select(users, orders, food_items, messages).select_from(
+            users.join(orders, true()).join(food_items, true()).join(messages, true())
+        )
+    ).mappings().one()
+
+    return {
+        'total_users': int(row['total_users']),
+        'total_orders': int(row['total_orders']),
+        'total_food_items': int(row['total_food_items']),
+        'total_delivery_agents': int(row['total_delivery_agents']),
+        'today_revenue': float(row['today_revenue']),
+        'unread_messages': int(row['unread_messages']),
+        'status_counts': {status: int(row[status]) for status in ORDER_STATUSES}
+    }
+
+
+def get_admin_stats():
+    """
+    Site-wide counters for the admin dashboard and order tabs
+
+    Returns:
+        Dict with total_users, total_orders, total_food_items,
+        total_delivery_agents, today_revenue (float), unread_messages and
+        status_counts ({status: count} for ORDER_STATUSES)
+    """
+    return cached('admin_stats', _load_admin_stats,
+                  ttl=current_app.config.get('ADMIN_STATS_TTL', DEFAULT_STATS_TTL))
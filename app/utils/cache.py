@@ -0,0 +1,132 @@
+"""
+Small in-process cache with TTLs and invalidation tags
+
+Each entry is stored with the version of every tag it depends on. Bumping a
+tag (e.g. after an admin edits the menu) makes all entries that depend on
+it stale without having to know their keys. Entries also expire after a
+TTL, which bounds staleness in other worker processes and for data nobody
+bumps explicitly (such as order-driven popularity).
+
+Cached values outlive the request session, so cache plain data (see
+snapshot()) rather than ORM instances.
+"""
+import threading
+import time
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import LargeBinary
+
+# Invalidation tags used across the app
+TAG_MENU = 'menu'
+TAG_SLIDERS = 'sliders'
+TAG_COUPONS = 'coupons'
+TAG_POPULARITY = 'popularity'
+
+DEFAULT_TTL = 300
+
+
+class TaggedCache:
+    """Thread-safe key/value cache with per-entry TTL and tag versions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._tag_versions = {}
+
+    def _versions(self, tags):
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        """Return the cached value, or None if missing, expired or invalidated"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, tags, versions, value = entry
+            if time.monotonic() >= expires_at or self._versions(tags) != versions:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, tags=(), ttl=DEFAULT_TTL, versions=None):
+        """
+        Store a value
+
+        Pass the tag_versions() read before computing the value, so a bump
+        that races with the computation leaves the entry already stale.
+        """
+        tags = tuple(tags)
+        with self._lock:
+            if versions is None:
+                versions = self._versions(tags)
+            self._entries[key] = (time.monotonic() + ttl, tags, versions, value)
+
+    def tag_versions(self, tags):
+        """Current versions of tags, for set(versions=...)"""
+        with self._lock:
+            return self._versions(tuple(tags))
+
+    def get_or_set(self, key, factory, tags=(), ttl=DEFAULT_TTL):
+        """
+        Return the cached value for key, computing and storing it on a miss
+
+        Args:
+            key: Cache key
+            factory: Callable producing the value (called without the lock held)
+            tags: Invalidation tags the value depends on
+            ttl: Seconds before the entry expires
+
+        Returns:
+            The cached or freshly computed value
+        """
+        value = self.get(key)
+        if value is None:
+            # Read tag versions before computing so a bump that races with
+            # the factory leaves the new entry already stale
+            tags = tuple(tags)
+            with self._lock:
+                versions = self._versions(tags)
+            value = factory()
+            with self._lock:
+                self._entries[key] = (time.monotonic() + ttl, tags, versions, value)
+        return value
+
+    def invalidate(self, *tags):
+        """Bump tags so every entry depending on them is recomputed"""
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = TaggedCache()
+
+
+def cached(key, factory, tags=(), ttl=None):
+    """Cache factory() under key using the app-wide cache (see TaggedCache)"""
+    if ttl is None:
+        ttl = current_app.config.get('CACHE_DEFAULT_TTL', DEFAULT_TTL)
+    return cache.get_or_set(key, factory, tags, ttl)
+
+
+def invalidate(*tags):
+    """Invalidate every cached entry tagged with any of the given tags"""
+    cache.invalidate(*tags)
+
+
+def snapshot(obj):
+    """
+    Copy a model instance's column values into a detached plain object
+
+    Binary columns (image blobs) are skipped. The result supports the same
+    attribute access templates use on the model, without a session.
+    """
+    values = {
+        column.key: getattr(obj, column.key)
+        for column in obj.__table__.columns
+        if not isinstance(column.type, LargeBinary)
+    }
+    return SimpleNamespace(**values)
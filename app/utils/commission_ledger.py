@@ -0,0 +1,343 @@
+"""
+Delivery agent commission ledger
+
+Agents earn a commission on every order they finish: 12% of the order
+total when it is delivered, 6% when it is returned or cancelled. Instead of
+re-summing an agent's whole order history on every page, each change is
+written once to the commission_ledger table:
+
+- earned: the order reached a terminal status with an agent assigned
+- reversal: an earned entry stopped applying (status, agent or amounts
+  changed), with the opposite sign
+- payment / unpaid: the admin marked the commission as paid (or not). A
+  paid order whose commission changes later (say delivered, then returned)
+  gets an unpaid entry for the old amount and a payment for the new one, so
+  paid always equals the current commission of the orders marked paid
+
+Each agent's running totals (earned, paid, cash vs online) are kept in
+commission_balance, updated in the same statement batch as the entries.
+
+Entries are written from Order mapper events on the flush connection, so
+every route that changes an order through the ORM is covered and the
+ledger commits or rolls back with the order. rebuild_commission_ledger()
+recomputes both tables from orders (flask rebuild-commission-ledger);
+flask upgrade-schema runs it once on databases whose orders predate the
+ledger. Until then, a change to an order the ledger never counted writes
+no reversal or unpaid entry, so balances cannot go negative.
+"""
+from datetime import datetime
+from sqlalchemy import event, case, func, select
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from app import db
+from app.models import Order, CommissionLedger, CommissionBalance
+
+COMMISSION_RATES = {'delivered': 0.12, 'returned': 0.06, 'cancelled': 0.06}
+CASH_PAYMENT_METHOD = 'cash_on_delivery'
+EARNING_ENTRIES = ('earned', 'reversal')
+BALANCE_MEASURES = ('earned', 'paid', 'cash_earned', 'online_earned', 'orders')
+
+# Order attributes an entry depends on
+_TRACKED = ('delivery_boy_id', 'status', 'total_amount', 'payment_method', 'delivery_charge',
+            'delivered_at', 'commission_paid', 'commission_paid_at')
+
+
+def order_commission(status, total_amount):
+    """Commission an agent earns on an order total in this status"""
+    return (total_amount or 0) * COMMISSION_RATES.get(status, 0)
+
+
+def payment_channel(payment_method):
+    """'cash' for cash on delivery orders, 'online' otherwise"""
+    return 'cash' if payment_method == CASH_PAYMENT_METHOD else 'online'
+
+
+def _earns(order):
+    return bool(order['delivery_boy_id']) and order['status'] in COMMISSION_RATES
+
+
+def _earning_key(order):
+    """What an earned entry depends on; None when the order earns nothing"""
+    if not _earns(order):
+        return None
+    return (int(order['delivery_boy_id']), order['status'], order['total_amount'] or 0,
+            payment_channel(order['payment_method']), order['delivery_charge'] or 0)
+
+
+def _payment_key(order):
+    """What a payment entry depends on; None when no commission is paid"""
+    if not (order['commission_paid'] and _earns(order)):
+        return None
+    return int(order['delivery_boy_id']), order['status'], order['total_amount'] or 0
+
+
+def _entry(order_id, order, entry_type, sign, day):
+    earning = entry_type in EARNING_ENTRIES
+    return {
+        'agent_id': int(order['delivery_boy_id']),
+        'order_id': order_id,
+        'entry_type': entry_type,
+        'status': order['status'],
+        'channel': payment_channel(order['payment_method']),
+        'amount': sign * order_commission(order['status'], order['total_amount']),
+        'delivery_charge': sign * (order['delivery_charge'] or 0) if earning else 0.0,
+        'order_count': sign if earning else 0,
+        'day': day,
+        'created_at': datetime.utcnow()
+    }
+
+
+def _balance_deltas(entries):
+    """{agent_id: {measure: delta}} for ledger entries"""
+    deltas = {}
+    for entry in entries:
+        delta = deltas.setdefault(entry['agent_id'], dict.fromkeys(BALANCE_MEASURES, 0))
+        if entry['entry_type'] in EARNING_ENTRIES:
+            delta['earned'] += entry['amount']
+            delta[f"{entry['channel']}_earned"] += entry['amount']
+            delta['orders'] += entry['order_count']
+        else:
+            delta['paid'] += entry['amount']
+    return deltas
+
+
+def _add_balances(connection, deltas):
+    """Add deltas to the agents' balance rows in one upsert statement"""
+    rows = [dict(agent_id=agent_id, **delta) for agent_id, delta in deltas.items()]
+    table = CommissionBalance.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = dialect_module.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.agent_id],
+            set_={name: table.c[name] + stmt.excluded[name] for name in BALANCE_MEASURES}
+        )
+        connection.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(**{name: table.c[name] + stmt.inserted[name] for name in BALANCE_MEASURES})
+        connection.execute(stmt)
+    else:
+        for row in rows:
+            updated = connection.execute(
+                table.update().where(table.c.agent_id == row['agent_id']).values(
+                    **{name: table.c[name] + row[name] for name in BALANCE_MEASURES}
+                )
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(**row))
+
+
+def _write_entries(connection, entries):
+    if not entries:
+        return
+    connection.execute(CommissionLedger.__table__.insert(), entries)
+    _add_balances(connection, _balance_deltas(entries))
+
+
+def _event_day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _entry_day(connection, order_id, agent_id, entry_type):
+    """Day of the order's latest entry of a type for the agent, None if it has none"""
+    table = CommissionLedger.__table__
+    return connection.execute(
+        select(table.c.day).where(
+            table.c.order_id == order_id, table.c.agent_id == agent_id, table.c.entry_type == entry_type
+        ).order_by(table.c.id.desc()).limit(1)
+    ).scalar()
+
+
+def _order_entries(connection, order_id, old, new):
+    """Ledger entries for an order going from the old to the new attribute values"""
+    entries = []
+    old_key, new_key = _earning_key(old), _earning_key(new)
+    if old_key != new_key:
+        # A reversal lands on the day of the entry it reverses; orders from
+        # before the ledger existed have none to reverse
+        day = _entry_day(connection, order_id, old_key[0], 'earned') if old_key is not None else None
+        if day is not None:
+            entries.append(_entry(order_id, old, 'reversal', -1, day))
+        if new_key is not None:
+            entries.append(_entry(order_id, new, 'earned', 1, _event_day(new['delivered_at'])))
+
+    # Payments follow the commission, the same rule rebuild_commission_ledger() uses
+    old_paid, new_paid = _payment_key(old), _payment_key(new)
+    if old_paid != new_paid:
+        if old_paid is not None and _entry_day(connection, order_id, old_paid[0], 'payment') is not None:
+            entries.append(_entry(order_id, old, 'unpaid', -1, datetime.utcnow().date()))
+        if new_paid is not None:
+            entries.append(_entry(order_id, new, 'payment', 1, _event_day(new['commission_paid_at'])))
+    return entries
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value when an expired attribute is assigned (e.g. after a
+# commit), so after_update sees what the order changed from
+for _name in _TRACKED:
+    event.listen(getattr(Order, _name), 'set', _keep_old_value, active_history=True)
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, target):
+    new = {name: getattr(target, name) for name in _TRACKED}
+    empty = dict.fromkeys(_TRACKED)
+    _write_entries(connection, _order_entries(connection, target.id, empty, new))
+
+
+@event.listens_for(Order, 'after_update')
+def _order_updated(mapper, connection, target):
+    state = db.inspect(target)
+    old, new = {}, {}
+    changed = False
+    for name in _TRACKED:
+        history = state.attrs[name].history
+        new[name] = getattr(target, name)
+        old[name] = history.deleted[0] if history.deleted else new[name]
+        changed = changed or history.has_changes()
+    if changed:
+        _write_entries(connection, _order_entries(connection, target.id, old, new))
+
+
+def ledger_needs_backfill():
+    """Whether orders earn commission but the ledger is still empty (orders predate it)"""
+    if db.session.query(CommissionLedger.id).first() is not None:
+        return False
+    return db.session.query(Order.id).filter(
+        Order.delivery_boy_id.isnot(None),
+        Order.status.in_(COMMISSION_RATES)
+    ).first() is not None
+
+
+def rebuild_commission_ledger(batch_size=500):
+    """
+    Recompute the ledger and balances from orders
+
+    Each commission-earning order gets one earned entry (dated by delivery,
+    or creation when it was never delivered) and, when paid, one payment
+    entry for its current commission.
+
+    Returns:
+        Number of ledger entries written (not committed)
+    """
+    CommissionLedger.query.delete(synchronize_session=False)
+    CommissionBalance.query.delete(synchronize_session=False)
+
+    balances = {}
+    count = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(
+            Order.id, Order.created_at, *[getattr(Order, name) for name in _TRACKED]
+        ).filter(
+            Order.id > last_id,
+            Order.delivery_boy_id.isnot(None),
+            Order.status.in_(COMMISSION_RATES)
+        ).order_by(Order.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        entries = []
+        for row in batch:
+            order = {name: getattr(row, name) for name in _TRACKED}
+            delivered_day = (row.delivered_at or row.created_at or datetime.utcnow()).date()
+            entries.append(_entry(row.id, order, 'earned', 1, delivered_day))
+            if row.commission_paid:
+                paid_day = row.commission_paid_at.date() if row.commission_paid_at else delivered_day
+                entries.append(_entry(row.id, order, 'payment', 1, paid_day))
+        db.session.execute(CommissionLedger.__table__.insert(), entries)
+        count += len(entries)
+
+        for agent_id, delta in _balance_deltas(entries).items():
+            balance = balances.setdefault(agent_id, dict.fromkeys(BALANCE_MEASURES, 0))
+            for name in BALANCE_MEASURES:
+                balance[name] += delta[name]
+
+    if balances:
+        db.session.execute(CommissionBalance.__table__.insert(), [
+            dict(agent_id=agent_id, **balance) for agent_id, balance in balances.items()
+        ])
+    return count
+
+
+def get_commission_balance(agent_id):
+    """
+    An agent's commission totals, from one primary key lookup
+
+    Returns:
+        Dict with earned, paid, pending, cash, online and orders
+    """
+    balance = db.session.get(CommissionBalance, agent_id)
+    if balance is None:
+        return {'earned': 0.0, 'paid': 0.0, 'pending': 0.0, 'cash': 0.0, 'online': 0.0, 'orders': 0}
+    return {
+        'earned': round(balance.earned, 2),
+        'paid': round(balance.paid, 2),
+        'pending': round(balance.pending, 2),
+        'cash': round(balance.cash_earned, 2),
+        'online': round(balance.online_earned, 2),
+        'orders': balance.orders
+    }
+
+
+def commission_by_day(agent_id, start_day=None, end_day=None, status=None):
+    """
+    An agent's earned commission per day, from one GROUP BY on the ledger
+
+    Args:
+        agent_id: Delivery agent id
+        start_day: First day to include (None: from the start)
+        end_day: Last day to include (None: up to today)
+        status: Only orders that ended in this status (None: all)
+
+    Returns:
+        Dict {date: {'count', 'earnings', 'commission', 'cash', 'online'}},
+        oldest first, leaving out days whose entries cancel out
+    """
+    cash = CommissionLedger.channel == 'cash'
+    query = db.session.query(
+        CommissionLedger.day,
+        func.sum(CommissionLedger.order_count),
+        func.sum(CommissionLedger.delivery_charge),
+        func.sum(CommissionLedger.amount),
+        func.sum(case((cash, CommissionLedger.amount), else_=0)),
+        func.sum(case((cash, 0), else_=CommissionLedger.amount))
+    ).filter(
+        CommissionLedger.agent_id == agent_id,
+        CommissionLedger.entry_type.in_(EARNING_ENTRIES)
+    )
+    if start_day is not None:
+        query = query.filter(CommissionLedger.day >= start_day)
+    if end_day is not None:
+        query = query.filter(CommissionLedger.day <= end_day)
+    if status is not None:
+        query = query.filter(CommissionLedger.status == status)
+
+    days = {}
+    for day, count, earnings, commission, cash_amount, online_amount in query.group_by(
+            CommissionLedger.day).order_by(CommissionLedger.day).all():
+        if not count:
+            continue
+        days[day] = {
+            'count': int(count),
+            'earnings': float(earnings or 0),
+            'commission': float(commission or 0),
+            'cash': float(cash_amount or 0),
+            'online': float(online_amount or 0)
+        }
+    return days
+
+
+def sum_days(days):
+    """Totals over commission_by_day() output"""
+    totals = {'count': 0, 'earnings': 0.0, 'commission': 0.0, 'cash': 0.0, 'online': 0.0}
+    for figures in days.values():
+        for name in totals:
+            totals[name] += figures[name]
+    return totals
@@ -0,0 +1,204 @@
+"""
+Coupon lookup and redemption
+
+Validity checks run on every coupon apply and checkout, so coupons are
+served from the in-process cache, keyed by code. Redemption happens once,
+at order placement, as a single conditional UPDATE that increments
+used_count only while the coupon is still redeemable. Concurrent checkouts
+cannot oversubscribe a limited coupon, and nothing reads the row under a
+lock first.
+
+find_best_offer() scores every active coupon against a cart at once. Only
+coupons are ranked: special offers are advertised on the offers page but
+neither PricingEngine nor order placement applies them, so suggesting one
+would promise a saving checkout never gives. Coupon definitions are kept in
+the cache as a CouponTable, so scoring is one pass over plain values with
+no queries.
+"""
+import math
+from datetime import datetime
+from app import db
+from app.models import Coupon
+from app.utils.cache import cached, invalidate, snapshot, TAG_COUPONS
+
+
+def _coupon_tag(code):
+    return f'coupon:{code}'
+
+
+def get_coupon(code):
+    """
+    Cached snapshot of the coupon with this code
+
+    Args:
+        code: Coupon code (case-insensitive)
+
+    Returns:
+        Detached coupon snapshot, or None if no coupon has this code
+    """
+    code = (code or '').upper().strip()
+    if not code:
+        return None
+
+    def load():
+        coupon = Coupon.query.filter_by(code=code).first()
+        # False caches unknown codes too (None would mean "not cached")
+        return snapshot(coupon) if coupon else False
+
+    return cached(f'coupon:{code}', load, tags=(TAG_COUPONS, _coupon_tag(code))) or None
+
+
+def coupon_error(coupon, now=None):
+    """
+    Why a coupon cannot be used right now
+
+    The usage count comes from the cache and may lag behind; it only
+    rejects coupons early. redeem_coupon() enforces the limit.
+
+    Args:
+        coupon: Coupon or snapshot from get_coupon()
+        now: Time to check against (defaults to utcnow)
+
+    Returns:
+        Message for the customer, or None if the coupon can be used
+    """
+    now = now or datetime.utcnow()
+    if not coupon.is_active:
+        return 'This coupon is no longer active'
+    if coupon.valid_from and coupon.valid_from > now:
+        return 'This coupon is not valid yet'
+    if coupon.valid_until < now:
+        return 'This coupon has expired'
+    if coupon.usage_limit and (coupon.used_count or 0) >= coupon.usage_limit:
+        return 'This coupon has reached its usage limit'
+    return None
+
+
+def redeem_coupon(coupon):
+    """
+    Atomically count one use of a coupon
+
+    Issues UPDATE ... SET used_count = used_count + 1 WHERE the coupon is
+    active, inside its validity window and under its usage limit. Call it
+    as the last statement before committing the order, so the row lock the
+    UPDATE takes is held as briefly as possible.
+
+    Args:
+        coupon: Coupon or snapshot (only id and code are used)
+
+    Returns:
+        True if the use was counted, False if the coupon can no longer be
+        redeemed (the cached copy is refreshed in that case)
+    """
+    now = datetime.utcnow()
+    used_count = db.func.coalesce(Coupon.used_count, 0)
+    redeemed = Coupon.query.filter(
+        Coupon.id == coupon.id,
+        Coupon.is_active == True,
+        db.or_(Coupon.valid_from.is_(None), Coupon.valid_from <= now),
+        Coupon.valid_until >= now,
+        # A limit of 0 means unlimited, as in coupon_error()
+        db.or_(Coupon.usage_limit.is_(None), Coupon.usage_limit == 0, used_count < Coupon.usage_limit)
+    ).update({Coupon.used_count: used_count + 1}, synchronize_session=False)
+
+    if not redeemed:
+        invalidate(_coupon_tag(coupon.code), TAG_COUPONS)
+    return bool(redeemed)
+
+
+class CouponTable:
+    """
+    Active coupons, prepared for scoring
+
+    One entry per coupon: whether it is a percentage, its value, minimum
+    order, maximum percentage discount (inf when uncapped), its validity
+    window as timestamps and the uses left (inf when unlimited, i.e. no or a
+    zero usage limit). These are the checks coupon_error() and
+    pricing.coupon_discount_for() apply at checkout.
+    """
+
+    def __init__(self, coupons):
+        self.entries = []
+        for coupon in coupons:
+            remaining = math.inf if not coupon.usage_limit else coupon.usage_limit - (coupon.used_count or 0)
+            self.entries.append({
+                'id': coupon.id,
+                'code': coupon.code,
+                'title': coupon.description or f"Coupon: {coupon.code}",
+                'is_percentage': coupon.discount_type == 'percentage',
+                'value': coupon.discount_value,
+                'min_order': coupon.min_order_amount or 0,
+                'max_discount': coupon.max_discount_amount or math.inf,
+                'valid_from': coupon.valid_from.timestamp() if coupon.valid_from else -math.inf,
+                'valid_until': coupon.valid_until.timestamp(),
+                'remaining': remaining
+            })
+
+    def _savings(self, subtotal, now):
+        savings = []
+        for entry in self.entries:
+            # Same arithmetic as pricing.coupon_discount_for()
+            if entry['is_percentage']:
+                discount = min(subtotal * entry['value'] / 100, entry['max_discount'])
+            else:
+                discount = entry['value']
+            discount = min(discount, subtotal)
+            eligible = (
+                entry['valid_from'] <= now <= entry['valid_until'] and entry['remaining'] > 0 and
+                subtotal >= entry['min_order']
+            )
+            savings.append(discount if eligible else 0.0)
+        return savings
+
+    def best(self, lines, now=None):
+        """
+        The coupon saving the most on a cart
+
+        Args:
+            lines: Cart lines (quantity and food_item with price)
+            now: Time to check validity against (defaults to utcnow)
+
+        Returns:
+            Dict with id, code, title and saving, or None if no coupon
+            applies
+        """
+        if not self.entries or not lines:
+            return None
+        now = (now or datetime.utcnow()).timestamp()
+
+        subtotal = sum(line.food_item.price * line.quantity for line in lines)
+        savings = self._savings(subtotal, now)
+        # Ties go to the oldest coupon
+        best_index = max(range(len(savings)), key=lambda i: (savings[i], -i))
+        saving = savings[best_index]
+        if saving <= 0:
+            return None
+        entry = self.entries[best_index]
+        return {
+            'id': entry['id'],
+            'code': entry['code'],
+            'title': entry['title'],
+            'saving': round(saving, 2)
+        }
+
+
+def get_coupon_table():
+    """Cached CouponTable of active coupons"""
+    def load():
+        return CouponTable(Coupon.query.filter(Coupon.is_active == True).order_by(Coupon.id).all())
+
+    return cached('coupon_table', load, tags=(TAG_COUPONS,))
+
+
+def find_best_offer(lines, now=None):
+    """
+    Best saving any active coupon gives on a cart
+
+    Args:
+        lines: Cart lines, e.g. CartQuote.lines
+        now: Time to check validity against (defaults to utcnow)
+
+    Returns:
+        See CouponTable.best()
+    """
+    return get_coupon_table().best(lines, now)
@@ -0,0 +1,231 @@
+"""
+Server-Sent Events fan-out for order updates
+
+Order status changes and new orders are published to channels: the
+customer ('user:<id>'), the assigned delivery agent ('user:<id>') and
+'admins'. Each open /events/stream connection subscribes to its own
+channels in the worker process that serves it.
+
+Publishing happens from Order mapper events, so every route that changes an
+order's status through the ORM is covered. How an event reaches the other
+workers depends on EVENTS_BACKEND:
+
+- 'postgres' (default on PostgreSQL): the event is sent with pg_notify() on
+  the connection of the flush. NOTIFY is transactional, so listeners only
+  hear about committed changes. Each worker with open streams runs one
+  LISTEN thread on a dedicated connection and hands events to its streams.
+- 'local' (default elsewhere, e.g. SQLite or a single worker): the event is
+  delivered to this process's streams after the session commits.
+"""
+import json
+import queue
+import select
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, text
+from app import db
+from app.models import Order
+from app.utils.transaction_hooks import run_after_commit
+
+PG_CHANNEL = 'bhojan_events'
+ADMIN_CHANNEL = 'admins'
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTEN_POLL_SECONDS = 30
+LISTEN_RETRY_SECONDS = 5
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def channels_for(user):
+    """Channels an SSE connection of this user subscribes to"""
+    channels = [user_channel(user.id)]
+    if user.is_admin:
+        channels.append(ADMIN_CHANNEL)
+    return channels
+
+
+class Subscription:
+    """Queue of events for one open stream"""
+
+    def __init__(self, channels):
+        self.channels = tuple(channels)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        """Next (event, data) pair, or None after timeout seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """In-process fan-out from channels to open streams"""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+    def deliver(self, channels, event_name, data):
+        """Hand an event to every local stream subscribed to any of the channels"""
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscriptions.get(channel, ()))
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait((event_name, data))
+            except queue.Full:
+                # A stalled client loses events rather than blocking the others
+                pass
+
+
+broker = EventBroker()
+
+
+class PostgresListener:
+    """One LISTEN connection per worker process, started by the first stream"""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self, app):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            url = db.engine.url.set(drivername='postgresql')
+            self._thread = threading.Thread(
+                target=self._listen_forever,
+                args=(url.render_as_string(hide_password=False), app.logger),
+                name='events-listener',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _listen_forever(self, dsn, logger):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {PG_CHANNEL}')
+                while True:
+                    if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        _deliver_payload(connection.notifies.pop(0).payload, logger)
+            except Exception as e:
+                logger.error(f"Event listener connection lost: {str(e)}")
+                time.sleep(LISTEN_RETRY_SECONDS)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+
+_listener = PostgresListener()
+
+
+def _deliver_payload(payload, logger):
+    try:
+        message = json.loads(payload)
+        broker.deliver(message['channels'], message['event'], message['data'])
+    except (ValueError, KeyError) as e:
+        logger.error(f"Ignoring malformed event payload: {str(e)}")
+
+
+def events_backend():
+    """'postgres' or 'local', from EVENTS_BACKEND or the database dialect"""
+    backend = current_app.config.get('EVENTS_BACKEND')
+    if backend:
+        return backend
+    return 'postgres' if db.engine.dialect.name == 'postgresql' else 'local'
+
+
+def subscribe(user):
+    """Subscribe to a user's channels, starting this worker's listener if needed"""
+    if events_backend() == 'postgres':
+        _listener.ensure_started(current_app._get_current_object())
+    return broker.subscribe(channels_for(user))
+
+
+def publish(connection, channels, event_name, data):
+    """
+    Publish an event once the current transaction commits
+
+    Args:
+        connection: Connection of the transaction making the change
+        channels: Channel names to deliver to
+        event_name: SSE event name
+        data: JSON-serialisable payload
+    """
+    channels = list(channels)
+    if events_backend() == 'postgres':
+        payload = json.dumps({'channels': channels, 'event': event_name, 'data': data})
+        connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                           {'channel': PG_CHANNEL, 'payload': payload})
+    else:
+        run_after_commit(lambda: broker.deliver(channels, event_name, data))
+
+
+def _order_channels(order, *extra_user_ids):
+    # Routes may assign ids straight from form data, so normalise them
+    user_ids = {int(user_id) for user_id in (order.user_id, order.delivery_boy_id, *extra_user_ids) if user_id}
+    return [user_channel(user_id) for user_id in sorted(user_ids)] + [ADMIN_CHANNEL]
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_placed(mapper, connection, target):
+    publish(connection, [ADMIN_CHANNEL], 'order_placed', {
+        'order_id': target.id,
+        'status': target.status,
+        'total_amount': target.total_amount,
+        'at': datetime.utcnow().isoformat()
+    })
+
+
+@event.listens_for(Order, 'after_update')
+def _order_status_changed(mapper, connection, target):
+    state = db.inspect(target)
+    status = state.attrs.status.history
+    agent = state.attrs.delivery_boy_id.history
+    if not status.has_changes() and not agent.has_changes():
+        return
+
+    # A reassigned order also tells the agent it was taken from
+    previous_agents = [user_id for user_id in agent.deleted if user_id]
+    publish(connection, _order_channels(target, *previous_agents), 'order_status', {
+        'order_id': target.id,
+        'status': target.status,
+        'previous_status': status.deleted[0] if status.deleted else target.status,
+        'delivery_boy_id': int(target.delivery_boy_id) if target.delivery_boy_id else None,
+        'at': datetime.utcnow().isoformat()
+    })
@@ -0,0 +1,302 @@
+"""
+Streaming CSV and XLSX exports
+
+Each dataset is a Core SELECT of plain columns executed with yield_per, so
+rows come off a server-side cursor in batches and are encoded and sent as
+they arrive. Memory use does not depend on the number of rows and the
+download starts with the first batch.
+
+XLSX files are written as a zip stream (Python's zipfile supports
+unseekable outputs) with inline strings, so no spreadsheet library is
+needed. Sheets roll over at Excel's row limit.
+
+Customer-entered text (names, reviews, instructions) ends up in these
+files. In CSV a cell starting with =, +, -, @ (or a tab or carriage return)
+is run as a formula by spreadsheet apps, so such strings are prefixed with
+a single quote. XLSX inline strings are never evaluated.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+from sqlalchemy import select, case, and_
+from app import db
+from app.models import Order, OrderItem, FoodItem, User, Review
+from app.utils.commission_ledger import COMMISSION_RATES
+
+BATCH_SIZE = 1000
+# Leading characters that make spreadsheet apps treat a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+FORMATS = ('csv', 'xlsx')
+MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+
+def _orders(start, end):
+    return select(
+        Order.id.label('order_id'), Order.created_at, Order.status, Order.user_id,
+        Order.customer_name, Order.phone_number, Order.payment_method, Order.payment_status,
+        Order.subtotal, Order.discount_amount, Order.coupon_discount, Order.gst_amount,
+        Order.delivery_charge, Order.total_amount, Order.delivery_boy_id, Order.delivered_at
+    ).where(Order.created_at >= start, Order.created_at < end).order_by(Order.id)
+
+
+def _order_items(start, end):
+    return select(
+        OrderItem.order_id, Order.created_at.label('order_created_at'), Order.status.label('order_status'),
+        OrderItem.food_item_id, FoodItem.name.label('food_item'), FoodItem.category,
+        OrderItem.quantity, OrderItem.price, (OrderItem.price * OrderItem.quantity).label('line_total')
+    ).join(
+        Order, Order.id == OrderItem.order_id
+    ).outerjoin(
+        FoodItem, FoodItem.id == OrderItem.food_item_id
+    ).where(Order.created_at >= start, Order.created_at < end).order_by(OrderItem.order_id, OrderItem.id)
+
+
+def _commissions(start, end):
+    rate = case(
+        *[(Order.status == status, rate) for status, rate in COMMISSION_RATES.items()],
+        else_=0
+    )
+    return select(
+        Order.id.label('order_id'), Order.created_at, Order.delivered_at, Order.status,
+        Order.delivery_boy_id, User.username.label('delivery_agent'), Order.total_amount,
+        rate.label('commission_rate'), (Order.total_amount * rate).label('commission'),
+        Order.commission_paid, Order.commission_paid_at, Order.commission_payment_method,
+        Order.commission_reference_id
+    ).join(
+        User, User.id == Order.delivery_boy_id
+    ).where(
+        Order.created_at >= start, Order.created_at < end,
+        Order.status.in_(COMMISSION_RATES)
+    ).order_by(Order.id)
+
+
+def _reviews(start, end):
+    return select(
+        Review.id.label('review_id'), Review.created_at, Review.user_id, User.username,
+        Review.food_item_id, FoodItem.name.label('food_item'), Review.rating, Review.comment,
+        Review.is_approved, Review.is_verified_purchase, Review.helpful_count, Review.admin_reply
+    ).outerjoin(
+        User, User.id == Review.user_id
+    ).outerjoin(
+        FoodItem, FoodItem.id == Review.food_item_id
+    ).where(and_(Review.created_at >= start, Review.created_at < end)).order_by(Review.id)
+
+
+# Dataset name -> SELECT builder taking a [start, end) datetime range
+DATASETS = {
+    'orders': _orders,
+    'order_items': _order_items,
+    'commissions': _commissions,
+    'reviews': _reviews
+}
+
+
+def _row_batches(statement):
+    """Header and batches of rows from a server-side cursor"""
+    result = db.session.execute(statement.execution_options(yield_per=BATCH_SIZE))
+    return list(result.keys()), result.partitions()
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def stream_csv(statement):
+    """Encoded CSV chunks, one per batch of rows"""
+    header, batches = _row_batches(statement)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(header)
+    for rows in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ZipSink:
+    """Write-only, unseekable file object that hands out what was written"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+XLSX_MAX_ROWS = 1048576  # Per sheet, header included
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Style 1 formats dates and times (built-in number format 22)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="1"><v>{serial}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{ref}" s="1"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number, columns, values):
+    cells = ''.join(_xlsx_cell(f'{column}{number}', value) for column, value in zip(columns, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def stream_xlsx(statement, sheet_name='Export'):
+    """XLSX file chunks, one per batch of rows"""
+    header, batches = _row_batches(statement)
+    columns = [_column_letter(i) for i in range(len(header))]
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    sheet_count = 0
+    sheet = None
+    row_number = XLSX_MAX_ROWS
+    for rows in batches:
+        parts = []
+        for row in rows:
+            if row_number >= XLSX_MAX_ROWS:
+                if sheet is not None:
+                    sheet.write(''.join(parts).encode('utf-8') + _SHEET_END.encode('utf-8'))
+                    sheet.close()
+                    parts = []
+                sheet_count += 1
+                sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True)
+                parts.append(_SHEET_START)
+                parts.append(_xlsx_row(1, columns, header))
+                row_number = 1
+            row_number += 1
+            parts.append(_xlsx_row(row_number, columns, row))
+        sheet.write(''.join(parts).encode('utf-8'))
+        yield sink.drain()
+
+    if sheet is None:
+        sheet_count = 1
+        sheet = archive.open('xl/worksheets/sheet1.xml', 'w')
+        sheet.write((_SHEET_START + _xlsx_row(1, columns, header)).encode('utf-8'))
+    sheet.write(_SHEET_END.encode('utf-8'))
+    sheet.close()
+
+    numbers = range(1, sheet_count + 1)
+    names = [escape(sheet_name if sheet_count == 1 else f'{sheet_name} {n}')[:31] for n in numbers]
+    archive.writestr('[Content_Types].xml', _CONTENT_TYPES.format(
+        sheets=''.join(_SHEET_CONTENT_TYPE.format(n=n) for n in numbers)))
+    archive.writestr('_rels/.rels', _ROOT_RELS)
+    archive.writestr('xl/workbook.xml', _WORKBOOK.format(sheets=''.join(
+        f'<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>' for n, name in zip(numbers, names))))
+    archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(sheets=''.join(
+        f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{n}.xml"/>' for n in numbers)))
+    archive.writestr('xl/styles.xml', _STYLES)
+    archive.close()
+    yield sink.drain()
+
+
+def export_chunks(dataset, export_format, start, end):
+    """
+    Generator of file chunks for a dataset over a created_at range
+
+    Args:
+        dataset: One of DATASETS
+        export_format: 'csv' or 'xlsx'
+        start: Range start (inclusive datetime)
+        end: Range end (exclusive datetime)
+    """
+    statement = DATASETS[dataset](start, end)
+    if export_format == 'xlsx':
+        return stream_xlsx(statement, sheet_name=dataset.replace('_', ' ').title())
+    return stream_csv(statement)
@@ -49,19 +49,8 @@ def paginate_query(query, page, per_page=10):
         error_out=False
     )
 
-def search_food_items(query, category=None):
-    """Search food items by name and optionally filter by category."""
-    from app.models import FoodItem
-    
-    search_query = FoodItem.query.filter(FoodItem.is_available == True)
-    
-    if query:
-        search_query = search_query.filter(
-            FoodItem.name.ilike(f'%{query}%') |
-            FoodItem.description.ilike(f'%{query}%')
-        )
-    
-    if category and category != 'all':
-        search_query = search_query.filter(FoodItem.category == category)
-    
-    return search_query.all()
+def search_food_items(query, category=None, price_min=None, price_max=None, limit=None):
+    """Search food items by relevance and optionally filter by category and price."""
+    from app.utils.search import search_food_items as ranked_search
+
+    return ranked_search(query, category=category, price_min=price_min, price_max=price_max, limit=limit)
@@ -0,0 +1,95 @@
+"""
+HTTP caching helpers for image routes
+
+Images are addressed by a short content hash. A URL that carries the hash
+never changes meaning, so it is served as immutable for a year; URLs
+without it are served with the same hash as a strong ETag and must be
+revalidated, which costs a 304 instead of the full body.
+"""
+import hashlib
+import os
+import threading
+from flask import request, make_response
+
+HASH_LENGTH = 16
+IMMUTABLE_MAX_AGE = 31536000  # One year
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def content_hash(data):
+    """Short, URL-safe hash of some bytes"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def file_content_hash(path):
+    """
+    Content hash of a file, cached per process until the file changes
+
+    Args:
+        path: Path to the file on disk
+
+    Returns:
+        The hash, or None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        digest = content_hash(f.read())
+    with _file_hashes_lock:
+        _file_hashes[path] = (version, digest)
+    return digest
+
+
+def not_modified(etag):
+    """True when the request already holds the representation with this ETag"""
+    return etag is not None and etag in request.if_none_match
+
+
+def _apply_cache_headers(response, etag, immutable):
+    response.set_etag(etag)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Revalidate every time; a matching ETag costs a 304 only
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = 0
+    return response
+
+
+def not_modified_response(etag, immutable=False):
+    """Empty 304 response carrying the usual cache headers"""
+    return _apply_cache_headers(make_response('', 304), etag, immutable)
+
+
+def cacheable_response(etag, load, immutable=False):
+    """
+    Build an image response with ETag and Cache-Control, or a 304
+
+    Args:
+        etag: Content hash used as a strong ETag
+        load: Callable returning (data, mimetype); only called when the
+              body is actually sent
+        immutable: Whether the URL carries the hash (long-lived, immutable)
+
+    Returns:
+        Flask response
+    """
+    if not_modified(etag):
+        return not_modified_response(etag, immutable)
+
+    data, mimetype = load()
+    response = make_response(data)
+    response.mimetype = mimetype
+    return _apply_cache_headers(response, etag, immutable)
@@ -0,0 +1,207 @@
+"""
+Responsive image derivatives
+
+After an upload commits, a background worker renders each image at a fixed
+set of widths in WebP and JPEG, stores the files in the configured storage
+backend next to the original and records them in the owner's image_variants column. Templates use
+image_srcset() so list pages download a thumbnail instead of the full
+image. Until the derivatives exist the original image is used as before.
+When a food image is replaced, the previous derivatives are deleted from
+storage once the new set is recorded.
+"""
+import io
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from PIL import Image
+from app import db
+from app.models import FoodItem, ReviewImage
+from app.utils.transaction_hooks import run_after_commit
+from app.utils.storage import get_storage
+
+DERIVATIVE_WIDTHS = (160, 400, 800)
+
+# format name -> (PIL format, MIME type, file extension)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg')
+}
+DERIVATIVE_QUALITY = 82
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_derivatives(image_bytes, widths=DERIVATIVE_WIDTHS):
+    """
+    Resize an image to each width in every derivative format
+
+    Images are never upscaled: widths larger than the original collapse to
+    a single derivative at the original width.
+
+    Args:
+        image_bytes: Encoded source image
+        widths: Target widths in pixels
+
+    Returns:
+        List of (width, format name, encoded bytes) tuples
+    """
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        source.load()
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'transparency' in source.info else 'RGB')
+
+        derivatives = []
+        for width in sorted({min(width, source.width) for width in widths}):
+            height = max(1, round(source.height * width / source.width))
+            resized = source.resize((width, height), Image.Resampling.LANCZOS) if width != source.width else source
+
+            for name, (pil_format, _, _) in DERIVATIVE_FORMATS.items():
+                image = resized
+                if pil_format == 'JPEG' and image.mode == 'RGBA':
+                    # JPEG has no alpha channel; flatten onto white
+                    flattened = Image.new('RGB', image.size, (255, 255, 255))
+                    flattened.paste(image, mask=image.split()[3])
+                    image = flattened
+                output = io.BytesIO()
+                image.save(output, format=pil_format, quality=DERIVATIVE_QUALITY, optimize=True)
+                derivatives.append((width, name, output.getvalue()))
+    return derivatives
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('IMAGE_WORKERS', 2),
+                    thread_name_prefix='image-derivatives'
+                )
+    return _executor
+
+
+def _run_job(app, job, args):
+    with app.app_context():
+        try:
+            job(*args)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error building image derivatives: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def _submit(job, *args):
+    """Run a job off the request thread (inline when IMAGE_PROCESSING_SYNC is set)"""
+    app = current_app._get_current_object()
+    if app.config.get('IMAGE_PROCESSING_SYNC'):
+        _run_job(app, job, args)
+    else:
+        _get_executor().submit(_run_job, app, job, args)
+
+
+def _store_derivatives(image_bytes, path_prefix):
+    """Render and upload derivatives as '<path_prefix>_<width>.<ext>'"""
+    storage = get_storage()
+    variants = []
+    for width, name, data in render_derivatives(image_bytes):
+        _, mimetype, extension = DERIVATIVE_FORMATS[name]
+        path = f"{path_prefix}_{width}{extension}"
+        url = storage.upload(path, data, mimetype)
+        variants.append({'width': width, 'format': name, 'path': path, 'url': url})
+    return variants
+
+
+def variant_paths(variants):
+    """Storage paths of recorded derivatives"""
+    return [variant['path'] for variant in variants or []]
+
+
+def _delete_derivatives(paths):
+    storage = get_storage()
+    for path in paths:
+        storage.delete(path)
+
+
+def _build_food_derivatives(food_id, image_bytes, source_url, old_paths=()):
+    from app.utils.cache import invalidate, TAG_MENU
+
+    variants = _store_derivatives(image_bytes, f"uploads/food/derived/{uuid.uuid4().hex}")
+
+    # Only record them if the image was not replaced in the meantime
+    recorded = FoodItem.query.filter_by(id=food_id, image_url=source_url).update({FoodItem.image_variants: variants})
+    db.session.commit()
+    invalidate(TAG_MENU)
+
+    # The previous image's derivatives are unreferenced now; so is a new set
+    # that lost the race to a newer image
+    _delete_derivatives(list(old_paths) + ([] if recorded else variant_paths(variants)))
+
+
+def _build_review_derivatives(review_image_id, image_bytes, path_prefix):
+    variants = _store_derivatives(image_bytes, path_prefix)
+    ReviewImage.query.filter_by(id=review_image_id).update({ReviewImage.image_variants: variants})
+    db.session.commit()
+
+
+def schedule_food_derivatives(food_item, image_bytes):
+    """
+    Build derivatives for a food item's new image once the upload commits
+
+    Args:
+        food_item: FoodItem whose image_url was just set (flushed, so it has an ID)
+        image_bytes: The uploaded image as stored
+    """
+    if not image_bytes:
+        return
+    old_paths = variant_paths(food_item.image_variants)
+    food_item.image_variants = None
+    food_id, source_url = food_item.id, food_item.image_url
+    run_after_commit(lambda: _submit(_build_food_derivatives, food_id, image_bytes, source_url, old_paths))
+
+
+def discard_food_derivatives(food_item):
+    """Forget a food item's derivatives and delete them once the change commits"""
+    old_paths = variant_paths(food_item.image_variants)
+    food_item.image_variants = None
+    if old_paths:
+        run_after_commit(lambda: _submit(_delete_derivatives, old_paths))
+
+
+def schedule_review_derivatives(review_image, image_bytes):
+    """Build derivatives for a saved review image once it commits"""
+    from app.utils.image_utils import review_storage_path
+
+    db.session.flush()
+    review_image_id = review_image.id
+    path_prefix = review_storage_path(review_image.filename.rsplit('.', 1)[0])
+    run_after_commit(lambda: _submit(_build_review_derivatives, review_image_id, image_bytes, path_prefix))
+
+
+def variant_url(variant):
+    """Public URL of one recorded derivative"""
+    if variant.get('url'):
+        return variant['url']
+    from app.utils.image_utils import stored_file_url
+    return stored_file_url(variant['path'])
+
+
+def image_srcset(owner, image_format='webp'):
+    """
+    srcset attribute value for an item's derivatives in one format
+
+    Args:
+        owner: FoodItem, ReviewImage or a cached snapshot of either
+        image_format: 'webp' or 'jpeg'
+
+    Returns:
+        String like "url 160w, url 400w", or '' when none are recorded yet
+    """
+    variants = getattr(owner, 'image_variants', None) or []
+    return ', '.join(
+        f"{variant_url(variant)} {variant['width']}w"
+        for variant in sorted(variants, key=lambda variant: variant['width'])
+        if variant['format'] == image_format
+    )
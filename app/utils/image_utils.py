@@ -1,20 +1,74 @@
 import os
-from flask import current_app
+from flask import current_app, url_for
 import uuid
 from werkzeug.utils import secure_filename
 from PIL import Image
 import io
 
-# Import Supabase storage functions
-from app.utils.supabase_storage import upload_image_to_supabase, get_image_url
+from app.utils.supabase_storage import get_image_url
+from app.utils.storage import get_storage, local_storage
+
+IMAGE_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif'
+}
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif'
+}
+
+def prepare_image(file, width=800, height=600, extension=None):
+    """
+    Resize an uploaded image and encode it for storage
+    
+    Args:
+        file: The file from request.files
+        width: The maximum width
+        height: The maximum height
+        extension: Output format as a file extension (defaults to the upload's)
+        
+    Returns:
+        Tuple (binary_data, content_type, extension)
+    """
+    file_ext = (extension or os.path.splitext(file.filename or '')[1]).lower()
+    
+    img = Image.open(file.stream)
+    
+    # Convert RGBA to RGB if necessary (for JPEG)
+    if img.mode == 'RGBA' and file_ext in ['.jpg', '.jpeg']:
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[3])
+        img = rgb_img
+    
+    # Resize while keeping aspect ratio
+    img.thumbnail((width, height), Image.Resampling.LANCZOS)
+    
+    img_bytes = io.BytesIO()
+    if file_ext in ['.jpg', '.jpeg']:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(img_bytes, format='JPEG', quality=85)
+        content_type = 'image/jpeg'
+    elif file_ext == '.webp':
+        img.save(img_bytes, format='WEBP', quality=85)
+        content_type = 'image/webp'
+    else:
+        img.save(img_bytes, format='PNG', optimize=True)
+        content_type = 'image/png'
+    
+    return img_bytes.getvalue(), content_type, IMAGE_EXTENSIONS[content_type]
 
 def save_image(file, folder='uploads', width=800, height=600):
     """
-    Save an uploaded image file with resizing to Supabase Storage
+    Save an uploaded image file with resizing to the configured storage
     
     Args:
         file: The file from request.files
-        folder: The folder name inside the storage bucket
+        folder: The folder inside storage (e.g., 'uploads/food')
         width: The width to resize to
         height: The height to resize to
         
@@ -25,8 +79,12 @@ def save_image(file, folder='uploads', width=800, height=600):
         return None, None
     
     try:
-        # Upload to Supabase Storage
-        binary_data, public_url = upload_image_to_supabase(file, folder, width, height)
+        binary_data, content_type, extension = prepare_image(file, width, height)
+        
+        # Unique name, keeping the original stem for readability
+        stem = os.path.splitext(secure_filename(file.filename or ''))[0] or 'image'
+        path = f"{folder}/{uuid.uuid4().hex}_{stem}{extension}"
+        public_url = get_storage().upload(path, binary_data, content_type)
         return binary_data, public_url
     
     except Exception as e:
@@ -45,3 +103,134 @@ def get_image_url_from_data(image_data, image_url):
         URL to display
     """
     return get_image_url(image_url, default='/static/images/no-image.png')
+
+def food_image_url(food_item):
+    """
+    URL to display a food item's image
+    
+    Storage URLs are used directly. Legacy database blobs go through the
+    media endpoint, under their content hash once it is known so the
+    browser can cache them indefinitely.
+    
+    Args:
+        food_item: FoodItem (or anything with the same image attributes)
+        
+    Returns:
+        URL string, or None if the item has no image
+    """
+    if food_item.image_url:
+        return food_item.image_url
+    if getattr(food_item, 'has_image_data', False):
+        if food_item.image_hash:
+            return url_for('media.food_image', food_id=food_item.id, version=food_item.image_hash)
+        return url_for('media.food_image', food_id=food_item.id)
+    return None
+
+REVIEW_UPLOAD_FOLDER = 'uploads/reviews'
+LEGACY_STATIC_PREFIX = '/static/'
+
+def review_storage_path(filename):
+    """Storage path of a review image or derivative"""
+    return f"{REVIEW_UPLOAD_FOLDER}/{filename}"
+
+def stored_file_url(path):
+    """
+    URL of a file saved through storage, given its storage path
+    
+    Paths recorded before storage was pluggable ('/static/...') always
+    refer to files in the static folder, whichever backend is configured.
+    """
+    if path.startswith(LEGACY_STATIC_PREFIX):
+        return local_storage().url(path[len(LEGACY_STATIC_PREFIX):])
+    return get_storage().url(path)
+
+def review_image_url(review_image):
+    """
+    URL of a stored review image
+    
+    Local files are served under their content hash so browsers can cache
+    them indefinitely.
+    """
+    return stored_file_url(review_image.image_path or LEGACY_STATIC_PREFIX + review_storage_path(review_image.filename))
+
+SLIDER_UPLOAD_FOLDER = 'uploads/sliders'
+
+def slider_storage_path(slider):
+    """Storage path of a slider image (legacy sliders live in the static folder)"""
+    path = f"{SLIDER_UPLOAD_FOLDER}/{slider.image_filename}"
+    return path if slider.image_url else LEGACY_STATIC_PREFIX + path
+
+def slider_image_url(slider):
+    """URL of a homepage slider image"""
+    return slider.image_url or stored_file_url(slider_storage_path(slider))
+
+def delete_stored_file(path):
+    """Delete a file by storage path, wherever it was stored"""
+    if path.startswith(LEGACY_STATIC_PREFIX):
+        return local_storage().delete(path[len(LEGACY_STATIC_PREFIX):])
+    return get_storage().delete(path)
+
+def detect_image_type(image_data, default='image/jpeg'):
+    """
+    Detect the MIME type of stored image bytes
+    
+    Args:
+        image_data: Binary image data
+        default: MIME type to use when the format is not recognised
+        
+    Returns:
+        MIME type string
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            return IMAGE_MIME_TYPES.get(img.format, default)
+    except Exception:
+        return default
+
+def migrate_food_image_blobs(batch_size=20, keep_blobs=False):
+    """
+    Move FoodItem.image_data blobs into the configured storage
+    
+    Each blob is uploaded, its public URL stored in image_url and the blob
+    cleared. Blobs are loaded one at a time and committed in batches, so
+    the command can be interrupted and re-run safely.
+    
+    Args:
+        batch_size: Number of items per commit
+        keep_blobs: Keep the blob after uploading instead of clearing it
+        
+    Returns:
+        Tuple (migrated_count, failed_count)
+    """
+    from app import db
+    from app.models import FoodItem
+    
+    query = db.session.query(FoodItem.id).filter(FoodItem.has_image_data == True)
+    if keep_blobs:
+        # Items that already have a URL have nothing left to do
+        query = query.filter(FoodItem.image_url.is_(None))
+    food_ids = [row[0] for row in query.order_by(FoodItem.id).all()]
+    
+    migrated = failed = 0
+    for index, food_id in enumerate(food_ids, start=1):
+        food_item = db.session.get(FoodItem, food_id)
+        try:
+            content_type = detect_image_type(food_item.image_data)
+            if not food_item.image_url:
+                file_path = f"uploads/food/{uuid.uuid4().hex}_food_{food_id}{IMAGE_EXTENSIONS[content_type]}"
+                food_item.image_url = get_storage().upload(file_path, food_item.image_data, content_type)
+            if not keep_blobs:
+                food_item.image_data = None
+                food_item.image_hash = None
+            migrated += 1
+        except Exception as e:
+            failed += 1
+            current_app.logger.error(f"Error migrating image for food item {food_id}: {str(e)}")
+        
+        if index % batch_size == 0:
+            db.session.commit()
+            # Release the blobs loaded so far
+            db.session.expunge_all()
+    
+    db.session.commit()
+    return migrated, failed
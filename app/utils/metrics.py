@@ -0,0 +1,215 @@
+"""
+Request latency histograms in Prometheus text format
+
+Every request is timed from before_request to teardown_request and counted
+per endpoint (the route name, not the path, so the number of series stays
+bounded): a latency histogram over fixed buckets, totals per status code
+and the number of requests in flight. Each endpoint gets its arrays once;
+a request only does a bisect and a few increments under a lock.
+
+Gunicorn workers are separate processes, so each worker writes a snapshot
+of its counters to METRICS_DIR at most every METRICS_FLUSH_INTERVAL
+seconds (atomically, one JSON file per worker). /admin/metrics sums the
+snapshots of all workers. Files of exited workers are kept so counters
+never go backwards; their in-flight counts are ignored. Remove the
+directory to reset the counters.
+"""
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from flask import g, request
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_FLUSH_INTERVAL = 5
+UNMATCHED_ENDPOINT = '<unmatched>'
+METRIC_PREFIX = 'bhojan_http'
+
+
+class EndpointMetrics:
+    """Counters of one endpoint in this process"""
+
+    __slots__ = ('buckets', 'total', 'count', 'statuses', 'in_flight')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.statuses = {}
+        self.in_flight = 0
+
+    def as_dict(self):
+        return {
+            'buckets': list(self.buckets),
+            'sum': self.total,
+            'count': self.count,
+            'statuses': {str(status): count for status, count in self.statuses.items()},
+            'in_flight': self.in_flight
+        }
+
+
+class RequestMetrics:
+    """Per-endpoint counters of this worker process"""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        # Serializes flushes (check, write, rename) between request threads
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._started = int(time.time())
+
+    def _endpoint(self, endpoint):
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints.setdefault(endpoint, EndpointMetrics())
+        return metrics
+
+    def started(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).in_flight += 1
+
+    def finished(self, endpoint, status, duration):
+        index = bisect.bisect_left(LATENCY_BUCKETS, duration)
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.in_flight -= 1
+            metrics.buckets[index] += 1
+            metrics.total += duration
+            metrics.count += 1
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: metrics.as_dict() for endpoint, metrics in self._endpoints.items()}
+
+    def flush(self, directory, interval=0):
+        """Write this worker's snapshot if the last write is older than interval seconds"""
+        with self._flush_lock:
+            now = time.monotonic()
+            if now - self._last_flush < interval:
+                return
+            self._last_flush = now
+
+            os.makedirs(directory, exist_ok=True)
+            pid = os.getpid()
+            path = os.path.join(directory, f'worker-{pid}-{self._started}.json')
+            temporary = f'{path}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump({'pid': pid, 'endpoints': self.snapshot()}, f)
+            os.replace(temporary, path)
+
+
+metrics = RequestMetrics()
+
+
+def metrics_dir(app):
+    return app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'bhojan-metrics')
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def collect_worker_metrics(directory):
+    """
+    Sum the snapshots of every worker that has written one
+
+    Returns:
+        Dict {endpoint: {'buckets', 'sum', 'count', 'statuses', 'in_flight'}}
+    """
+    totals = {}
+    for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _process_alive(snapshot.get('pid', 0))
+        for endpoint, values in snapshot['endpoints'].items():
+            total = totals.setdefault(endpoint, EndpointMetrics().as_dict())
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], values['buckets'])]
+            total['sum'] += values['sum']
+            total['count'] += values['count']
+            for status, count in values['statuses'].items():
+                total['statuses'][status] = total['statuses'].get(status, 0) + count
+            if alive:
+                total['in_flight'] += values['in_flight']
+    return totals
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(totals):
+    """Render collect_worker_metrics() output in the Prometheus text format"""
+    duration = f'{METRIC_PREFIX}_request_duration_seconds'
+    requests_total = f'{METRIC_PREFIX}_requests_total'
+    in_flight = f'{METRIC_PREFIX}_requests_in_flight'
+    bounds = [repr(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+
+    lines = [
+        f'# HELP {duration} Request latency by endpoint',
+        f'# TYPE {duration} histogram'
+    ]
+    for endpoint, values in sorted(totals.items()):
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, count in zip(bounds, values['buckets']):
+            cumulative += count
+            lines.append(f'{duration}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{duration}_sum{{endpoint="{label}"}} {values["sum"]}')
+        lines.append(f'{duration}_count{{endpoint="{label}"}} {values["count"]}')
+
+    lines += [f'# HELP {requests_total} Requests by endpoint and status code', f'# TYPE {requests_total} counter']
+    for endpoint, values in sorted(totals.items()):
+        for status, count in sorted(values['statuses'].items()):
+            lines.append(f'{requests_total}{{endpoint="{_label(endpoint)}",status="{status}"}} {count}')
+
+    lines += [f'# HELP {in_flight} Requests being served', f'# TYPE {in_flight} gauge']
+    for endpoint, values in sorted(totals.items()):
+        lines.append(f'{in_flight}{{endpoint="{_label(endpoint)}"}} {values["in_flight"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Time every request of the app and flush this worker's counters periodically"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    directory = metrics_dir(app)
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        g.metrics_start = time.perf_counter()
+        metrics.started(g.metrics_endpoint)
+
+    @app.after_request
+    def _remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _stop_request_timer(error=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        status = g.pop('metrics_status', 500 if error is not None else 200)
+        metrics.finished(g.pop('metrics_endpoint'), status, time.perf_counter() - start)
+        try:
+            metrics.flush(directory, interval)
+        except OSError as e:
+            app.logger.error(f"Could not write request metrics: {str(e)}")
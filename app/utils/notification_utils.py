@@ -1,6 +1,7 @@
 from datetime import datetime
 from app import db
 from app.models import Notification
+from app.utils.poll_state import user_state_changed
 import platform
 import socket
 
@@ -275,6 +276,8 @@ def mark_notifications_read(user, notification_ids=None):
             query = query.filter(Notification.id.in_(notification_ids))
         
         count = query.update({'is_read': True})
+        # Bulk updates skip the mapper events that bump the poll state
+        user_state_changed(user.id)
         db.session.commit()
         
         return count
@@ -0,0 +1,153 @@
+"""
+Order placement and cart restore for BhojanXpress
+
+Every flow here issues a fixed number of statements whatever the cart
+size: prices come from the single query behind the cart quote, order lines
+are written with one multi-row INSERT and cart quantities are merged with
+one INSERT ... ON CONFLICT (ON DUPLICATE KEY on MySQL) upsert.
+"""
+
+from sqlalchemy import insert, update, func
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from app import db
+from app.models import Order, OrderItem, CartItem, FoodItem
+from app.utils.pricing import cart_changed
+from app.utils.coupons import get_coupon, redeem_coupon
+from app.utils.sales_daily import record_order_placed
+
+
+def _upsert_cart_quantities(user_id, quantities):
+    """Add quantities ({food_item_id: quantity}) to a user's cart lines"""
+    rows = [
+        {'user_id': user_id, 'food_item_id': food_item_id, 'quantity': quantity}
+        for food_item_id, quantity in quantities.items()
+    ]
+    table = CartItem.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = dialect_module.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.food_item_id],
+            set_={'quantity': table.c.quantity + stmt.excluded.quantity}
+        )
+        db.session.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(quantity=table.c.quantity + stmt.inserted.quantity)
+        db.session.execute(stmt)
+    else:
+        # No native upsert: one lookup, one executemany update, one insert
+        existing = {
+            food_item_id: (cart_item_id, quantity)
+            for food_item_id, cart_item_id, quantity in db.session.query(
+                CartItem.food_item_id, CartItem.id, CartItem.quantity
+            ).filter(
+                CartItem.user_id == user_id,
+                CartItem.food_item_id.in_(list(quantities))
+            ).all()
+        }
+        updates = [
+            {'id': existing[row['food_item_id']][0], 'quantity': existing[row['food_item_id']][1] + row['quantity']}
+            for row in rows if row['food_item_id'] in existing
+        ]
+        if updates:
+            db.session.execute(update(CartItem), updates)
+        new_rows = [row for row in rows if row['food_item_id'] not in existing]
+        if new_rows:
+            db.session.execute(insert(CartItem).values(new_rows))
+
+
+class OrderService:
+    """Places orders and moves order lines back into carts"""
+
+    @staticmethod
+    def place_order(user, quote, **details):
+        """
+        Create an order from a freshly priced cart and empty the cart
+
+        The prices stored on the order lines are the ones in the quote, so
+        the order matches what was priced. The applied coupon is redeemed
+        last, keeping its row lock as short as possible. The caller commits.
+
+        Args:
+            user: The ordering user
+            quote: CartQuote from PricingEngine.quote(coupon, fresh=True)
+            **details: Order columns from the checkout form (customer_name,
+                       phone_number, delivery_address, payment_method, ...)
+
+        Returns:
+            The flushed Order, or None if the coupon can no longer be
+            redeemed (the caller must roll back)
+        """
+        order = Order(
+            user_id=user.id,
+            subtotal=quote.subtotal,
+            discount_amount=quote.discount_amount,
+            coupon_discount=quote.coupon_discount,
+            gst_amount=quote.gst_amount,
+            delivery_charge=quote.delivery_charge,
+            total_amount=quote.total_amount,
+            status='pending',
+            **details
+        )
+        db.session.add(order)
+        db.session.flush()  # Get order ID
+
+        db.session.execute(insert(OrderItem).values([
+            {
+                'order_id': order.id,
+                'food_item_id': line.food_item_id,
+                'quantity': line.quantity,
+                'price': line.food_item.price,
+                'category': line.food_item.category
+            }
+            for line in quote.lines
+        ]))
+
+        record_order_placed(order)
+
+        CartItem.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+        cart_changed(user.id)
+
+        if quote.coupon_id and not redeem_coupon(get_coupon(quote.coupon_code)):
+            return None
+        return order
+
+    @staticmethod
+    def add_to_cart(user_id, quantities):
+        """
+        Add items to a user's cart, merging with lines already there
+
+        Args:
+            user_id: Cart owner
+            quantities: Dict {food_item_id: quantity to add}
+        """
+        if not quantities:
+            return
+        _upsert_cart_quantities(user_id, quantities)
+        cart_changed(user_id)
+
+    @staticmethod
+    def restore_to_cart(order, user_id, existing_items_only=False):
+        """
+        Put an order's lines (back) into a user's cart
+
+        Args:
+            order: Order whose items are copied
+            user_id: Cart owner
+            existing_items_only: Skip food items that no longer exist
+
+        Returns:
+            Number of distinct food items added
+        """
+        query = db.session.query(OrderItem.food_item_id, func.sum(OrderItem.quantity)).filter(
+            OrderItem.order_id == order.id
+        )
+        if existing_items_only:
+            query = query.join(FoodItem, FoodItem.id == OrderItem.food_item_id)
+        quantities = {food_item_id: int(quantity) for food_item_id, quantity in query.group_by(OrderItem.food_item_id).all()}
+
+        OrderService.add_to_cart(user_id, quantities)
+        return len(quantities)
@@ -0,0 +1,95 @@
+"""
+Per-user state versions for the combined navbar poll
+
+Open tabs poll /api/poll for the cart count, unread notification count and
+the status of recent orders. Each user row carries two counters:
+cart_version (bumped by pricing.cart_changed()) and state_version, bumped
+here whenever one of the user's notifications or orders changes. Together
+they form the poll ETag. Flask-Login loads the user row anyway, so an
+unchanged state is answered with a 304 without any further query.
+
+state_version is bumped from mapper events, so every code path that adds,
+edits or deletes a Notification or changes an Order's status through the
+ORM is covered. Bulk query.update() calls bypass these events and must call
+user_state_changed() themselves.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import db
+from app.models import User, Notification, Order, CartItem
+
+# Orders shown by the poll besides those still in progress
+RECENT_ORDER_WINDOW = timedelta(days=1)
+FINAL_ORDER_STATUSES = ('delivered', 'cancelled', 'returned')
+
+
+def _bump_statement(user_ids):
+    return User.__table__.update().where(User.__table__.c.id.in_(user_ids)).values(
+        state_version=db.func.coalesce(User.__table__.c.state_version, 0) + 1
+    )
+
+
+def user_state_changed(*user_ids):
+    """Bump the poll state version of users (in the current transaction)"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        db.session.execute(_bump_statement(user_ids))
+
+
+@event.listens_for(Notification, 'after_insert')
+@event.listens_for(Notification, 'after_update')
+@event.listens_for(Notification, 'after_delete')
+def _notification_changed(mapper, connection, target):
+    if target.user_id:
+        connection.execute(_bump_statement({target.user_id}))
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_placed(mapper, connection, target):
+    if target.user_id:
+        connection.execute(_bump_statement({target.user_id}))
+
+
+@event.listens_for(Order, 'after_update')
+def _order_changed(mapper, connection, target):
+    if target.user_id and db.inspect(target).attrs.status.history.has_changes():
+        connection.execute(_bump_statement({target.user_id}))
+
+
+def poll_etag(user):
+    """ETag of a user's poll state; needs nothing but the loaded user row"""
+    return f"{user.id}.{user.cart_version or 0}.{user.state_version or 0}"
+
+
+def poll_state(user):
+    """
+    Everything the navbar poll shows
+
+    Args:
+        user: The logged-in user
+
+    Returns:
+        Dict with cart_count, unread_count and orders ([{id, status}] for
+        orders in progress or placed within RECENT_ORDER_WINDOW)
+    """
+    cart_count = db.session.query(db.func.coalesce(db.func.sum(CartItem.quantity), 0)).filter(
+        CartItem.user_id == user.id
+    ).scalar()
+    unread_count = db.session.query(db.func.count(Notification.id)).filter(
+        Notification.user_id == user.id,
+        Notification.is_read == False
+    ).scalar()
+    orders = db.session.query(Order.id, Order.status).filter(
+        Order.user_id == user.id,
+        db.or_(
+            ~Order.status.in_(FINAL_ORDER_STATUSES),
+            Order.created_at >= datetime.utcnow() - RECENT_ORDER_WINDOW
+        )
+    ).order_by(Order.id.desc()).all()
+
+    return {
+        'cart_count': int(cart_count),
+        'unread_count': unread_count,
+        'orders': [{'id': order_id, 'status': status} for order_id, status in orders],
+        'version': poll_etag(user)
+    }
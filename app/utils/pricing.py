@@ -0,0 +1,183 @@
+"""
+Cart pricing
+
+PricingEngine is the one place that turns a user's cart into a price
+breakdown: subtotal, tiered special discount, coupon discount, GST and
+delivery charge. The cart lines and their food items are loaded with a
+single joined query.
+
+Quotes are memoized per cart version. User.cart_version is bumped (see
+cart_changed()) in the same transaction as every cart mutation, so the
+cart page, checkout and coupon requests reuse one quote until the cart
+changes. Menu and coupon edits invalidate memoized quotes through the
+cache tags, and the cache TTL bounds staleness in other workers; order
+placement always prices the cart fresh.
+"""
+from types import SimpleNamespace
+from flask import current_app
+from app import db
+from app.models import CartItem, FoodItem, User
+from app.utils.cache import cache, snapshot, DEFAULT_TTL, TAG_MENU, TAG_COUPONS
+
+FREE_DELIVERY_THRESHOLD = 200
+DELIVERY_CHARGE = 30
+GST_RATE = 0.05
+
+# (subtotal below, special discount rate); larger orders get TOP_DISCOUNT_RATE
+DISCOUNT_TIERS = ((200, 0.02), (1000, 0.04))
+TOP_DISCOUNT_RATE = 0.06
+
+
+def discount_rate_for(subtotal):
+    """Special discount rate for a subtotal (2% / 4% / 6%)"""
+    for limit, rate in DISCOUNT_TIERS:
+        if subtotal < limit:
+            return rate
+    return TOP_DISCOUNT_RATE
+
+
+def delivery_charge_for(subtotal):
+    """Delivery is free from FREE_DELIVERY_THRESHOLD upwards"""
+    return 0 if subtotal >= FREE_DELIVERY_THRESHOLD else DELIVERY_CHARGE
+
+
+def coupon_discount_for(coupon, subtotal):
+    """
+    Discount a coupon gives on a subtotal
+
+    Args:
+        coupon: Coupon (or anything with the same discount attributes)
+        subtotal: Cart subtotal before discounts
+
+    Returns:
+        Discount rounded to 2 decimal places; 0 below the coupon's minimum
+        order amount, and never more than the subtotal
+    """
+    if subtotal < (coupon.min_order_amount or 0):
+        return 0
+    if coupon.discount_type == 'percentage':
+        discount = subtotal * (coupon.discount_value / 100)
+        if coupon.max_discount_amount and discount > coupon.max_discount_amount:
+            discount = coupon.max_discount_amount
+    else:  # fixed
+        discount = coupon.discount_value
+    return round(min(discount, subtotal), 2)
+
+
+def cart_changed(*user_ids):
+    """
+    Bump the cart version of users whose cart is being modified
+
+    Call it in the same transaction as the change, so memoized quotes and
+    the new cart contents become visible together.
+    """
+    if not user_ids:
+        return
+    User.query.filter(User.id.in_(set(user_ids))).update(
+        {User.cart_version: db.func.coalesce(User.cart_version, 0) + 1},
+        synchronize_session='fetch'
+    )
+
+
+class CartQuote:
+    """Priced cart: the lines and the full breakdown"""
+
+    def __init__(self, lines, coupon=None):
+        self.lines = lines
+        self.item_count = sum(line.quantity for line in lines)
+        self.subtotal = sum(line.food_item.price * line.quantity for line in lines)
+
+        self.discount_rate = discount_rate_for(self.subtotal)
+        self.discount_amount = self.subtotal * self.discount_rate
+        self.coupon_code = None
+        self.coupon_id = None
+        self.coupon_discount = 0
+        if coupon is not None:
+            self.coupon_discount = coupon_discount_for(coupon, self.subtotal)
+            if self.coupon_discount:
+                self.coupon_code, self.coupon_id = coupon.code, coupon.id
+
+        amount_after_discount = self.subtotal - self.discount_amount - self.coupon_discount
+        self.gst_amount = amount_after_discount * GST_RATE
+        self.delivery_charge = delivery_charge_for(self.subtotal)
+        self.total_amount = amount_after_discount + self.gst_amount + self.delivery_charge
+
+    @property
+    def is_empty(self):
+        return not self.lines
+
+    def summary(self):
+        """Breakdown in the shape the cart and checkout templates use"""
+        return {
+            'subtotal': self.subtotal,
+            'discount_rate': self.discount_rate * 100,
+            'discount_amount': self.discount_amount,
+            'coupon_discount': self.coupon_discount,
+            'gst_rate': GST_RATE * 100,
+            'gst_amount': self.gst_amount,
+            'delivery_charge': self.delivery_charge,
+            'total_amount': self.total_amount,
+            'item_count': self.item_count
+        }
+
+
+class PricingEngine:
+    """Prices one user's cart"""
+
+    def __init__(self, user):
+        self.user_id = user.id
+        self.cart_version = getattr(user, 'cart_version', None) or 0
+
+    def load_lines(self):
+        """
+        Cart lines with their food items, in one joined query
+
+        Returns:
+            List of plain objects with id, food_item_id, quantity and a
+            snapshot of food_item (safe to cache beyond the request)
+        """
+        rows = db.session.query(CartItem, FoodItem).join(
+            FoodItem, FoodItem.id == CartItem.food_item_id
+        ).filter(CartItem.user_id == self.user_id).order_by(CartItem.id).all()
+        return [
+            SimpleNamespace(
+                id=cart_item.id,
+                food_item_id=cart_item.food_item_id,
+                quantity=cart_item.quantity,
+                food_item=snapshot(food_item)
+            )
+            for cart_item, food_item in rows
+        ]
+
+    def quote(self, coupon=None, fresh=False):
+        """
+        Price the cart, reusing the memoized quote for this cart version
+
+        Args:
+            coupon: Valid Coupon to apply, or None
+            fresh: Always reload and recompute (used when placing orders)
+
+        Returns:
+            CartQuote
+        """
+        key = ('pricing', self.user_id, coupon.code if coupon is not None else None)
+        if not fresh:
+            entry = cache.get(key)
+            if entry is not None and entry[0] == self.cart_version:
+                return entry[1]
+
+        result = CartQuote(self.load_lines(), coupon)
+        cache.set(key, (self.cart_version, result), tags=(TAG_MENU, TAG_COUPONS),
+                  ttl=current_app.config.get('CACHE_DEFAULT_TTL', DEFAULT_TTL))
+        return result
+
+    def best_offer(self):
+        """
+        The coupon that saves the most on this cart
+
+        Returns:
+            See coupons.CouponTable.best(); None for an empty cart or when
+            nothing applies
+        """
+        from app.utils.coupons import find_best_offer
+        return find_best_offer(self.quote().lines)
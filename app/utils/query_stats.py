@@ -0,0 +1,168 @@
+"""
+Per-request SQL statement counts and N+1 detection
+
+Engine events count every statement and its time on the current thread's
+collectors. A collector is opened for each request (init_query_stats()) and
+by query_budget() in tests and benchmarks. Statements are grouped by shape
+(the SQL with literals and IN lists collapsed), so a query issued in a
+loop shows up as one shape executed many times.
+
+Each response gets a Server-Timing header ('db;dur=<ms>;desc="<n> queries"').
+Requests over QUERY_LOG_THRESHOLD statements, or with a shape repeated at
+least QUERY_REPEAT_THRESHOLD times, are logged with the repeated shapes.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_LOG_THRESHOLD = 30
+DEFAULT_REPEAT_THRESHOLD = 5
+SHAPE_MAX_LENGTH = 200
+
+_PLACEHOLDER_LISTS = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+_STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERALS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def statement_shape(statement):
+    """SQL with literals and placeholder lists collapsed, for grouping"""
+    shape = _STRING_LITERALS.sub('?', statement)
+    shape = _NUMBER_LITERALS.sub('?', shape)
+    shape = _PLACEHOLDER_LISTS.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryStats:
+    """Statement count, time and shapes seen while the collector was open"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def repeated(self, threshold):
+        """(shape, count) pairs executed at least threshold times, most first"""
+        return sorted(
+            ((shape, count) for shape, count in self.shapes.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+    def summary(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        for shape, count in self.repeated(threshold):
+            if len(shape) > SHAPE_MAX_LENGTH:
+                # Keep the end too: that is where similar shapes differ (WHERE, GROUP BY)
+                shape = f"{shape[:SHAPE_MAX_LENGTH // 2]} ... {shape[-SHAPE_MAX_LENGTH // 2:]}"
+            lines.append(f"  {count}x {shape}")
+        return '\n'.join(lines)
+
+
+def _collectors():
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    return collectors
+
+
+@contextmanager
+def collect_queries():
+    """Collect the statements run on this thread inside the block"""
+    stats = QueryStats()
+    collectors = _collectors()
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'collectors', None):
+        context._query_stats_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_stats_start', None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    for stats in getattr(_local, 'collectors', ()):
+        stats.record(statement, duration)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by query_budget() when a block runs too many statements"""
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None):
+    """
+    Fail a test or benchmark when the block exceeds its query budget
+
+    Args:
+        max_queries: Most statements the block may run
+        max_repeats: Most times one statement shape may run (None: no limit)
+
+    Raises:
+        QueryBudgetExceeded: With the count and the repeated shapes
+    """
+    with collect_queries() as stats:
+        yield stats
+    repeat_threshold = (max_repeats + 1) if max_repeats is not None else DEFAULT_REPEAT_THRESHOLD
+    if stats.count > max_queries:
+        raise QueryBudgetExceeded(f"Query budget of {max_queries} exceeded: {stats.summary(repeat_threshold)}")
+    if max_repeats is not None and stats.repeated(repeat_threshold):
+        raise QueryBudgetExceeded(f"Statement repeated more than {max_repeats} times: {stats.summary(repeat_threshold)}")
+
+
+def init_query_stats(app):
+    """Count the statements of every request, add Server-Timing and log N+1 patterns"""
+    if not app.config.get('QUERY_STATS_ENABLED', True):
+        return
+
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = QueryStats()
+        _collectors().append(g.query_stats)
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        if app.config.get('QUERY_STATS_SERVER_TIMING', True):
+            response.headers.add(
+                'Server-Timing', f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+            )
+
+        repeat_threshold = app.config.get('QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+        repeated = stats.repeated(repeat_threshold)
+        if repeated or stats.count > app.config.get('QUERY_LOG_THRESHOLD', DEFAULT_LOG_THRESHOLD):
+            app.logger.warning(
+                f"{request.method} {request.path} ({request.endpoint}): "
+                f"{'possible N+1, ' if repeated else ''}{stats.summary(repeat_threshold)}"
+            )
+        return response
+
+    @app.teardown_request
+    def _stop_query_stats(error=None):
+        stats = g.pop('query_stats', None)
+        collectors = _collectors()
+        if stats in collectors:
+            collectors.remove(stats)
@@ -0,0 +1,170 @@
+"""
+Precomputed per-item rating summaries.
+
+Each FoodRatingSummary row holds the count, sum and 1-5 histogram of the
+approved reviews for one food item. Review routes keep the rows up to date
+incrementally so listing pages can read ratings in a single batched lookup
+instead of loading every review.
+"""
+from sqlalchemy import func
+from app import db
+from app.models import FoodRatingSummary, Review
+
+RATING_VALUES = range(1, 6)
+
+
+def _empty_summary():
+    return {
+        'total_reviews': 0,
+        'average_rating': 0,
+        'distribution': {i: 0 for i in RATING_VALUES}
+    }
+
+
+def _summary_to_dict(summary):
+    return {
+        'total_reviews': summary.review_count or 0,
+        'average_rating': summary.average_rating,
+        'distribution': summary.distribution
+    }
+
+
+def _aggregate_reviews(food_item_ids):
+    """Build summary dicts straight from the reviews table (one grouped query)"""
+    results = {food_item_id: _empty_summary() for food_item_id in food_item_ids}
+    if not food_item_ids:
+        return results
+
+    rows = db.session.query(
+        Review.food_item_id,
+        Review.rating,
+        func.count(Review.id)
+    ).filter(
+        Review.food_item_id.in_(food_item_ids),
+        Review.is_approved == True
+    ).group_by(Review.food_item_id, Review.rating).all()
+
+    for food_item_id, rating, count in rows:
+        summary = results[food_item_id]
+        if rating in summary['distribution']:
+            summary['distribution'][rating] = count
+        summary['total_reviews'] += count
+        summary['average_rating'] += rating * count
+
+    for summary in results.values():
+        if summary['total_reviews']:
+            summary['average_rating'] = summary['average_rating'] / summary['total_reviews']
+    return results
+
+
+def get_rating_summaries(food_item_ids):
+    """
+    Get rating summaries for several food items at once
+
+    Args:
+        food_item_ids: Iterable of food item IDs
+
+    Returns:
+        Dict mapping food item ID to a dict with total_reviews,
+        average_rating and distribution (star value -> count)
+    """
+    food_item_ids = list(dict.fromkeys(food_item_ids))
+    if not food_item_ids:
+        return {}
+
+    summaries = FoodRatingSummary.query.filter(
+        FoodRatingSummary.food_item_id.in_(food_item_ids)
+    ).all()
+    results = {summary.food_item_id: _summary_to_dict(summary) for summary in summaries}
+
+    # Items without a stored row yet (e.g. before the backfill ran)
+    missing = [food_item_id for food_item_id in food_item_ids if food_item_id not in results]
+    if missing:
+        results.update(_aggregate_reviews(missing))
+    return results
+
+
+def get_rating_summary(food_item_id):
+    """Get the rating summary for a single food item"""
+    summary = db.session.get(FoodRatingSummary, food_item_id)
+    if summary is not None:
+        return _summary_to_dict(summary)
+    return _aggregate_reviews([food_item_id])[food_item_id]
+
+
+def rebuild_rating_summary(food_item_id):
+    """
+    Recompute the stored summary for one food item from its reviews
+
+    Args:
+        food_item_id: ID of the food item
+
+    Returns:
+        The FoodRatingSummary row (added to the session, not committed)
+    """
+    aggregate = _aggregate_reviews([food_item_id])[food_item_id]
+
+    summary = db.session.get(FoodRatingSummary, food_item_id)
+    if summary is None:
+        summary = FoodRatingSummary(food_item_id=food_item_id)
+        db.session.add(summary)
+
+    summary.review_count = aggregate['total_reviews']
+    summary.rating_sum = sum(rating * count for rating, count in aggregate['distribution'].items())
+    for rating, count in aggregate['distribution'].items():
+        setattr(summary, f'rating_{rating}', count)
+    return summary
+
+
+def rebuild_all_rating_summaries():
+    """Recompute every stored summary from the reviews table"""
+    from app.models import FoodItem
+
+    food_item_ids = [row[0] for row in db.session.query(FoodItem.id).all()]
+    for food_item_id in food_item_ids:
+        rebuild_rating_summary(food_item_id)
+    return len(food_item_ids)
+
+
+def record_review_change(food_item_id, old_rating=None, new_rating=None):
+    """
+    Apply a review change to the stored summary for its food item
+
+    Pass the rating the review contributed before and after the change,
+    using None when the review did not count (missing or not approved).
+    Must be called in the same transaction as the review change.
+
+    Args:
+        food_item_id: ID of the reviewed food item
+        old_rating: Previous approved rating, or None
+        new_rating: New approved rating, or None
+    """
+    if old_rating == new_rating:
+        return
+
+    db.session.flush()
+
+    if any(rating is not None and rating not in RATING_VALUES for rating in (old_rating, new_rating)):
+        rebuild_rating_summary(food_item_id)
+        return
+
+    values = {
+        FoodRatingSummary.review_count: FoodRatingSummary.review_count + (new_rating is not None) - (old_rating is not None),
+        FoodRatingSummary.rating_sum: FoodRatingSummary.rating_sum + (new_rating or 0) - (old_rating or 0)
+    }
+    for rating, delta in ((old_rating, -1), (new_rating, 1)):
+        if rating is not None:
+            column = getattr(FoodRatingSummary, f'rating_{rating}')
+            values[column] = column + delta
+
+    updated = FoodRatingSummary.query.filter_by(food_item_id=food_item_id).update(values)
+    if not updated:
+        # No stored row yet: build it from the (already flushed) reviews
+        rebuild_rating_summary(food_item_id)
+
+
+def approved_rating(review):
+    """Rating a review contributes to its item's summary, or None"""
+    if review is None or not review.is_approved:
+        return None
+    return review.rating
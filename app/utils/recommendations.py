@@ -0,0 +1,169 @@
+"""
+Offline co-purchase recommendations
+
+`flask build-recommendations` turns order history into an item-item
+co-occurrence matrix (which items appear in the same order), scores each
+pair by cosine similarity and stores the top-K neighbours of every item in
+ItemRecommendation. food_detail then reads an item's neighbours with one
+indexed lookup instead of picking random items from its category.
+
+The matrix arithmetic uses NumPy/SciPy (in requirements.txt). An
+equivalent pure-Python count remains for environments without them, which
+is fine for small histories.
+"""
+import math
+from collections import defaultdict
+from flask import current_app
+from app import db
+from app.models import ItemRecommendation, FoodItem, Order, OrderItem
+
+try:
+    import numpy as np
+    from scipy import sparse
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_TOP_K = 10
+EXCLUDED_ORDER_STATUSES = ('cancelled',)
+
+
+def _load_baskets():
+    """Distinct (order_id, food_item_id) pairs from non-cancelled orders"""
+    return db.session.query(
+        OrderItem.order_id, OrderItem.food_item_id
+    ).join(Order, Order.id == OrderItem.order_id).filter(
+        ~Order.status.in_(EXCLUDED_ORDER_STATUSES)
+    ).distinct().all()
+
+
+def _neighbours_numpy(pairs, top_k):
+    order_ids, item_ids = zip(*pairs)
+    order_index = {order_id: i for i, order_id in enumerate(dict.fromkeys(order_ids))}
+    items = list(dict.fromkeys(item_ids))
+    item_index = {item_id: i for i, item_id in enumerate(items)}
+
+    rows = np.fromiter((order_index[order_id] for order_id in order_ids), dtype=np.int64, count=len(pairs))
+    cols = np.fromiter((item_index[item_id] for item_id in item_ids), dtype=np.int64, count=len(pairs))
+
+    # Orders x items incidence matrix; X^T X counts orders shared by each pair
+    incidence = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float64), (rows, cols)),
+        shape=(len(order_index), len(items))
+    )
+    co_occurrence = (incidence.T @ incidence).tocsr()
+    item_orders = co_occurrence.diagonal()
+    co_occurrence.setdiag(0)
+    co_occurrence.eliminate_zeros()
+
+    item_id_array = np.array(items)
+    neighbours = {}
+    for i, item_id in enumerate(items):
+        start, end = co_occurrence.indptr[i], co_occurrence.indptr[i + 1]
+        if start == end:
+            continue
+        other = co_occurrence.indices[start:end]
+        counts = co_occurrence.data[start:end]
+        scores = counts / np.sqrt(item_orders[i] * item_orders[other])
+
+        # Highest score first, then more shared orders, then lowest ID
+        best = np.lexsort((item_id_array[other], -counts, -scores))[:top_k]
+        neighbours[item_id] = [
+            (items[other[j]], float(scores[j]), int(counts[j])) for j in best
+        ]
+    return neighbours
+
+
+def _neighbours_python(pairs, top_k):
+    baskets = defaultdict(list)
+    for order_id, item_id in pairs:
+        baskets[order_id].append(item_id)
+
+    item_orders = defaultdict(int)
+    co_occurrence = defaultdict(lambda: defaultdict(int))
+    for basket in baskets.values():
+        for item_id in basket:
+            item_orders[item_id] += 1
+            for other_id in basket:
+                if other_id != item_id:
+                    co_occurrence[item_id][other_id] += 1
+
+    neighbours = {}
+    for item_id, counts in co_occurrence.items():
+        scored = [
+            (other_id, count / math.sqrt(item_orders[item_id] * item_orders[other_id]), count)
+            for other_id, count in counts.items()
+        ]
+        scored.sort(key=lambda entry: (-entry[1], -entry[2], entry[0]))
+        neighbours[item_id] = scored[:top_k]
+    return neighbours
+
+
+def build_recommendations(top_k=None):
+    """
+    Recompute and store the top-K co-purchase neighbours of every item
+
+    Args:
+        top_k: Neighbours kept per item (RECOMMENDATIONS_TOP_K, default 10)
+
+    Returns:
+        Number of items that received recommendations (rows are added to
+        the session, not committed)
+    """
+    if top_k is None:
+        top_k = current_app.config.get('RECOMMENDATIONS_TOP_K', DEFAULT_TOP_K)
+
+    pairs = _load_baskets()
+    if not pairs:
+        neighbours = {}
+    elif NUMPY_AVAILABLE:
+        neighbours = _neighbours_numpy(pairs, top_k)
+    else:
+        neighbours = _neighbours_python(pairs, top_k)
+
+    ItemRecommendation.query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(ItemRecommendation, [
+        {
+            'food_item_id': item_id,
+            'recommended_item_id': other_id,
+            'rank': rank,
+            'score': score,
+            'co_orders': count
+        }
+        for item_id, scored in neighbours.items()
+        for rank, (other_id, score, count) in enumerate(scored, start=1)
+    ])
+    return len(neighbours)
+
+
+def get_similar_items(food_item, limit=4):
+    """
+    Items to show as "similar" on a food item's page
+
+    Uses the stored co-purchase neighbours, topped up with other available
+    items from the same category when history is missing or too thin.
+
+    Args:
+        food_item: The FoodItem being viewed
+        limit: Number of items to return
+
+    Returns:
+        List of available FoodItem objects
+    """
+    similar_items = FoodItem.query.join(
+        ItemRecommendation, ItemRecommendation.recommended_item_id == FoodItem.id
+    ).filter(
+        ItemRecommendation.food_item_id == food_item.id,
+        FoodItem.is_available == True,
+        ~FoodItem.name.like('[DELETED]%')
+    ).order_by(ItemRecommendation.rank).limit(limit).all()
+
+    if len(similar_items) < limit:
+        exclude_ids = [food_item.id] + [item.id for item in similar_items]
+        similar_items += FoodItem.query.filter(
+            FoodItem.category == food_item.category,
+            ~FoodItem.id.in_(exclude_ids),
+            FoodItem.is_available == True,
+            ~FoodItem.name.like('[DELETED]%')
+        ).order_by(FoodItem.created_at.desc()).limit(limit - len(similar_items)).all()
+    return similar_items
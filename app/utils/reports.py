@@ -0,0 +1,154 @@
+"""
+Revenue reports by day, category and item
+
+Reports read the SalesDaily fact table (see sales_daily.py) with two GROUP
+BY queries over a day range: revenue and order count per day, and quantity
+and gross revenue per day and food item (with its category). Cancelled
+orders are left out, as on the reports page, and the cost of a report does
+not grow with the orders table.
+
+Each day's figures are cached separately. Days before today rarely change,
+so they are kept for REPORT_CACHE_TTL and a report only queries the days it
+does not have yet (always including today). A status change on an older
+order drops that day's entry once it commits. The cache is per process, so
+other workers only see the change when their entry expires; the TTL is
+kept short (CACHE_DEFAULT_TTL by default) for that reason.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, func
+from app import db
+from app.models import Order, FoodItem, SalesDaily
+from app.utils.cache import cache, DEFAULT_TTL
+from app.utils.sales_daily import BUCKET_CANCELLED
+from app.utils.transaction_hooks import run_after_commit
+
+
+def _day_key(day):
+    return ('report_day', day.isoformat())
+
+
+def _day_tag(day):
+    return f'report_day:{day.isoformat()}'
+
+
+def _empty_day():
+    return {'revenue': 0.0, 'orders': 0, 'items': {}}
+
+
+def _load_days(first_day, last_day):
+    """Figures for every day in [first_day, last_day], from two GROUP BY queries"""
+    days = {}
+    current = first_day
+    while current <= last_day:
+        days[current] = _empty_day()
+        current += timedelta(days=1)
+
+    in_range = (SalesDaily.day >= first_day, SalesDaily.day <= last_day,
+                SalesDaily.status_bucket != BUCKET_CANCELLED)
+
+    totals = db.session.query(
+        SalesDaily.day, func.sum(SalesDaily.net_amount), func.sum(SalesDaily.order_share)
+    ).filter(*in_range).group_by(SalesDaily.day).all()
+    for day, revenue, order_share in totals:
+        figures = days.setdefault(day, _empty_day())
+        figures['revenue'] = float(revenue or 0)
+        figures['orders'] = int(round(order_share or 0))
+
+    items = db.session.query(
+        SalesDaily.day,
+        SalesDaily.food_item_id,
+        FoodItem.name,
+        SalesDaily.category,
+        func.sum(SalesDaily.quantity),
+        func.sum(SalesDaily.gross_amount)
+    ).outerjoin(
+        FoodItem, FoodItem.id == SalesDaily.food_item_id
+    ).filter(*in_range).group_by(
+        SalesDaily.day, SalesDaily.food_item_id, FoodItem.name, SalesDaily.category
+    ).all()
+    for day, food_item_id, name, category, quantity, revenue in items:
+        figures = days.setdefault(day, _empty_day())
+        item = figures['items'].setdefault(food_item_id, {
+            'name': name or f'Item #{food_item_id}', 'category': category, 'count': 0, 'revenue': 0.0
+        })
+        item['count'] += int(quantity or 0)
+        item['revenue'] += float(revenue or 0)
+
+    return days
+
+
+def get_daily_figures(start_day, end_day):
+    """
+    Per-day figures for a date range, reusing cached past days
+
+    Args:
+        start_day: First date to include
+        end_day: Last date to include
+
+    Returns:
+        Dict {date: {'revenue', 'orders', 'items': {food_item_id: {...}}}}
+        with an entry for every day in the range
+    """
+    today = datetime.utcnow().date()
+    days = {}
+    missing = []
+    current = start_day
+    while current <= end_day:
+        figures = cache.get(_day_key(current)) if current < today else None
+        if figures is None:
+            missing.append(current)
+        else:
+            days[current] = figures
+        current += timedelta(days=1)
+
+    if missing:
+        ttl = current_app.config.get('REPORT_CACHE_TTL', DEFAULT_TTL)
+        # Read before querying, so a commit landing mid-query leaves the entry stale
+        versions = {day: cache.tag_versions((_day_tag(day),)) for day in missing}
+        loaded = _load_days(missing[0], missing[-1])
+        for day in missing:
+            days[day] = loaded[day]
+            if day < today:
+                cache.set(_day_key(day), loaded[day], tags=(_day_tag(day),), ttl=ttl, versions=versions[day])
+
+    return days
+
+
+def revenue_by_day(days):
+    """Rows of date (YYYY-MM-DD), revenue and orders, oldest first"""
+    return [
+        {'date': day.strftime('%Y-%m-%d'), 'revenue': figures['revenue'], 'orders': figures['orders']}
+        for day, figures in sorted(days.items())
+    ]
+
+
+def sales_by_item(days):
+    """Quantity and revenue per food item over the days, highest revenue first"""
+    totals = {}
+    for figures in days.values():
+        for food_item_id, item in figures['items'].items():
+            total = totals.setdefault(food_item_id, {
+                'id': food_item_id, 'name': item['name'], 'category': item['category'], 'count': 0, 'revenue': 0.0
+            })
+            total['count'] += item['count']
+            total['revenue'] += item['revenue']
+    return sorted(totals.values(), key=lambda row: -row['revenue'])
+
+
+def sales_by_category(days):
+    """Quantity and revenue per category over the days, highest revenue first"""
+    totals = {}
+    for item in sales_by_item(days):
+        total = totals.setdefault(item['category'], {'name': item['category'], 'count': 0, 'revenue': 0.0})
+        total['count'] += item['count']
+        total['revenue'] += item['revenue']
+    return sorted(totals.values(), key=lambda row: -row['revenue'])
+
+
+@event.listens_for(Order, 'after_update')
+def _order_status_changed(mapper, connection, target):
+    if target.created_at and db.inspect(target).attrs.status.history.has_changes():
+        tag = _day_tag(target.created_at.date())
+        # At flush time another request could still re-cache the old figures
+        run_after_commit(lambda: cache.invalidate(tag))
@@ -0,0 +1,238 @@
+"""
+Daily sales fact table
+
+SalesDaily holds one row per (day, category, food item, payment method,
+status bucket) with quantity, gross, discount, GST and net totals. Order
+level amounts (discounts, GST, the order total) are spread over the order's
+lines in proportion to their gross amount, and each line also carries its
+share of the order, so summing any slice gives exact revenue and order
+counts without reading the orders table.
+
+Rows are kept current in the same transaction as the order change:
+OrderService.place_order() calls record_order_placed() and
+record_order_status_change() (via the sales rollup) moves an order's lines
+between status buckets. Switching an order's payment method on the payment
+page moves its lines with record_order_payment_method_change(), and an
+order deleted outright (an abandoned PayPal checkout) is taken back out
+with record_order_removed(). rebuild_sales_daily() recomputes the table
+from scratch (flask rebuild-sales-daily).
+
+Lines are counted under OrderItem.category, the food item's category when
+the order was placed, so recategorizing an item later does not move its
+past sales: a status change subtracts from the same cells the order was
+added to.
+"""
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from app import db
+from app.models import SalesDaily, Order, OrderItem, FoodItem
+
+DEFAULT_CATEGORY = 'general'
+BUCKET_OPEN = 'open'
+BUCKET_CANCELLED = 'cancelled'
+# Statuses with a bucket of their own; everything else is still open
+CLOSED_STATUSES = ('delivered', 'returned', 'cancelled')
+
+MEASURES = ('quantity', 'gross_amount', 'discount_amount', 'gst_amount', 'net_amount', 'order_share')
+
+
+def status_bucket(status):
+    """Bucket an order status is counted under"""
+    return status if status in CLOSED_STATUSES else BUCKET_OPEN
+
+
+def _order_lines(order_ids):
+    """
+    (order_id, food_item_id, category, quantity, price) for the orders' lines
+
+    Lines written before OrderItem.category existed fall back to the food
+    item's current category until rebuild_sales_daily() backfills them.
+    """
+    return db.session.query(
+        OrderItem.order_id,
+        OrderItem.food_item_id,
+        func.coalesce(OrderItem.category, FoodItem.category, DEFAULT_CATEGORY),
+        OrderItem.quantity,
+        OrderItem.price
+    ).outerjoin(
+        FoodItem, FoodItem.id == OrderItem.food_item_id
+    ).filter(OrderItem.order_id.in_(order_ids)).all()
+
+
+def _order_cells(order, lines, status, payment_method=None):
+    """
+    Fact deltas for one order counted under a status
+
+    Args:
+        order: Object with created_at, payment_method and the order amounts
+        lines: (food_item_id, category, quantity, price) tuples
+        status: Status whose bucket the order is counted under
+        payment_method: Method to count the order under (None: order.payment_method)
+
+    Returns:
+        Dict {cell key: [measures in MEASURES order]}
+    """
+    cells = {}
+    if not lines or order.created_at is None:
+        return cells
+
+    gross_total = sum((price or 0) * quantity for _, _, quantity, price in lines)
+    discount = (order.discount_amount or 0) + (order.coupon_discount or 0)
+    bucket = status_bucket(status)
+    for food_item_id, category, quantity, price in lines:
+        gross = (price or 0) * quantity
+        share = gross / gross_total if gross_total else 1 / len(lines)
+        key = (order.created_at.date(), category or DEFAULT_CATEGORY, food_item_id,
+               payment_method or order.payment_method or 'unknown', bucket)
+        measures = cells.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        for i, value in enumerate((quantity, gross, discount * share, (order.gst_amount or 0) * share,
+                                   (order.total_amount or 0) * share, share)):
+            measures[i] += value
+    return cells
+
+
+def _add_cells(cells, sign=1):
+    """Add (or with sign=-1 subtract) fact deltas in one upsert statement"""
+    if not cells:
+        return
+    rows = [
+        dict(zip(('day', 'category', 'food_item_id', 'payment_method', 'status_bucket'), key),
+             **{name: sign * value for name, value in zip(MEASURES, measures)})
+        for key, measures in cells.items()
+    ]
+    table = SalesDaily.__table__
+    keys = [table.c.day, table.c.category, table.c.food_item_id, table.c.payment_method, table.c.status_bucket]
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = dialect_module.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + stmt.excluded[name] for name in MEASURES}
+        )
+        db.session.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(**{name: table.c[name] + stmt.inserted[name] for name in MEASURES})
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            updated = SalesDaily.query.filter_by(
+                day=row['day'], category=row['category'], food_item_id=row['food_item_id'],
+                payment_method=row['payment_method'], status_bucket=row['status_bucket']
+            ).update({getattr(SalesDaily, name): getattr(SalesDaily, name) + row[name] for name in MEASURES},
+                     synchronize_session=False)
+            if not updated:
+                db.session.add(SalesDaily(**row))
+                db.session.flush()
+
+
+def record_order_placed(order):
+    """Count a newly placed order (its lines must already be written)"""
+    lines = [line[1:] for line in _order_lines([order.id])]
+    _add_cells(_order_cells(order, lines, order.status))
+
+
+def record_order_payment_method_change(order, old_method, new_method):
+    """Move an order's lines to the cells of its new payment method"""
+    if old_method == new_method:
+        return
+    lines = [line[1:] for line in _order_lines([order.id])]
+    _add_cells(_order_cells(order, lines, order.status, old_method), sign=-1)
+    _add_cells(_order_cells(order, lines, order.status, new_method))
+
+
+def record_order_removed(order):
+    """Subtract an order that is about to be deleted (call before its lines go)"""
+    lines = [line[1:] for line in _order_lines([order.id])]
+    _add_cells(_order_cells(order, lines, order.status), sign=-1)
+
+
+def record_order_status_change(order, old_status, new_status):
+    """
+    Move an order's lines to the bucket of its new status
+
+    Must be called in the same transaction as the status change. Changes
+    within the open bucket (pending -> confirmed -> ...) touch nothing.
+    """
+    if status_bucket(old_status) == status_bucket(new_status):
+        return
+    lines = [line[1:] for line in _order_lines([order.id])]
+    _add_cells(_order_cells(order, lines, old_status), sign=-1)
+    _add_cells(_order_cells(order, lines, new_status))
+
+
+def rebuild_sales_daily(batch_size=500):
+    """
+    Recompute the whole fact table from orders
+
+    Order lines without a category snapshot get their food item's current
+    category first, so later status changes find the cells written here.
+
+    Returns:
+        Number of fact rows written (not committed)
+    """
+    OrderItem.query.filter(OrderItem.category.is_(None)).update({
+        OrderItem.category: db.session.query(FoodItem.category).filter(
+            FoodItem.id == OrderItem.food_item_id
+        ).scalar_subquery()
+    }, synchronize_session=False)
+    SalesDaily.query.delete(synchronize_session=False)
+
+    cells = {}
+    last_id = 0
+    while True:
+        # Keyset pages, so the line query never runs under an open cursor
+        batch = db.session.query(
+            Order.id, Order.created_at, Order.status, Order.payment_method, Order.discount_amount,
+            Order.coupon_discount, Order.gst_amount, Order.total_amount
+        ).filter(Order.id > last_id).order_by(Order.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        lines_by_order = {}
+        for order_id, food_item_id, category, quantity, price in _order_lines([order.id for order in batch]):
+            lines_by_order.setdefault(order_id, []).append((food_item_id, category, quantity, price))
+        for order in batch:
+            for key, measures in _order_cells(order, lines_by_order.get(order.id), order.status).items():
+                totals = cells.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+                for i, value in enumerate(measures):
+                    totals[i] += value
+
+    db.session.bulk_insert_mappings(SalesDaily, [
+        dict(zip(('day', 'category', 'food_item_id', 'payment_method', 'status_bucket'), key),
+             **dict(zip(MEASURES, measures)))
+        for key, measures in cells.items()
+    ])
+    return len(cells)
+
+
+def sales_totals(*filters):
+    """
+    Totals over the fact rows matching filters, cancelled orders excluded
+
+    Args:
+        *filters: SQLAlchemy conditions on SalesDaily columns
+
+    Returns:
+        Dict with quantity, gross, discount, gst, revenue and orders
+    """
+    row = db.session.query(
+        func.coalesce(func.sum(SalesDaily.quantity), 0),
+        func.coalesce(func.sum(SalesDaily.gross_amount), 0),
+        func.coalesce(func.sum(SalesDaily.discount_amount), 0),
+        func.coalesce(func.sum(SalesDaily.gst_amount), 0),
+        func.coalesce(func.sum(SalesDaily.net_amount), 0),
+        func.coalesce(func.sum(SalesDaily.order_share), 0)
+    ).filter(SalesDaily.status_bucket != BUCKET_CANCELLED, *filters).one()
+    quantity, gross, discount, gst, revenue, orders = row
+    return {
+        'quantity': int(quantity),
+        'gross': round(float(gross), 2),
+        'discount': round(float(discount), 2),
+        'gst': round(float(gst), 2),
+        'revenue': round(float(revenue), 2),
+        'orders': int(round(orders))
+    }
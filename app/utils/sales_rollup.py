@@ -0,0 +1,227 @@
+"""
+Hourly and daily per-item sales rollup
+
+ItemSalesRollup holds delivered and cancelled quantities/revenue per food
+item, bucketed by the hour and by the day the order was placed. Order status
+routes call record_order_status_change() in the same transaction as the
+status change, so popularity and category breakdowns read a few hundred
+small rows instead of aggregating the whole order history.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from app import db
+from app.models import ItemSalesRollup, FoodItem, Order, OrderItem
+from app.utils.cache import invalidate, TAG_POPULARITY
+from app.utils.transaction_hooks import run_after_commit
+from app.utils import sales_daily
+
+PERIODS = ('hour', 'day')
+SOLD_STATUS = 'delivered'
+CANCELLED_STATUS = 'cancelled'
+MEASURES = ('quantity_sold', 'revenue', 'quantity_cancelled', 'revenue_cancelled')
+
+
+def bucket_start(moment, period):
+    """Truncate a datetime to the start of its hour or day"""
+    if period == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_deltas(deltas):
+    """
+    Add deltas to bucket rows in one upsert statement
+
+    INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE adds to an existing
+    bucket atomically, so two orders landing in a new bucket at the same
+    time cannot both try to insert it.
+
+    Args:
+        deltas: Dict {(food_item_id, period, bucket_start): {measure: delta}}
+    """
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    rows = [
+        dict(food_item_id=food_item_id, period=period, bucket_start=start, updated_at=now, **measures)
+        for (food_item_id, period, start), measures in deltas.items()
+    ]
+    table = ItemSalesRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = dialect_module.insert(table).values(rows)
+        set_ = {name: table.c[name] + stmt.excluded[name] for name in MEASURES}
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.food_item_id, table.c.period, table.c.bucket_start],
+            set_=dict(set_, updated_at=stmt.excluded.updated_at)
+        )
+        db.session.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(rows)
+        set_ = {name: table.c[name] + stmt.inserted[name] for name in MEASURES}
+        stmt = stmt.on_duplicate_key_update(**set_, updated_at=stmt.inserted.updated_at)
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            updated = ItemSalesRollup.query.filter_by(
+                food_item_id=row['food_item_id'], period=row['period'], bucket_start=row['bucket_start']
+            ).update({getattr(ItemSalesRollup, name): getattr(ItemSalesRollup, name) + row[name] for name in MEASURES},
+                     synchronize_session=False)
+            if not updated:
+                db.session.add(ItemSalesRollup(**row))
+                db.session.flush()
+
+
+def record_order_status_change(order, old_status, new_status):
+    """
+    Apply an order status change to the sales rollup
+
+    Moving into 'delivered' adds the order's items to the sold totals and
+    moving out of it (e.g. a later return) takes them off again; 'cancelled'
+    is tracked the same way. Other transitions are ignored. The SalesDaily
+    fact table is updated too. Must be called in the same transaction as
+    the status change.
+
+    Args:
+        order: The Order whose status changed
+        old_status: Status before the change
+        new_status: Status after the change
+    """
+    sales_daily.record_order_status_change(order, old_status, new_status)
+
+    sold = (new_status == SOLD_STATUS) - (old_status == SOLD_STATUS)
+    cancelled = (new_status == CANCELLED_STATUS) - (old_status == CANCELLED_STATUS)
+    if not sold and not cancelled:
+        return
+
+    items = db.session.query(
+        OrderItem.food_item_id, OrderItem.quantity, OrderItem.price
+    ).filter(OrderItem.order_id == order.id).all()
+
+    placed_at = order.created_at or datetime.utcnow()
+    deltas = {}
+    for period in PERIODS:
+        start = bucket_start(placed_at, period)
+        for food_item_id, quantity, price in items:
+            line_total = (price or 0) * quantity
+            delta = deltas.setdefault((food_item_id, period, start), dict.fromkeys(MEASURES, 0))
+            delta['quantity_sold'] += sold * quantity
+            delta['revenue'] += sold * line_total
+            delta['quantity_cancelled'] += cancelled * quantity
+            delta['revenue_cancelled'] += cancelled * line_total
+    _add_deltas(deltas)
+
+    if sold:
+        # Other requests must not re-cache the old ranking before this commits
+        run_after_commit(lambda: invalidate(TAG_POPULARITY))
+
+
+def rebuild_sales_rollup():
+    """
+    Recompute the whole rollup from orders
+
+    Returns:
+        Number of rollup rows written (added to the session, not committed)
+    """
+    ItemSalesRollup.query.delete(synchronize_session=False)
+
+    rows = db.session.query(
+        Order.created_at, Order.status, OrderItem.food_item_id, OrderItem.quantity, OrderItem.price
+    ).join(OrderItem, OrderItem.order_id == Order.id).filter(
+        Order.status.in_([SOLD_STATUS, CANCELLED_STATUS])
+    ).yield_per(1000)
+
+    buckets = {}
+    for created_at, status, food_item_id, quantity, price in rows:
+        line_total = (price or 0) * quantity
+        for period in PERIODS:
+            key = (food_item_id, period, bucket_start(created_at, period))
+            totals = buckets.setdefault(key, [0, 0.0, 0, 0.0])
+            if status == SOLD_STATUS:
+                totals[0] += quantity
+                totals[1] += line_total
+            else:
+                totals[2] += quantity
+                totals[3] += line_total
+
+    db.session.bulk_insert_mappings(ItemSalesRollup, [
+        {
+            'food_item_id': food_item_id,
+            'period': period,
+            'bucket_start': start,
+            'quantity_sold': totals[0],
+            'revenue': totals[1],
+            'quantity_cancelled': totals[2],
+            'revenue_cancelled': totals[3]
+        }
+        for (food_item_id, period, start), totals in buckets.items()
+    ])
+    run_after_commit(lambda: invalidate(TAG_POPULARITY))
+    return len(buckets)
+
+
+def get_popular_items(limit=10, days=None):
+    """
+    Best-selling available items over a recent window
+
+    Args:
+        limit: Maximum number of items
+        days: Window length in days (POPULARITY_WINDOW_DAYS, default 7)
+
+    Returns:
+        List of (FoodItem, quantity sold) tuples, best seller first
+    """
+    if days is None:
+        days = current_app.config.get('POPULARITY_WINDOW_DAYS', 7)
+    since = bucket_start(datetime.utcnow(), 'day') - timedelta(days=days - 1)
+
+    total_sold = func.sum(ItemSalesRollup.quantity_sold)
+    ranked = db.session.query(
+        ItemSalesRollup.food_item_id, total_sold.label('total_sold')
+    ).filter(
+        ItemSalesRollup.period == 'day',
+        ItemSalesRollup.bucket_start >= since
+    ).group_by(ItemSalesRollup.food_item_id).having(total_sold > 0).subquery()
+
+    return db.session.query(FoodItem, ranked.c.total_sold).join(
+        ranked, ranked.c.food_item_id == FoodItem.id
+    ).filter(
+        FoodItem.is_available == True,
+        ~FoodItem.name.like('[DELETED]%')
+    ).order_by(ranked.c.total_sold.desc(), FoodItem.name).limit(limit).all()
+
+
+def get_category_sales(start=None, end=None):
+    """
+    Delivered quantity and revenue per category from the daily rollup
+
+    Args:
+        start: Optional first day (date or datetime) to include
+        end: Optional last day (date or datetime) to include
+
+    Returns:
+        List of dicts with name, count and revenue, highest revenue first
+    """
+    query = db.session.query(
+        FoodItem.category,
+        func.sum(ItemSalesRollup.quantity_sold),
+        func.sum(ItemSalesRollup.revenue)
+    ).join(
+        FoodItem, FoodItem.id == ItemSalesRollup.food_item_id
+    ).filter(ItemSalesRollup.period == 'day')
+
+    if start is not None:
+        query = query.filter(ItemSalesRollup.bucket_start >= datetime(start.year, start.month, start.day))
+    if end is not None:
+        query = query.filter(ItemSalesRollup.bucket_start < datetime(end.year, end.month, end.day) + timedelta(days=1))
+
+    rows = query.group_by(FoodItem.category).having(func.sum(ItemSalesRollup.quantity_sold) > 0).all()
+    return sorted(
+        [{'name': category or 'General', 'count': int(count or 0), 'revenue': float(revenue or 0)}
+         for category, count, revenue in rows],
+        key=lambda row: -row['revenue']
+    )
@@ -0,0 +1,163 @@
+"""
+Schema upgrades for existing databases
+
+db.create_all() creates missing tables but never changes a table that
+already exists, so columns and constraints added to the models later are
+applied here (flask upgrade-schema, run before the web workers start).
+Every step looks at the live schema first and does nothing when its change
+is already there, so the command is safe to run on every deploy. Databases
+created from database/*.sql already have the current schema. Tables kept
+in step with orders are backfilled here too when they start out empty.
+"""
+from sqlalchemy import inspect, select, func, text
+from sqlalchemy.schema import CreateColumn
+from app import db
+from app.models import User, FoodItem, OrderItem, CartItem, ReviewImage
+
+# Steps in the order they run; each returns True when it changed the database
+UPGRADE_STEPS = []
+
+
+def upgrade_step(step):
+    """Register a schema upgrade step"""
+    UPGRADE_STEPS.append(step)
+    return step
+
+
+def _inspector():
+    # A fresh inspector each time, so steps see the changes made before them
+    return inspect(db.session.connection())
+
+
+def _has_column(table_name, column_name):
+    return any(column['name'] == column_name for column in _inspector().get_columns(table_name))
+
+
+def _has_unique(table_name, column_names):
+    """Whether a unique constraint or unique index covers exactly these columns"""
+    inspector = _inspector()
+    uniques = inspector.get_unique_constraints(table_name) + [
+        index for index in inspector.get_indexes(table_name) if index.get('unique')
+    ]
+    return any(set(unique['column_names']) == set(column_names) for unique in uniques)
+
+
+def add_model_column(model, column_name):
+    """
+    Add a model column to its existing table, as the model declares it
+
+    Returns:
+        True if the column was missing and has been added
+    """
+    table = model.__table__
+    if _has_column(table.name, column_name):
+        return False
+    connection = db.session.connection()
+    column_ddl = CreateColumn(table.c[column_name]).compile(dialect=connection.dialect)
+    table_name = connection.dialect.identifier_preparer.format_table(table)
+    connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_ddl}'))
+    return True
+
+
+@upgrade_step
+def unique_cart_items():
+    """Merge duplicate cart lines and add uq_cart_item_user_food (cart upserts need it)"""
+    columns = ('user_id', 'food_item_id')
+    if _has_unique('cart_item', columns):
+        return False
+
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        # Keep carts from changing between the merge and the constraint
+        connection.execute(text('LOCK TABLE cart_item IN SHARE ROW EXCLUSIVE MODE'))
+
+    # Keep the oldest line of each (user, item) with the summed quantity
+    table = CartItem.__table__
+    duplicates = connection.execute(
+        select(table.c.user_id, table.c.food_item_id, func.min(table.c.id), func.sum(table.c.quantity))
+        .group_by(table.c.user_id, table.c.food_item_id)
+        .having(func.count() > 1)
+    ).all()
+    for user_id, food_item_id, keep_id, quantity in duplicates:
+        connection.execute(table.update().where(table.c.id == keep_id).values(quantity=quantity))
+        connection.execute(table.delete().where(
+            table.c.user_id == user_id, table.c.food_item_id == food_item_id, table.c.id != keep_id
+        ))
+
+    if dialect == 'sqlite':
+        # SQLite cannot add constraints to a table; a unique index serves ON CONFLICT the same way
+        connection.execute(text('CREATE UNIQUE INDEX uq_cart_item_user_food ON cart_item (user_id, food_item_id)'))
+    else:
+        connection.execute(text('ALTER TABLE cart_item ADD CONSTRAINT uq_cart_item_user_food UNIQUE (user_id, food_item_id)'))
+    return True
+
+
+@upgrade_step
+def user_cart_version():
+    """User.cart_version, read on every authenticated request to key cart pricing"""
+    return add_model_column(User, 'cart_version')
+
+
+@upgrade_step
+def user_state_version():
+    """User.state_version, part of the /api/poll ETag"""
+    return add_model_column(User, 'state_version')
+
+
+@upgrade_step
+def order_item_category():
+    """OrderItem.category, the sales_daily cell each line is counted under"""
+    if not add_model_column(OrderItem, 'category'):
+        return False
+    # Existing facts were counted under the items' current categories
+    table = OrderItem.__table__
+    food = FoodItem.__table__
+    db.session.connection().execute(table.update().values(
+        category=select(food.c.category).where(food.c.id == table.c.food_item_id).scalar_subquery()
+    ))
+    return True
+
+
+@upgrade_step
+def food_item_image_hash():
+    """FoodItem.image_hash; media routes fill it in on the first request for each image"""
+    return add_model_column(FoodItem, 'image_hash')
+
+
+@upgrade_step
+def image_variants():
+    """image_variants on food items and review images; derivatives are built for new uploads"""
+    added_food = add_model_column(FoodItem, 'image_variants')
+    added_review = add_model_column(ReviewImage, 'image_variants')
+    return added_food or added_review
+
+
+@upgrade_step
+def commission_ledger_backfill():
+    """Fill the commission ledger from orders delivered before it existed"""
+    from app.utils.commission_ledger import ledger_needs_backfill, rebuild_commission_ledger
+
+    if not ledger_needs_backfill():
+        return False
+    rebuild_commission_ledger()
+    return True
+
+
+def run_schema_upgrades():
+    """
+    Create missing tables, then apply every pending upgrade step
+
+    Each step is committed on its own, so a failed step keeps the ones
+    before it and the command can simply be run again.
+
+    Returns:
+        Names of the steps that changed the database
+    """
+    db.create_all()
+    applied = []
+    for step in UPGRADE_STEPS:
+        if step():
+            applied.append(step.__name__)
+        db.session.commit()
+    return applied
@@ -0,0 +1,294 @@
+"""
+Relevance-ranked food item search
+
+One implementation is shared by the search page and both autocomplete
+endpoints. On PostgreSQL it uses a weighted tsvector expression (backed by
+a GIN index) with a pg_trgm similarity fallback for typos and substrings.
+Other databases (MySQL, SQLite in tests) use an in-process inverted index
+built from the menu.
+"""
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app
+from sqlalchemy import func, text
+from app import db
+from app.models import FoodItem
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of a match in each field (name matters most)
+FIELD_WEIGHTS = {'name': 3.0, 'category': 1.5, 'description': 1.0}
+PREFIX_MATCH_FACTOR = 0.7
+
+# PostgreSQL DDL used by `flask init-search`; the document expression must
+# match _search_document() exactly for the planner to use the index
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_food_item_search ON food_item USING GIN ("
+    "(setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')))",
+    "CREATE INDEX IF NOT EXISTS idx_food_item_name_trgm ON food_item USING GIN (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_food_item_description_trgm ON food_item USING GIN (description gin_trgm_ops)",
+]
+
+_index_lock = threading.Lock()
+_index = None
+_pg_trgm_available = None
+
+
+def tokenize(value):
+    """Split text into lowercase search tokens"""
+    if not value:
+        return []
+    return TOKEN_PATTERN.findall(value.lower())
+
+
+def _base_query(category=None, price_min=None, price_max=None):
+    search_query = FoodItem.query.filter(
+        FoodItem.is_available == True,
+        ~FoodItem.name.like('[DELETED]%')
+    )
+
+    if category and category != 'all':
+        search_query = search_query.filter(FoodItem.category == category)
+
+    if price_min is not None and price_min != '':
+        search_query = search_query.filter(FoodItem.price >= float(price_min))
+
+    if price_max is not None and price_max != '':
+        search_query = search_query.filter(FoodItem.price <= float(price_max))
+
+    return search_query
+
+
+def search_food_items(query, category=None, price_min=None, price_max=None, limit=None):
+    """
+    Search available food items, most relevant first
+
+    Args:
+        query: Free text typed by the user
+        category: Category name to restrict to ('all' or None for every category)
+        price_min: Optional minimum price
+        price_max: Optional maximum price
+        limit: Maximum number of items to return
+
+    Returns:
+        List of FoodItem objects ordered by relevance
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        search_query = _base_query(category, price_min, price_max)
+        if limit:
+            search_query = search_query.limit(limit)
+        return search_query.all()
+
+    if db.engine.dialect.name == 'postgresql':
+        return _postgres_search(query, tokens, category, price_min, price_max, limit)
+    return _inverted_index_search(query, tokens, category, price_min, price_max, limit)
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL: tsvector ranking with trigram fallback
+# ---------------------------------------------------------------------------
+
+def _search_document():
+    name_vector = func.setweight(func.to_tsvector('simple', func.coalesce(FoodItem.name, '')), 'A')
+    description_vector = func.setweight(func.to_tsvector('simple', func.coalesce(FoodItem.description, '')), 'B')
+    return name_vector.op('||')(description_vector)
+
+
+def _has_pg_trgm():
+    global _pg_trgm_available
+    if _pg_trgm_available is None:
+        try:
+            _pg_trgm_available = db.session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Could not check for pg_trgm: {str(e)}")
+            _pg_trgm_available = False
+    return _pg_trgm_available
+
+
+def _postgres_search(query, tokens, category, price_min, price_max, limit):
+    # Every token must match; each one as a prefix so partial words still hit
+    ts_query = func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+    document = _search_document()
+
+    ranked = _base_query(category, price_min, price_max).filter(
+        document.op('@@')(ts_query)
+    ).order_by(func.ts_rank(document, ts_query).desc(), FoodItem.name)
+    if limit:
+        ranked = ranked.limit(limit)
+    results = ranked.all()
+
+    if results or not _has_pg_trgm():
+        return results
+
+    # Nothing matched whole words: fall back to trigram similarity, which
+    # also catches typos and substrings (and uses the trigram indexes)
+    phrase = query.strip()
+    similarity = func.greatest(
+        func.similarity(FoodItem.name, phrase),
+        func.similarity(func.coalesce(FoodItem.description, ''), phrase) * 0.5
+    )
+    fuzzy = _base_query(category, price_min, price_max).filter(
+        FoodItem.name.op('%')(phrase) |
+        FoodItem.name.ilike(f'%{phrase}%') |
+        FoodItem.description.ilike(f'%{phrase}%')
+    ).order_by(similarity.desc(), FoodItem.name)
+    if limit:
+        fuzzy = fuzzy.limit(limit)
+    return fuzzy.all()
+
+
+def ensure_postgres_search_indexes():
+    """Create the GIN indexes used by the PostgreSQL search path"""
+    global _pg_trgm_available
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    for statement in POSTGRES_SEARCH_DDL:
+        db.session.execute(text(statement))
+    db.session.commit()
+    _pg_trgm_available = None
+    return True
+
+
+# ---------------------------------------------------------------------------
+# In-process inverted index (MySQL / SQLite)
+# ---------------------------------------------------------------------------
+
+class InvertedIndex:
+    """Token -> postings map over the available menu, with per-item metadata"""
+
+    def __init__(self, rows):
+        self.items = {}
+        self.postings = {}
+        for item_id, name, description, category, price in rows:
+            self.items[item_id] = {
+                'name': name or '',
+                'description': description or '',
+                'category': category,
+                'price': price
+            }
+            fields = {
+                'name': tokenize(name),
+                'category': tokenize((category or '').replace('_', ' ')),
+                'description': tokenize(description)
+            }
+            for field, field_tokens in fields.items():
+                for token in field_tokens:
+                    postings = self.postings.setdefault(token, {})
+                    postings[item_id] = max(postings.get(item_id, 0), FIELD_WEIGHTS[field])
+
+        self.vocabulary = sorted(self.postings)
+        total = max(len(self.items), 1)
+        self.idf = {
+            token: math.log(1 + total / len(postings))
+            for token, postings in self.postings.items()
+        }
+        self.built_at = time.monotonic()
+
+    def _matching_terms(self, token):
+        """Vocabulary terms equal to or starting with token"""
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            term = self.vocabulary[position]
+            yield term, 1.0 if term == token else PREFIX_MATCH_FACTOR
+            position += 1
+
+    def _accepts(self, item_id, category, price_min, price_max):
+        item = self.items[item_id]
+        if category and category != 'all' and item['category'] != category:
+            return False
+        if price_min is not None and price_min != '' and item['price'] < float(price_min):
+            return False
+        if price_max is not None and price_max != '' and item['price'] > float(price_max):
+            return False
+        return True
+
+    def search(self, query, tokens, category=None, price_min=None, price_max=None):
+        """Return item IDs ordered by relevance"""
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term, match_factor in self._matching_terms(token):
+                weight = self.idf[term] * match_factor
+                for item_id, field_weight in self.postings[term].items():
+                    score = weight * field_weight
+                    if score > token_scores.get(item_id, 0):
+                        token_scores[item_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                # Every token has to match
+                scores = {item_id: scores[item_id] + score
+                          for item_id, score in token_scores.items() if item_id in scores}
+            if not scores:
+                break
+
+        phrase = query.strip().lower()
+        if not scores:
+            # Substring fallback, equivalent to the old ILIKE behaviour
+            scores = {}
+            for item_id, item in self.items.items():
+                name = item['name'].lower()
+                if phrase in name:
+                    scores[item_id] = 1.0 / (1 + name.index(phrase))
+                elif phrase in item['description'].lower():
+                    scores[item_id] = 0.1
+
+        for item_id in scores:
+            if self.items[item_id]['name'].lower().startswith(phrase):
+                scores[item_id] += 1.0
+
+        matches = [item_id for item_id in scores if self._accepts(item_id, category, price_min, price_max)]
+        matches.sort(key=lambda item_id: (-scores[item_id], self.items[item_id]['name'].lower()))
+        return matches
+
+
+def _load_index_rows():
+    return db.session.query(
+        FoodItem.id, FoodItem.name, FoodItem.description, FoodItem.category, FoodItem.price
+    ).filter(
+        FoodItem.is_available == True,
+        ~FoodItem.name.like('[DELETED]%')
+    ).all()
+
+
+def get_search_index():
+    """Get the in-process inverted index, rebuilding it when it is stale"""
+    global _index
+    ttl = current_app.config.get('SEARCH_INDEX_TTL', 300)
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < ttl:
+        return index
+
+    with _index_lock:
+        index = _index
+        if index is None or time.monotonic() - index.built_at >= ttl:
+            index = InvertedIndex(_load_index_rows())
+            _index = index
+    return index
+
+
+def invalidate_search_index():
+    """Drop the in-process index so the next search rebuilds it"""
+    global _index
+    _index = None
+
+
+def _inverted_index_search(query, tokens, category, price_min, price_max, limit):
+    item_ids = get_search_index().search(query, tokens, category, price_min, price_max)
+    if limit:
+        item_ids = item_ids[:limit]
+    if not item_ids:
+        return []
+
+    # Re-check availability in the same query in case the index is a little stale
+    items = {item.id: item for item in _base_query().filter(FoodItem.id.in_(item_ids)).all()}
+    return [items[item_id] for item_id in item_ids if item_id in items]
@@ -0,0 +1,280 @@
+"""
+Slow-query log
+
+Every statement is timed with the engine's before/after_cursor_execute
+events. Statements slower than SLOW_QUERY_THRESHOLD_MS are written as one
+JSON line with the duration and the request that issued them.
+
+Bound parameters are only logged when SLOW_QUERY_LOG_PARAMS is set, and
+even then values that may be credentials or personal data (passwords,
+OTPs, tokens, emails, phone numbers, addresses, bank details) are
+redacted: in a statement that touches such a column, only parameters
+named after other columns (status_1, user_id) are kept, and positional
+parameters, which cannot be matched to a column, are all hidden.
+
+On PostgreSQL a sampled fraction (SLOW_QUERY_EXPLAIN_SAMPLE_RATE) of slow
+SELECTs is run again under EXPLAIN (ANALYZE, BUFFERS) on the same
+connection, inside a savepoint so a failing EXPLAIN cannot abort the
+transaction. ANALYZE executes the statement, so locking reads and
+statements calling side-effecting functions (pg_notify, nextval, advisory
+locks, ...) are never explained. This doubles the cost of the sampled
+statements, so the rate defaults to 0.
+
+Size-based rotation is not safe with several processes writing one file,
+so each worker process logs to its own rotating file next to
+SLOW_QUERY_LOG_FILE (bhojan-slow-queries.<pid>.log). The admin page
+(/admin/slow-queries) merges the files of all workers and ranks statement
+shapes by total time.
+"""
+import glob
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import db
+from app.utils.query_stats import statement_shape
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_LOG_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_LOG_BACKUPS = 3
+PARAM_MAX_LENGTH = 100
+REDACTED = '[redacted]'
+EXPLAIN_SAVEPOINT = 'slow_query_explain'
+
+# Reads that take locks or have side effects when EXPLAIN ANALYZE runs them again
+_UNSAFE_TO_REPEAT = re.compile(
+    r'\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b|\bFOR\s+(?:KEY\s+)?SHARE\b|\bINTO\b|'
+    r'\b(?:INSERT|UPDATE|DELETE|MERGE)\b|'
+    r'\b(?:PG_NOTIFY|NEXTVAL|SETVAL|SET_CONFIG|PG_(?:TRY_)?ADVISORY\w*|PG_SLEEP\w*|'
+    r'PG_CANCEL_BACKEND|PG_TERMINATE_BACKEND|LO_\w+|DBLINK\w*)\s*\('
+)
+
+# Column and parameter names whose values never go to the log
+_SENSITIVE_NAME = re.compile(
+    r'passw|otp|token|secret|email|phone|address|card|cvv|account|ifsc|upi|payment_details',
+    re.IGNORECASE
+)
+_PARAM_SUFFIX = re.compile(r'_\d+$')
+
+logger = logging.getLogger('bhojan.slow_queries')
+logger.propagate = False
+
+_settings = {'threshold': None, 'explain_rate': 0.0, 'log_params': False,
+             'path': None, 'max_bytes': DEFAULT_LOG_MAX_BYTES, 'backups': DEFAULT_LOG_BACKUPS}
+# Process whose file the logger's handler writes to (gunicorn forks workers)
+_handler_state = {'pid': None}
+_handler_lock = threading.Lock()
+_column_names = set()
+
+
+def slow_query_log_file(app):
+    return app.config.get('SLOW_QUERY_LOG_FILE') or os.path.join(tempfile.gettempdir(), 'bhojan-slow-queries.log')
+
+
+def worker_log_file(path, pid):
+    """The file one worker process logs to, e.g. bhojan-slow-queries.123.log"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{pid}{ext}'
+
+
+def _use_worker_handler():
+    """Point the logger at this process's file, once per process"""
+    pid = os.getpid()
+    if _handler_state['pid'] == pid:
+        return
+    with _handler_lock:
+        if _handler_state['pid'] == pid:
+            return
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        path = worker_log_file(_settings['path'], pid)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=_settings['max_bytes'], backupCount=_settings['backups'])
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        _handler_state['pid'] = pid
+
+
+def _known_columns():
+    if not _column_names:
+        _column_names.update(column.name for table in db.metadata.tables.values() for column in table.columns)
+    return _column_names
+
+
+def _safe_param_name(name):
+    """Whether a bound parameter is named after a column that holds no personal data"""
+    column_name = _PARAM_SUFFIX.sub('', str(name))
+    return column_name in _known_columns() and not _SENSITIVE_NAME.search(column_name)
+
+
+def _format_params(statement, parameters):
+    """Bound parameters as short reprs, with possibly sensitive values redacted"""
+    sensitive = bool(_SENSITIVE_NAME.search(statement))
+
+    def show(value, safe):
+        return repr(value)[:PARAM_MAX_LENGTH] if safe else REDACTED
+
+    if isinstance(parameters, dict):
+        return {
+            key: show(value, not _SENSITIVE_NAME.search(str(key)) and (not sensitive or _safe_param_name(key)))
+            for key, value in parameters.items()
+        }
+    if isinstance(parameters, (list, tuple)):
+        if parameters and all(isinstance(params, (dict, list, tuple)) for params in parameters):
+            # executemany: one parameter set per row
+            return [_format_params(statement, params) for params in parameters]
+        return [show(value, not sensitive) for value in parameters]
+    return show(parameters, not sensitive)
+
+
+def _origin():
+    if not has_request_context():
+        return {'endpoint': None, 'path': None}
+    return {'endpoint': request.endpoint, 'path': f'{request.method} {request.path}'}
+
+
+def _explain(conn, statement, parameters):
+    """EXPLAIN (ANALYZE, BUFFERS) output of a SELECT, or why it failed"""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            return plan
+        except Exception as e:
+            cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            return f'EXPLAIN failed: {str(e)}'
+    finally:
+        cursor.close()
+
+
+def _should_explain(conn, statement, executemany):
+    rate = _settings['explain_rate']
+    if not rate or executemany or conn.dialect.name != 'postgresql':
+        return False
+    # ANALYZE runs the statement again, so only plain reads are explained
+    head = statement.lstrip().upper()
+    if not head.startswith(('SELECT', 'WITH')) or _UNSAFE_TO_REPEAT.search(head):
+        return False
+    return random.random() < rate
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _settings['threshold'] is not None:
+        context._slow_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_slow_query_start', None)
+    if start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < _settings['threshold']:
+        return
+
+    entry = {
+        'at': datetime.utcnow().isoformat(),
+        'duration_ms': round(duration_ms, 2),
+        'statement': statement,
+        'shape': statement_shape(statement),
+        'params': _format_params(statement, parameters) if _settings['log_params'] else None,
+        **_origin()
+    }
+    if _should_explain(conn, statement, executemany):
+        try:
+            entry['explain'] = _explain(conn, statement, parameters)
+        except Exception as e:
+            entry['explain'] = f'EXPLAIN failed: {str(e)}'
+    _use_worker_handler()
+    logger.warning(json.dumps(entry, default=str))
+
+
+def init_slow_query_log(app):
+    """Start logging statements slower than SLOW_QUERY_THRESHOLD_MS"""
+    if not app.config.get('SLOW_QUERY_LOG_ENABLED', True):
+        return
+
+    # The handler is opened by the first slow statement of each process, so
+    # workers forked after create_app() (gunicorn --preload) get their own file
+    with _handler_lock:
+        _settings.update(
+            threshold=app.config.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS),
+            explain_rate=app.config.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.0),
+            log_params=app.config.get('SLOW_QUERY_LOG_PARAMS', False),
+            path=slow_query_log_file(app),
+            max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', DEFAULT_LOG_MAX_BYTES),
+            backups=app.config.get('SLOW_QUERY_LOG_BACKUPS', DEFAULT_LOG_BACKUPS)
+        )
+        _handler_state['pid'] = None
+
+
+def read_slow_queries(path, backups=DEFAULT_LOG_BACKUPS):
+    """
+    Entries of every worker's log file and rotated backups, oldest first
+
+    Args:
+        path: SLOW_QUERY_LOG_FILE (workers write to worker_log_file() names)
+        backups: Rotated backups kept per file
+
+    Returns:
+        List of entry dicts ordered by time
+    """
+    root, ext = os.path.splitext(path)
+    worker_file = re.compile(re.escape(root) + r'\.\d+' + re.escape(ext) + '$')
+    files = []
+    for name in sorted(glob.glob(f'{glob.escape(root)}.*{glob.escape(ext)}')):
+        if not worker_file.match(name):
+            continue
+        files += [f'{name}.{n}' for n in range(backups, 0, -1)] + [name]
+
+    entries = []
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    entries.sort(key=lambda entry: entry.get('at') or '')
+    return entries
+
+
+def top_statements(entries, limit=50):
+    """
+    Statement shapes ranked by total logged time
+
+    Returns:
+        List of dicts with shape, count, total_ms, avg_ms, max_ms, endpoints
+        (set of originating endpoints) and slowest (the slowest entry)
+    """
+    totals = {}
+    for entry in entries:
+        total = totals.setdefault(entry['shape'], {
+            'shape': entry['shape'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set(), 'slowest': entry
+        })
+        total['count'] += 1
+        total['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= total['max_ms']:
+            total['max_ms'] = entry['duration_ms']
+            total['slowest'] = entry
+        total['endpoints'].add(entry.get('endpoint') or '-')
+    for total in totals.values():
+        total['avg_ms'] = total['total_ms'] / total['count']
+    return sorted(totals.values(), key=lambda row: -row['total_ms'])[:limit]
@@ -0,0 +1,191 @@
+"""
+Pluggable file storage
+
+Uploads (food images, sliders, review photos and their derivatives) go
+through a StorageBackend instead of talking to Supabase or the filesystem
+directly. Paths are bucket-relative and always start with 'uploads/', so
+the same path names the same file in every backend.
+
+- SupabaseStorage keeps one client per process; the client owns an HTTP
+  connection pool, so uploads reuse connections instead of opening a new
+  client (and TLS handshake) for every file.
+- LocalStorage writes under the app's static folder and serves files
+  through the content-hashed media route. It is used when Supabase is not
+  configured, which makes development and tests work offline.
+
+STORAGE_BACKEND selects 'supabase' or 'local'; by default Supabase is used
+when its credentials are set.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from flask import current_app
+from werkzeug.security import safe_join
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class StorageBackend(ABC):
+    """Interface every storage backend implements"""
+
+    name = None
+
+    @abstractmethod
+    def upload(self, path, data, content_type):
+        """
+        Store bytes at a path, replacing any existing file
+
+        Args:
+            path: Storage path (e.g., 'uploads/food/name.jpg')
+            data: The file contents
+            content_type: MIME type of the contents
+
+        Returns:
+            Public URL of the stored file
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, path):
+        """
+        Remove a stored file
+
+        Returns:
+            Boolean indicating success (a missing file counts as deleted)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def url(self, path):
+        """Public URL of a stored file"""
+        raise NotImplementedError
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage bucket, through one long-lived client"""
+
+    name = 'supabase'
+
+    def __init__(self, supabase_url, supabase_key, bucket_name):
+        from supabase import create_client
+
+        self.client = create_client(supabase_url, supabase_key)
+        self.bucket_name = bucket_name
+
+    def _bucket(self):
+        return self.client.storage.from_(self.bucket_name)
+
+    def upload(self, path, data, content_type):
+        self._bucket().upload(path, data, file_options={"content-type": content_type})
+        public_url = self.url(path)
+        current_app.logger.info(f"Image uploaded to Supabase: {public_url}")
+        return public_url
+
+    def delete(self, path):
+        try:
+            # Accept public URLs as well as bucket paths
+            if path.startswith('http'):
+                path = path.split(f'{self.bucket_name}/')[-1]
+            self._bucket().remove([path])
+            current_app.logger.info(f"Image deleted from Supabase: {path}")
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Error deleting image from Supabase: {str(e)}")
+            return False
+
+    def url(self, path):
+        # Built locally by the client; no request is made
+        return self._bucket().get_public_url(path)
+
+
+class LocalStorage(StorageBackend):
+    """Files under a local directory, served by the media blueprint"""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, path):
+        """Filesystem path of a storage path, or None if it escapes the root"""
+        return safe_join(self.root, path)
+
+    def upload(self, path, data, content_type):
+        file_path = self.local_path(path)
+        if file_path is None:
+            raise ValueError(f"Invalid storage path: {path}")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        return self.url(path)
+
+    def delete(self, path):
+        file_path = self.local_path(path)
+        try:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            return True
+        except OSError as e:
+            current_app.logger.error(f"Error deleting stored file {path}: {str(e)}")
+            return False
+
+    def url(self, path):
+        from app.utils.http_cache import file_content_hash
+
+        file_path = self.local_path(path)
+        image_hash = file_content_hash(file_path) if file_path else None
+        if image_hash is None:
+            return f"{current_app.static_url_path}/{path}"
+
+        # Built from the URL map directly so it also works outside requests
+        # (background workers, CLI commands)
+        adapter = current_app.url_map.bind(
+            '', script_name=current_app.config.get('APPLICATION_ROOT') or '/'
+        )
+        return adapter.build('media.stored_file', {'version': image_hash, 'path': path})
+
+
+def local_storage():
+    """The local backend rooted at the static folder (also holds legacy uploads)"""
+    root = current_app.static_folder
+    backend = _backends.get(('local', root))
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.setdefault(('local', root), LocalStorage(root))
+    return backend
+
+
+def _supabase_storage():
+    config = current_app.config
+    key = ('supabase', config.get('SUPABASE_URL'), config.get('SUPABASE_KEY'),
+           config.get('SUPABASE_STORAGE_BUCKET', 'bhojanaxpress'))
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                if not key[1] or not key[2]:
+                    raise ValueError("Supabase credentials not configured")
+                backend = SupabaseStorage(key[1], key[2], key[3])
+                _backends[key] = backend
+    return backend
+
+
+def get_storage():
+    """
+    The configured storage backend, created once per process
+
+    Returns:
+        StorageBackend instance
+    """
+    backend_name = current_app.config.get('STORAGE_BACKEND')
+    if not backend_name:
+        configured = current_app.config.get('SUPABASE_URL') and current_app.config.get('SUPABASE_KEY')
+        backend_name = 'supabase' if configured else 'local'
+
+    if backend_name == 'supabase':
+        return _supabase_storage()
+    if backend_name == 'local':
+        return local_storage()
+    raise ValueError(f"Unknown storage backend: {backend_name}")
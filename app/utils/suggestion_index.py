@@ -0,0 +1,197 @@
+"""
+In-memory prefix index for autocomplete suggestions
+
+The suggestion endpoints are called on every keystroke while the menu only
+changes a few times a day, so the available menu is kept in process as a
+sorted array of (term, item) entries searched with bisect. Each item carries
+the metadata the endpoints need (category, price, image, description) so
+filtering and rendering a suggestion never touches the database.
+
+Admin food routes call menu_changed() after they commit. A new
+index is built off to the side and swapped in with a single assignment, so
+concurrent readers always see either the old or the new menu. The TTL only
+matters for other worker processes, which pick up changes when it expires.
+"""
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app
+from app import db
+from app.models import FoodItem, Category
+from app.utils.search import tokenize, invalidate_search_index
+from app.utils.cache import invalidate, TAG_MENU
+
+# Weight of a prefix hit on each kind of term
+TERM_WEIGHTS = {'phrase': 4.0, 'name': 3.0, 'category': 1.5, 'description': 1.0}
+EXACT_TERM_BONUS = 0.5
+DESCRIPTION_SNIPPET_LENGTH = 50
+
+_build_lock = threading.Lock()
+_index = None
+
+
+class SuggestionIndex:
+    """Sorted prefix array over the available menu"""
+
+    def __init__(self, rows):
+        self.items = {}
+        entries = {}
+        for item_id, name, description, category, price, image_url, category_display in rows:
+            description = description or ''
+            self.items[item_id] = {
+                'id': item_id,
+                'name': name,
+                'price': price,
+                'category': category,
+                'category_display': category_display or (category.replace('_', ' ').title() if category else 'General'),
+                'image_url': image_url,
+                'description': description[:DESCRIPTION_SNIPPET_LENGTH] + '...' if len(description) > DESCRIPTION_SNIPPET_LENGTH else description
+            }
+
+            terms = [(' '.join(tokenize(name)), 'phrase')]
+            terms += [(token, 'name') for token in tokenize(name)]
+            terms += [(token, 'category') for token in tokenize((category or '').replace('_', ' '))]
+            terms += [(token, 'description') for token in tokenize(description)]
+            for term, kind in terms:
+                if not term:
+                    continue
+                key = (term, item_id)
+                entries[key] = max(entries.get(key, 0), TERM_WEIGHTS[kind])
+
+        ordered = sorted(entries.items())
+        self.terms = [term for (term, _), _ in ordered]
+        self.postings = [(item_id, weight) for (_, item_id), weight in ordered]
+        self.built_at = time.monotonic()
+
+    def _prefix_scores(self, prefix):
+        """Best score per item for terms starting with prefix"""
+        scores = {}
+        position = bisect_left(self.terms, prefix)
+        while position < len(self.terms) and self.terms[position].startswith(prefix):
+            item_id, weight = self.postings[position]
+            if self.terms[position] == prefix:
+                weight += EXACT_TERM_BONUS
+            if weight > scores.get(item_id, 0):
+                scores[item_id] = weight
+            position += 1
+        return scores
+
+    def _accepts(self, item, category, price_min, price_max):
+        if category and category != 'all' and item['category'] != category:
+            return False
+        if price_min is not None and price_min != '' and item['price'] < float(price_min):
+            return False
+        if price_max is not None and price_max != '' and item['price'] > float(price_max):
+            return False
+        return True
+
+    def suggest(self, query, category=None, price_min=None, price_max=None, limit=8):
+        """
+        Find menu items whose terms start with the typed words
+
+        Args:
+            query: Text typed so far
+            category: Category name to restrict to ('all' or None for every category)
+            price_min: Optional minimum price
+            price_max: Optional maximum price
+            limit: Maximum number of suggestions
+
+        Returns:
+            List of item metadata dicts, best match first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Every word must prefix-match some term of the item
+        scores = None
+        for token in tokens:
+            token_scores = self._prefix_scores(token)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {item_id: scores[item_id] + score
+                          for item_id, score in token_scores.items() if item_id in scores}
+            if not scores:
+                return []
+
+        # Whole query as a prefix of the name ranks above scattered word hits
+        for item_id, score in self._prefix_scores(' '.join(tokens)).items():
+            if item_id in scores:
+                scores[item_id] += score
+
+        matches = [self.items[item_id] for item_id in scores
+                   if self._accepts(self.items[item_id], category, price_min, price_max)]
+        matches.sort(key=lambda item: (-scores[item['id']], item['name'].lower()))
+        return matches[:limit] if limit else matches
+
+
+def _load_index_rows():
+    return db.session.query(
+        FoodItem.id,
+        FoodItem.name,
+        FoodItem.description,
+        FoodItem.category,
+        FoodItem.price,
+        FoodItem.image_url,
+        Category.display_name
+    ).outerjoin(
+        Category, FoodItem.category_id == Category.id
+    ).filter(
+        FoodItem.is_available == True,
+        ~FoodItem.name.like('[DELETED]%')
+    ).all()
+
+
+def rebuild_suggestion_index():
+    """Build a fresh index from the database and swap it in"""
+    global _index
+    with _build_lock:
+        index = SuggestionIndex(_load_index_rows())
+        _index = index
+    return index
+
+
+def _is_fresh(index):
+    ttl = current_app.config.get('SUGGESTION_INDEX_TTL', 300)
+    return index is not None and time.monotonic() - index.built_at < ttl
+
+
+def get_suggestion_index():
+    """Get the current index, building it on first use or after the TTL"""
+    global _index
+    index = _index
+    if _is_fresh(index):
+        return index
+
+    with _build_lock:
+        # Another thread may have rebuilt it while we waited
+        index = _index
+        if not _is_fresh(index):
+            index = SuggestionIndex(_load_index_rows())
+            _index = index
+    return index
+
+
+def get_suggestions(query, category=None, price_min=None, price_max=None, limit=8):
+    """Autocomplete suggestions for the typed text (see SuggestionIndex.suggest)"""
+    return get_suggestion_index().suggest(query, category, price_min, price_max, limit)
+
+
+def menu_changed():
+    """
+    Refresh in-process menu caches after a committed menu change
+
+    Rebuilds the suggestion index immediately, drops the search index so it
+    is rebuilt on the next search and bumps the menu cache tag. Failures are
+    logged, never raised, so a committed admin change is not reported as an
+    error.
+    """
+    global _index
+    invalidate(TAG_MENU)
+    invalidate_search_index()
+    try:
+        rebuild_suggestion_index()
+    except Exception as e:
+        current_app.logger.error(f"Error rebuilding suggestion index: {str(e)}")
+        _index = None
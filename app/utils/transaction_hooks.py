@@ -0,0 +1,37 @@
+"""
+Run code only after the current database transaction commits
+
+Work that must not happen for a transaction that is later rolled back
+(background jobs, notifications to other processes) is registered with
+run_after_commit() and executed once the session commits. A rollback
+discards it.
+"""
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+
+_CALLBACKS_KEY = 'after_commit_callbacks'
+
+
+def run_after_commit(callback):
+    """
+    Call callback() after the current session's next successful commit
+
+    The callback must not use the database session it was registered on.
+    """
+    db.session.info.setdefault(_CALLBACKS_KEY, []).append(callback)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit_callbacks(session):
+    for callback in session.info.pop(_CALLBACKS_KEY, []):
+        try:
+            callback()
+        except Exception as e:
+            current_app.logger.error(f"Error in after-commit callback: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_commit_callbacks(session):
+    session.info.pop(_CALLBACKS_KEY, None)
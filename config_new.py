@@ -42,11 +42,53 @@ class Config:
     POSTS_PER_PAGE = int(os.environ.get('POSTS_PER_PAGE', 10))
     WTF_CSRF_TIME_LIMIT = None
     
+    # Caching and precomputed data (seconds unless noted)
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', 300))
+    SUGGESTION_INDEX_TTL = int(os.environ.get('SUGGESTION_INDEX_TTL', 300))
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 300))  # cached past report days; bounds staleness across workers
+    POPULARITY_WINDOW_DAYS = int(os.environ.get('POPULARITY_WINDOW_DAYS', 7))  # days, e.g. 7 or 30
+    RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', 10))  # neighbours stored per item
+    IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', 86400))
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))  # background threads building image derivatives
+    IMAGE_PROCESSING_SYNC = os.environ.get('IMAGE_PROCESSING_SYNC', 'False').lower() == 'true'
+    ADMIN_STATS_TTL = int(os.environ.get('ADMIN_STATS_TTL', 5))  # dashboard counters shared by all admins
+    
     # Supabase Configuration
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
     SUPABASE_STORAGE_BUCKET = os.environ.get('SUPABASE_STORAGE_BUCKET', 'bhojanaxpress')
     SUPABASE_STORAGE_URL = os.environ.get('SUPABASE_STORAGE_URL')
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND')  # 'supabase' or 'local'; default: supabase when configured
+    
+    # Server-Sent Events (/events/stream)
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND')  # 'postgres' or 'local'; default: postgres on PostgreSQL
+    EVENTS_STREAM_LIFETIME = int(os.environ.get('EVENTS_STREAM_LIFETIME', 300))  # seconds before clients reconnect
+    # Each open stream holds one gunicorn thread for up to EVENTS_STREAM_LIFETIME.
+    # Keep this below --threads (GUNICORN_THREADS in the Procfile) so every
+    # worker always has threads left for ordinary requests
+    EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS', 24))  # open streams per worker
+    
+    # Query instrumentation (Server-Timing header, N+1 warnings in the log)
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'True').lower() == 'true'
+    QUERY_STATS_SERVER_TIMING = os.environ.get('QUERY_STATS_SERVER_TIMING', 'True').lower() == 'true'
+    QUERY_LOG_THRESHOLD = int(os.environ.get('QUERY_LOG_THRESHOLD', 30))  # log requests running more statements
+    QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))  # same statement shape this often = N+1
+    
+    # Request metrics (/admin/metrics, Prometheus text format)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # shared by the gunicorn workers; default: <tmp>/bhojan-metrics
+    METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # seconds between worker snapshots
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token for scrapers
+    
+    # Slow-query log (/admin/slow-queries)
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'True').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE')  # default: <tmp>/bhojan-slow-queries.log; workers write <name>.<pid>.log
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 2 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 3))
+    SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', 'False').lower() == 'true'  # sensitive values are redacted
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0))  # PostgreSQL only, 0-1
     
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -5,6 +5,8 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- Create tables
+-- Existing databases: run `flask upgrade-schema` instead, it adds new columns
+-- and constraints to tables that are already there
 CREATE TABLE IF NOT EXISTS category (
     id SERIAL PRIMARY KEY,
     name VARCHAR(50) NOT NULL UNIQUE,
@@ -21,7 +23,9 @@ CREATE TABLE IF NOT EXISTS "user" (
     is_admin BOOLEAN DEFAULT FALSE,
     reset_token VARCHAR(255),
     reset_token_expiry TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    cart_version INTEGER NOT NULL DEFAULT 0,
+    state_version INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE TABLE IF NOT EXISTS food_item (
@@ -32,6 +36,8 @@ CREATE TABLE IF NOT EXISTS food_item (
     category_id INT,
     category VARCHAR(50),
     image_url VARCHAR(255),
+    image_hash VARCHAR(16),
+    image_variants JSON,
     is_available BOOLEAN DEFAULT TRUE,
     preparation_time INT DEFAULT 15,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -60,6 +66,7 @@ CREATE TABLE IF NOT EXISTS order_item (
     food_item_id INT NOT NULL,
     quantity INT NOT NULL,
     price FLOAT NOT NULL,
+    category VARCHAR(50),
     FOREIGN KEY (order_id) REFERENCES "order"(id),
     FOREIGN KEY (food_item_id) REFERENCES food_item(id)
 );
@@ -71,7 +78,8 @@ CREATE TABLE IF NOT EXISTS cart_item (
     quantity INT NOT NULL DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES "user"(id),
-    FOREIGN KEY (food_item_id) REFERENCES food_item(id)
+    FOREIGN KEY (food_item_id) REFERENCES food_item(id),
+    CONSTRAINT uq_cart_item_user_food UNIQUE (user_id, food_item_id)
 );
 
 CREATE TABLE IF NOT EXISTS review (
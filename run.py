@@ -1,5 +1,6 @@
 import os
 import sys
+import click
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -88,6 +89,87 @@ def init_db():
     db.session.commit()
     print("Database initialized with sample data.")
 
+@flask_app.cli.command()
+def upgrade_schema():
+    """Add columns and constraints that existing tables are missing."""
+    from app.utils.schema_upgrades import run_schema_upgrades
+
+    applied = run_schema_upgrades()
+    if applied:
+        print(f"Applied schema upgrades: {', '.join(applied)}.")
+    else:
+        print("Schema is up to date.")
+
+@flask_app.cli.command()
+def build_recommendations():
+    """Build co-purchase recommendations from order history."""
+    from app.utils.recommendations import build_recommendations as build
+
+    db.create_all()
+    count = build()
+    db.session.commit()
+    print(f"Stored recommendations for {count} food items.")
+
+@flask_app.cli.command()
+@click.option('--batch-size', default=20, help='Items to migrate per commit.')
+@click.option('--keep-blobs', is_flag=True, help='Keep image_data after uploading.')
+def migrate_images(batch_size, keep_blobs):
+    """Move FoodItem image blobs from the database into storage."""
+    from app.utils.image_utils import migrate_food_image_blobs
+
+    migrated, failed = migrate_food_image_blobs(batch_size=batch_size, keep_blobs=keep_blobs)
+    print(f"Migrated {migrated} food images, {failed} failed.")
+
+@flask_app.cli.command()
+def rebuild_rating_summaries():
+    """Rebuild per-item rating summaries from the reviews table."""
+    from app.utils.rating_summary import rebuild_all_rating_summaries
+
+    db.create_all()
+    count = rebuild_all_rating_summaries()
+    db.session.commit()
+    print(f"Rebuilt rating summaries for {count} food items.")
+
+@flask_app.cli.command()
+def rebuild_sales_rollup():
+    """Rebuild the hourly/daily item sales rollup from orders."""
+    from app.utils.sales_rollup import rebuild_sales_rollup as rebuild
+
+    db.create_all()
+    count = rebuild()
+    db.session.commit()
+    print(f"Rebuilt {count} item sales rollup rows.")
+
+@flask_app.cli.command()
+def rebuild_sales_daily():
+    """Rebuild the daily sales fact table from orders."""
+    from app.utils.sales_daily import rebuild_sales_daily as rebuild
+
+    db.create_all()
+    count = rebuild()
+    db.session.commit()
+    print(f"Rebuilt {count} daily sales rows.")
+
+@flask_app.cli.command()
+def rebuild_commission_ledger():
+    """Rebuild the commission ledger and agent balances from orders."""
+    from app.utils.commission_ledger import rebuild_commission_ledger as rebuild
+
+    db.create_all()
+    count = rebuild()
+    db.session.commit()
+    print(f"Rebuilt {count} commission ledger entries.")
+
+@flask_app.cli.command()
+def init_search():
+    """Create the PostgreSQL full-text and trigram search indexes."""
+    from app.utils.search import ensure_postgres_search_indexes
+
+    if ensure_postgres_search_indexes():
+        print("Search indexes created.")
+    else:
+        print("Not a PostgreSQL database; search uses the in-process index.")
+
 # ===========================
 # Local development server
 # ===========================
@@ -0,0 +1,107 @@
+"""
+Commission ledger: the live entries written on order changes must add up to
+the same balances as rebuild_commission_ledger()
+"""
+from datetime import datetime
+import pytest
+from flask import Flask
+from app import db
+from app.models import Order, CommissionLedger, CommissionBalance
+from app.utils.commission_ledger import get_commission_balance, rebuild_commission_ledger
+from app.utils.schema_upgrades import run_schema_upgrades
+
+AGENT_ID = 7
+
+
+@pytest.fixture
+def app():
+    # A bare app on an in-memory database; create_app() insists on MySQL/PostgreSQL
+    flask_app = Flask(__name__)
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+def _order(**values):
+    order = Order(user_id=1, delivery_address='1 Test Street', phone_number='9999999999',
+                  payment_method='cash_on_delivery', total_amount=201.6, delivery_charge=20.0,
+                  delivery_boy_id=AGENT_ID, status='out_for_delivery', **values)
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def _balance():
+    db.session.expire_all()
+    return get_commission_balance(AGENT_ID)
+
+
+def test_pay_then_return_matches_rebuild(app):
+    order = _order()
+
+    order.status = 'delivered'
+    order.delivered_at = datetime.utcnow()
+    db.session.commit()
+    assert _balance()['earned'] == 24.19
+
+    order.commission_paid = True
+    order.commission_paid_at = datetime.utcnow()
+    db.session.commit()
+    assert _balance()['pending'] == 0
+
+    order.status = 'returned'
+    db.session.commit()
+    live = _balance()
+    assert live['earned'] == 12.1
+    assert live['paid'] == 12.1
+    assert live['pending'] == 0
+
+    rebuild_commission_ledger()
+    db.session.commit()
+    assert _balance() == live
+
+
+def test_unpaid_and_reassigned_orders_match_rebuild(app):
+    order = _order(commission_paid=True, commission_paid_at=datetime.utcnow())
+    order.status = 'delivered'
+    db.session.commit()
+
+    order.delivery_boy_id = AGENT_ID + 1
+    db.session.commit()
+    order.delivery_boy_id = AGENT_ID
+    order.commission_paid = False
+    db.session.commit()
+    live = _balance()
+    assert live['paid'] == 0
+    assert db.session.get(CommissionBalance, AGENT_ID + 1).paid == pytest.approx(0)
+
+    rebuild_commission_ledger()
+    db.session.commit()
+    assert _balance() == live
+
+
+def test_orders_from_before_the_ledger(app):
+    order = _order(commission_paid=True, commission_paid_at=datetime.utcnow())
+    order.status = 'delivered'
+    db.session.commit()
+    # An install upgraded from before the ledger: orders but no entries
+    CommissionLedger.query.delete()
+    CommissionBalance.query.delete()
+    db.session.commit()
+
+    order.status = 'returned'
+    db.session.commit()
+    live = _balance()
+    assert live['earned'] == 12.1
+    assert live['paid'] == 12.1
+
+    CommissionLedger.query.delete()
+    CommissionBalance.query.delete()
+    db.session.commit()
+    assert 'commission_ledger_backfill' in run_schema_upgrades()
+    assert 'commission_ledger_backfill' not in run_schema_upgrades()
+    assert _balance() == live